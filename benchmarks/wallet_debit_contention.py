@@ -0,0 +1,109 @@
+# benchmarks/wallet_debit_contention.py
+"""بنچمارک رقابت کسر موجودی کیف پول
+
+روش قدیمی (خواندن موجودی و سپس UPDATE) را با کسر شرطی یک‌دستوری WalletService.debit
+و کسر شرطی با نوبت‌دهی wallet_transaction روی یک کیف پول مشترک و درخواست‌های همزمان مقایسه می‌کند.
+
+اجرا (روی دیتابیس تست؛ یک کاربر موقت ساخته و در پایان حذف می‌شود):
+    DATABASE_URL=postgresql://... python -m benchmarks.wallet_debit_contention --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+import asyncpg
+from src.services.wallet_service import WalletService, wallet_transaction
+
+BENCH_USER_ID = 9_000_000_000_000 + os.getpid()
+
+
+async def read_then_write(pool, user_id: int, amount: Decimal):
+    """روش قبلی: بررسی موجودی و کسر در دو مرحله"""
+    async with pool.acquire() as conn:
+        return await _read_then_write(conn, user_id, amount)
+
+
+async def _read_then_write(conn, user_id: int, amount: Decimal):
+    balance = await conn.fetchval("SELECT balance FROM wallets WHERE user_id = $1", user_id)
+    if balance < amount:
+        return None
+    async with conn.transaction():
+        await conn.execute("""
+            UPDATE wallets SET balance = balance - $2 WHERE user_id = $1
+        """, user_id, amount)
+        await conn.execute("""
+            INSERT INTO transactions (user_id, type, amount, balance_after, description)
+            VALUES ($1, 'withdrawal', $2, (SELECT balance FROM wallets WHERE user_id = $1), 'bench')
+        """, user_id, amount)
+    return balance - amount
+
+
+async def conditional(pool, user_id: int, amount: Decimal):
+    """کسر شرطی و ثبت تراکنش در یک دستور"""
+    async with pool.acquire() as conn:
+        return await WalletService.debit(conn, user_id, amount, 'withdrawal', 'bench')
+
+
+async def serialized(pool, user_id: int, amount: Decimal):
+    """کسر شرطی با نوبت‌دهی کیف پول کاربر پیش از گرفتن اتصال (بدون انتظار روی قفل ردیف)"""
+    async with wallet_transaction(SimpleNamespace(pool=pool), user_id) as conn:
+        return await WalletService.debit(conn, user_id, amount, 'withdrawal', 'bench')
+
+
+async def run(pool, strategy, requests: int, concurrency: int, balance: Decimal, amount: Decimal):
+    async with pool.acquire() as conn:
+        # ردیف‌های دفتر فقط با حذف آبشاری کاربر پاک می‌شوند
+        await conn.execute("DELETE FROM users WHERE user_id = $1", BENCH_USER_ID)
+        await conn.execute("INSERT INTO users (user_id, username) VALUES ($1, 'bench')", BENCH_USER_ID)
+        await conn.execute("INSERT INTO wallets (user_id, balance) VALUES ($1, $2)", BENCH_USER_ID, balance)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await strategy(pool, BENCH_USER_ID, amount)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    async with pool.acquire() as conn:
+        final_balance = await conn.fetchval("SELECT balance FROM wallets WHERE user_id = $1", BENCH_USER_ID)
+        ledger_total = await conn.fetchval(
+            "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE user_id = $1", BENCH_USER_ID
+        )
+
+    succeeded = sum(1 for r in results if r is not None)
+    print(
+        f"{strategy.__name__:>16}: {elapsed:7.3f}s  {requests / elapsed:8.1f} req/s  "
+        f"succeeded={succeeded}  final_balance={final_balance}  "
+        f"ledger_total={ledger_total}  overdrawn={final_balance < 0}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--balance", type=Decimal, default=Decimal("100000"))
+    parser.add_argument("--amount", type=Decimal, default=Decimal("1000"))
+    args = parser.parse_args()
+
+    pool = await asyncpg.create_pool(os.environ["DATABASE_URL"], min_size=args.concurrency,
+                                     max_size=args.concurrency)
+    try:
+        print(f"requests={args.requests} concurrency={args.concurrency} "
+              f"balance={args.balance} amount={args.amount} "
+              f"(max successful debits: {int(args.balance // args.amount)})")
+        for strategy in (read_then_write, conditional, serialized):
+            await run(pool, strategy, args.requests, args.concurrency, args.balance, args.amount)
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM users WHERE user_id = $1", BENCH_USER_ID)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,6 +9,18 @@ from telegram.ext import (
 )
 from telegram import Update
 from .config import Config
+from .database import Database
+from .services.cart_service import CartService
+from .services.tron_client import get_tron_client, close_tron_client
+from .services.tron_watcher import TronWalletWatcher
+from .services.amount_allocator import get_amount_allocator
+from .services.rate_service import get_rate_service, close_rate_service
+from .services.batch_verification_service import BatchVerificationService
+from .services.ledger_service import LedgerService
+from .services.notification_service import NotificationService
+from .services.report_scheduler import ReportScheduler
+from .services.discount_index import get_discount_index
+from .services.settings_service import get_settings_cache, close_settings_cache
 from .handlers import (
     UserHandler,
     AdminHandler,
@@ -23,14 +35,110 @@ from .handlers import (
 class DigitalShopBot:
     def __init__(self):
         """راه‌اندازی ربات"""
-        self.application = Application.builder().token(Config.TELEGRAM_TOKEN).build()
+        self.db = Database()
+        self.cart_service = CartService(self.db)
+        self.admin_handler = AdminHandler(self.db)
+        self.discount_handler = DiscountHandler(self.db)
+        self.tron_client = get_tron_client()
+        self.application = (
+            Application.builder()
+            .token(Config.TELEGRAM_TOKEN)
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+            .build()
+        )
         self.setup_handlers()
+
+    async def on_startup(self, application: Application):
+        """اتصال به دیتابیس و راه‌اندازی سرویس‌های مشترک"""
+        await self.db.connect()
+        await self.cart_service.start()
+        application.bot_data['db'] = self.db
+        application.bot_data['cart_service'] = self.cart_service
+        application.bot_data['tron_client'] = self.tron_client
+
+        self.settings_cache = get_settings_cache(self.db)
+        await self.settings_cache.start()
+        application.bot_data['settings_cache'] = self.settings_cache
+
+        self.rate_service = get_rate_service(self.db)
+        await self.rate_service.start()
+        application.bot_data['rate_service'] = self.rate_service
+
+        self.amount_allocator = get_amount_allocator(self.db)
+        await self.amount_allocator.load()
+        application.bot_data['amount_allocator'] = self.amount_allocator
+
+        self.tron_watcher = TronWalletWatcher(
+            self.db, self.tron_client, bot=application.bot, allocator=self.amount_allocator
+        )
+        await self.tron_watcher.start()
+
+        self.batch_verifier = BatchVerificationService(
+            self.db, self.tron_client, allocator=self.amount_allocator
+        )
+        await self.batch_verifier.start()
+        application.bot_data['batch_verifier'] = self.batch_verifier
+
+        self.ledger_service = LedgerService(self.db)
+        await self.ledger_service.start()
+        application.bot_data['ledger_service'] = self.ledger_service
+
+        self.discount_index = get_discount_index(self.db)
+        await self.discount_index.load()
+
+        self.notification_service = NotificationService(application.bot)
+        await self.notification_service.start()
+        application.bot_data['notification_service'] = self.notification_service
+
+        self.report_scheduler = ReportScheduler(self.db, self.notification_service)
+        await self.report_scheduler.start()
+
+    async def on_shutdown(self, application: Application):
+        """توقف سرویس‌های مشترک و قطع اتصال دیتابیس"""
+        await self.report_scheduler.close()
+        await self.notification_service.close()
+        await self.ledger_service.close()
+        await self.batch_verifier.close()
+        await self.tron_watcher.close()
+        await close_rate_service()
+        await close_settings_cache()
+        await self.cart_service.close()
+        await close_tron_client()
+        await self.db.close()
         
     def setup_handlers(self):
         """تنظیم هندلرهای ربات"""
         # هندلرهای پایه
         self.application.add_handler(CommandHandler("start", UserHandler.start))
         self.application.add_handler(CommandHandler("help", UserHandler.help))
+        self.application.add_handler(
+            CommandHandler("verify_payments", self.admin_handler.verify_pending_payments)
+        )
+        self.application.add_handler(
+            CommandHandler("reconcile", self.admin_handler.reconcile_payments)
+        )
+        self.application.add_handler(
+            CommandHandler("rebuild_reports", self.admin_handler.rebuild_reports)
+        )
+        self.application.add_handler(
+            CommandHandler("export", self.admin_handler.export_data)
+        )
+        self.application.add_handler(
+            CommandHandler("sales_chart", self.admin_handler.sales_chart)
+        )
+        self.application.add_handler(
+            CommandHandler("approve_pending", self.admin_handler.approve_pending)
+        )
+        self.application.add_handler(
+            CommandHandler("generate_codes", self.admin_handler.generate_discount_codes)
+        )
+        self.application.add_handler(
+            CallbackQueryHandler(self.admin_handler.handle_bulk_approval, pattern='^bulk_')
+        )
+        self.application.add_handler(
+            CallbackQueryHandler(self.discount_handler.proceed_to_payment, pattern='^proceed_to_payment$')
+        )
         
         # هندلر مدیریت محصولات
         self.application.add_handler(product_conversation_handler)
@@ -33,7 +33,56 @@ class Config:
     # Payment settings
     CRYPTO_WALLET: str = os.getenv("CRYPTO_WALLET", "")
     CARD_NUMBER: str = os.getenv("CARD_NUMBER", "")
-    
+
+    # TronGrid settings
+    TRONGRID_URL: str = os.getenv("TRONGRID_URL", "https://api.trongrid.io")
+    TRONGRID_API_KEY: str = os.getenv("TRONGRID_API_KEY", "")
+    TRON_REQUEST_TIMEOUT: float = float(os.getenv("TRON_REQUEST_TIMEOUT", 10.0))
+    TRON_MAX_RETRIES: int = int(os.getenv("TRON_MAX_RETRIES", 3))
+    TRON_POOL_SIZE: int = int(os.getenv("TRON_POOL_SIZE", 20))
+    TRON_RATE_LIMIT: float = float(os.getenv("TRON_RATE_LIMIT", 10.0))
+    TRON_VERIFY_CONCURRENCY: int = int(os.getenv("TRON_VERIFY_CONCURRENCY", 8))
+    TRON_VERIFY_INTERVAL: float = float(os.getenv("TRON_VERIFY_INTERVAL", 60.0))
+    TRON_WATCH_INTERVAL: float = float(os.getenv("TRON_WATCH_INTERVAL", 15.0))
+    CRYPTO_INVOICE_TTL: int = int(os.getenv("CRYPTO_INVOICE_TTL", 3600))
+
+    # TRX rate settings
+    TRX_RATE_SOURCE: str = os.getenv("TRX_RATE_SOURCE", "settings")
+    TRX_RATE_FIELD: str = os.getenv("TRX_RATE_FIELD", "rate")
+    TRX_TOMAN_RATE: str = os.getenv("TRX_TOMAN_RATE", "20000")
+    TRX_RATE_TTL: float = float(os.getenv("TRX_RATE_TTL", 300.0))
+    TRX_RATE_REFRESH_INTERVAL: float = float(os.getenv("TRX_RATE_REFRESH_INTERVAL", 60.0))
+
+    # Wallet ledger settings
+    LEDGER_SNAPSHOT_INTERVAL: float = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", 24 * 3600))
+    # قفل advisory دیتابیس برای اجرای چند نمونه ربات روی یک دیتابیس
+    WALLET_ADVISORY_LOCK: bool = os.getenv("WALLET_ADVISORY_LOCK", "false").lower() in ("1", "true", "yes")
+
+    # Discount settings
+    DISCOUNT_INDEX_TTL: float = float(os.getenv("DISCOUNT_INDEX_TTL", 60.0))
+    DISCOUNT_MAX_ATTEMPTS: int = int(os.getenv("DISCOUNT_MAX_ATTEMPTS", 5))
+    DISCOUNT_ATTEMPT_WINDOW: float = float(os.getenv("DISCOUNT_ATTEMPT_WINDOW", 600.0))
+    DISCOUNT_CODE_LENGTH: int = int(os.getenv("DISCOUNT_CODE_LENGTH", 10))
+    DISCOUNT_CODE_ALPHABET: str = os.getenv("DISCOUNT_CODE_ALPHABET", "")  # خالی: حروف و ارقام بدون نویسه‌های مشابه
+
+    # Notification settings (محدودیت ارسال تلگرام حدود ۳۰ پیام در ثانیه است)
+    NOTIFY_RATE: float = float(os.getenv("NOTIFY_RATE", 25.0))
+    APPROVAL_PAGE_SIZE: int = int(os.getenv("APPROVAL_PAGE_SIZE", 20))
+
+    # Report settings
+    EXPORT_FETCH_SIZE: int = int(os.getenv("EXPORT_FETCH_SIZE", 1000))
+    REPORT_SCHEDULE_HOUR: int = int(os.getenv("REPORT_SCHEDULE_HOUR", 4))  # ساعت کم‌بار محاسبه گزارش‌ها
+    ANALYTICS_SMOOTHING: float = float(os.getenv("ANALYTICS_SMOOTHING", 0.3))  # ضریب هموارسازی نمایی پیش‌بینی فروش
+
+    # Cache settings
+    REPORT_CACHE_TTL: float = float(os.getenv("REPORT_CACHE_TTL", 300.0))
+    SETTINGS_RELOAD_INTERVAL: float = float(os.getenv("SETTINGS_RELOAD_INTERVAL", 300.0))
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    CART_TTL: int = int(os.getenv("CART_TTL", 7 * 24 * 3600))
+    CART_CACHE_SIZE: int = int(os.getenv("CART_CACHE_SIZE", 10000))
+    CART_FLUSH_INTERVAL: float = float(os.getenv("CART_FLUSH_INTERVAL", 1.0))
+    CART_LOCAL_TTL: float = float(os.getenv("CART_LOCAL_TTL", 30.0))
+
     # Other settings
     TIMEZONE: str = os.getenv("TZ", "Asia/Tehran")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -41,10 +90,12 @@ class Config:
     # Paths
     STATIC_DIR = BASE_DIR / "static"
     LOG_DIR = BASE_DIR / "logs"
+    REPORT_DIR = BASE_DIR / "reports"
     
     # Ensure directories exist
     STATIC_DIR.mkdir(exist_ok=True)
     LOG_DIR.mkdir(exist_ok=True)
+    REPORT_DIR.mkdir(exist_ok=True)
 
 def setup_logging():
     """Configure logging settings"""
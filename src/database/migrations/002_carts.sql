@@ -0,0 +1,10 @@
+-- جدول سبدهای خرید (ذخیره فشرده: شناسه محصولات و تعدادها به صورت آرایه بسته‌بندی شده)
+CREATE TABLE IF NOT EXISTS carts (
+    user_id BIGINT PRIMARY KEY,
+    data BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- ایندکس‌ها
+CREATE INDEX idx_carts_expires ON carts(expires_at);
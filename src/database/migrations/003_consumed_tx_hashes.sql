@@ -0,0 +1,10 @@
+-- جدول TXIDهای مصرف شده (جلوگیری از استفاده مجدد یک تراکنش)
+CREATE TABLE IF NOT EXISTS consumed_tx_hashes (
+    tx_hash VARCHAR(64) PRIMARY KEY,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE SET NULL,
+    order_id INTEGER REFERENCES orders(order_id) ON DELETE SET NULL,
+    consumed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- هر TXID فقط یک بار در دفتر تراکنش‌ها ثبت می‌شود
+CREATE UNIQUE INDEX idx_transactions_tx_hash ON transactions(tx_hash) WHERE tx_hash IS NOT NULL;
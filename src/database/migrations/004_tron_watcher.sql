@@ -0,0 +1,26 @@
+-- ستون‌های وضعیت تراکنش که TransactionService از آن‌ها استفاده می‌کند
+ALTER TABLE transactions ALTER COLUMN balance_after DROP NOT NULL;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS method VARCHAR(16);
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS status VARCHAR(16) DEFAULT 'completed';
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS reference_id TEXT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS error_message TEXT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS retry_count INTEGER DEFAULT 0;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TRIGGER update_transactions_updated_at
+    BEFORE UPDATE ON transactions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- جدول نقطه بازیابی پایش بلاکچین
+CREATE TABLE IF NOT EXISTS chain_checkpoints (
+    name VARCHAR(64) PRIMARY KEY,
+    last_timestamp BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ایندکس‌ها
+CREATE INDEX idx_transactions_pending_crypto ON transactions(created_at)
+    WHERE status = 'pending' AND method = 'crypto';
+CREATE INDEX idx_orders_pending_crypto ON orders(created_at)
+    WHERE status IN ('pending', 'awaiting_payment') AND payment_method = 'crypto';
@@ -0,0 +1,14 @@
+-- مبالغ یکتای تخصیص داده شده به فاکتورهای کریپتو (هر مبلغ به سان فقط به یک فاکتور فعال تعلق دارد)
+CREATE TABLE IF NOT EXISTS crypto_invoices (
+    amount_sun BIGINT PRIMARY KEY,
+    kind VARCHAR(16) NOT NULL,
+    ref_id INTEGER NOT NULL,
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    amount DECIMAL(12,2) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    UNIQUE (kind, ref_id)
+);
+
+-- ایندکس‌ها
+CREATE INDEX idx_crypto_invoices_expires ON crypto_invoices(expires_at);
@@ -0,0 +1,2 @@
+-- نرخ TRX قفل شده هر فاکتور کریپتو در زمان صدور
+ALTER TABLE crypto_invoices ADD COLUMN IF NOT EXISTS rate DECIMAL(18,2);
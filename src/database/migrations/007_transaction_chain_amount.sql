@@ -0,0 +1,6 @@
+-- مبلغ دریافتی روی بلاکچین (سان) برای تطبیق دفتر تراکنش‌ها با شبکه
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS amount_sun BIGINT;
+
+-- ایندکس‌ها
+CREATE INDEX idx_transactions_crypto_completed ON transactions(created_at)
+    WHERE method = 'crypto' AND status = 'completed';
@@ -0,0 +1,66 @@
+-- دفتر کیف پول فقط-افزودنی: ردیف‌های اثرگذار بر موجودی شماره ترتیبی کاربر (seq) و مقدار علامت‌دار (delta) دارند
+ALTER TABLE wallets ADD COLUMN IF NOT EXISTS ledger_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS seq BIGINT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS delta DECIMAL(12,2);
+
+-- مقداردهی ردیف‌های موجود (ردیف‌های دارای balance_after همان ردیف‌های دفتر هستند)
+UPDATE transactions t
+SET seq = n.seq,
+    delta = CASE WHEN t.type IN ('deposit', 'refund') THEN t.amount ELSE -t.amount END
+FROM (
+    SELECT transaction_id,
+           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at, transaction_id) AS seq
+    FROM transactions
+    WHERE balance_after IS NOT NULL
+) n
+WHERE t.transaction_id = n.transaction_id;
+
+UPDATE wallets w
+SET ledger_seq = s.max_seq
+FROM (
+    SELECT user_id, MAX(seq) AS max_seq FROM transactions WHERE seq IS NOT NULL GROUP BY user_id
+) s
+WHERE w.user_id = s.user_id;
+
+CREATE UNIQUE INDEX idx_transactions_user_seq ON transactions(user_id, seq) WHERE seq IS NOT NULL;
+
+-- جلوگیری از ویرایش و حذف ردیف‌های دفتر
+CREATE OR REPLACE FUNCTION protect_wallet_ledger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        -- حذف آبشاری هنگام حذف حساب کاربر مجاز است
+        IF OLD.seq IS NOT NULL AND pg_trigger_depth() = 1 THEN
+            RAISE EXCEPTION 'wallet ledger row % is append-only', OLD.transaction_id;
+        END IF;
+        RETURN OLD;
+    END IF;
+
+    IF OLD.seq IS NOT NULL THEN
+        RAISE EXCEPTION 'wallet ledger row % is append-only', OLD.transaction_id;
+    END IF;
+    -- درخواست‌های در انتظار فقط با درج ردیف جدید به دفتر اضافه می‌شوند
+    IF NEW.seq IS NOT NULL OR NEW.delta IS NOT NULL
+       OR NEW.balance_after IS DISTINCT FROM OLD.balance_after THEN
+        RAISE EXCEPTION 'ledger columns of transaction % can only be set on insert', OLD.transaction_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER protect_wallet_ledger
+    BEFORE UPDATE OR DELETE ON transactions
+    FOR EACH ROW
+    EXECUTE FUNCTION protect_wallet_ledger();
+
+-- تصاویر دوره‌ای موجودی (موجودی پس از ردیف seq)
+CREATE TABLE IF NOT EXISTS wallet_balance_snapshots (
+    user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    seq BIGINT NOT NULL,
+    balance DECIMAL(12,2) NOT NULL,
+    taken_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, seq)
+);
+
+-- ایندکس‌ها
+CREATE INDEX idx_wallet_balance_snapshots_taken ON wallet_balance_snapshots(user_id, taken_at);
@@ -0,0 +1,7 @@
+-- ایندکس تاریخچه کیف پول کاربر (ردیف‌های دفتر): شناسه‌های هر صفحه با اسکن فقط-ایندکس و بدون مرتب‌سازی
+-- انتخاب می‌شوند؛ ستون‌های نمایشی (از جمله description با طول نامحدود) در ایندکس نیستند و فقط برای
+-- ردیف‌های همان صفحه از جدول خوانده می‌شوند
+CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at DESC, transaction_id DESC)
+    WHERE seq IS NOT NULL;
+
+-- تعداد ردیف‌های دفتر هر کاربر همان wallets.ledger_seq است و شمارنده جداگانه‌ای لازم نیست
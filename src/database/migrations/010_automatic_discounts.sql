@@ -0,0 +1,2 @@
+-- تخفیف‌های خودکار (بدون نیاز به وارد کردن کد؛ بهترین تخفیف قابل اعمال انتخاب می‌شود)
+ALTER TABLE discounts ADD COLUMN IF NOT EXISTS is_automatic BOOLEAN NOT NULL DEFAULT false;
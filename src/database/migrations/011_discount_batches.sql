@@ -0,0 +1,12 @@
+-- دسته‌های کد تخفیف یکتا (کمپین‌ها)؛ هر کد یک ردیف discounts با batch_id است
+CREATE TABLE IF NOT EXISTS discount_batches (
+    batch_id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    code_count INTEGER NOT NULL,
+    created_by BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE discounts ADD COLUMN IF NOT EXISTS batch_id INTEGER REFERENCES discount_batches(batch_id) ON DELETE CASCADE;
+
+CREATE INDEX idx_discounts_batch ON discounts(batch_id) WHERE batch_id IS NOT NULL;
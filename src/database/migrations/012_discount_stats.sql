@@ -0,0 +1,49 @@
+-- آمار تجمعی هر تخفیف که همراه ثبت استفاده بروز می‌شود (یک ردیف برای صفحه آمار)
+ALTER TABLE discount_usage ADD COLUMN IF NOT EXISTS order_amount DECIMAL(12,2);
+ALTER TABLE discount_usage ADD COLUMN IF NOT EXISTS discount_amount DECIMAL(12,2);
+
+-- HyperLogLog با ۱۰۲۴ ثبات یک‌بایتی (خطای استاندارد حدود ۳٪)؛ تخمین در برنامه انجام می‌شود
+CREATE OR REPLACE FUNCTION hll_add(registers BYTEA, value BIGINT)
+RETURNS BYTEA AS $$
+DECLARE
+    h BIT(64);
+    idx INTEGER;
+    rank INTEGER;
+BEGIN
+    registers := COALESCE(registers, decode(repeat('00', 1024), 'hex'));
+    IF value IS NULL THEN
+        RETURN registers;
+    END IF;
+    h := ('x' || substr(md5(value::text), 1, 16))::bit(64);
+    idx := substring(h from 1 for 10)::integer;
+    rank := COALESCE(NULLIF(position(B'1' in substring(h from 11)), 0), 55);
+    IF get_byte(registers, idx) < rank THEN
+        registers := set_byte(registers, idx, rank);
+    END IF;
+    RETURN registers;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE AGGREGATE hll_agg(BIGINT) (
+    SFUNC = hll_add,
+    STYPE = BYTEA
+);
+
+CREATE TABLE IF NOT EXISTS discount_stats (
+    discount_id INTEGER PRIMARY KEY REFERENCES discounts(discount_id) ON DELETE CASCADE,
+    usage_count BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    discount_given DECIMAL(14,2) NOT NULL DEFAULT 0,
+    users_hll BYTEA,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- مقداردهی از استفاده‌های قبلی (مبلغ تخفیف آن‌ها ثبت نشده است)
+INSERT INTO discount_stats (discount_id, usage_count, revenue, discount_given, users_hll)
+SELECT du.discount_id, COUNT(*), COALESCE(SUM(o.total_amount), 0), 0,
+       hll_agg(COALESCE(du.user_id, o.user_id))
+FROM discount_usage du
+LEFT JOIN orders o ON o.order_id = du.order_id
+WHERE du.discount_id IS NOT NULL
+GROUP BY du.discount_id
+ON CONFLICT (discount_id) DO NOTHING;
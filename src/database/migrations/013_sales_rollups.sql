@@ -0,0 +1,226 @@
+-- جمع‌های روزانه گزارش‌ها که با تغییر سفارش‌ها، ردیف‌های دفتر کیف پول و ثبت کاربران بروز می‌شوند
+
+-- منطقه زمانی روزهای گزارش؛ باید با Config.TIMEZONE (متغیر TZ) یکی باشد و هنگام راه‌اندازی ربات
+-- بررسی می‌شود (ReportService.check_timezone). برای تغییر آن، این تابع بازتعریف و سپس
+-- rebuild_sales_rollups و rebuild_hourly_sales برای کل تاریخچه اجرا شوند
+CREATE OR REPLACE FUNCTION report_timezone()
+RETURNS TEXT AS $$
+    SELECT 'Asia/Tehran'::text
+$$ LANGUAGE sql IMMUTABLE;
+
+-- وضعیت‌هایی که فروش شمرده می‌شوند؛ تحویل خودکار محصول دیجیتال سفارش paid را در همان تراکنش delivered می‌کند
+CREATE OR REPLACE FUNCTION is_sale_status(status TEXT)
+RETURNS BOOLEAN AS $$
+    SELECT COALESCE(status IN ('paid', 'delivered'), false)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- روز گزارش در منطقه زمانی فروشگاه
+CREATE OR REPLACE FUNCTION report_day(ts TIMESTAMP WITH TIME ZONE)
+RETURNS DATE AS $$
+    SELECT (ts AT TIME ZONE report_timezone())::date
+$$ LANGUAGE sql IMMUTABLE;
+
+-- هر روز (و هر محصول و دسته‌بندی) به ۱۶ ردیف بر اساس هش کاربر تقسیم می‌شود تا تریگرهای
+-- نویسندگان همزمان روی یک ردیف مشترک به نوبت نیفتند؛ خواندن‌ها روی همه shardها جمع می‌زنند و
+-- بازسازی هر روز را در shard صفر فشرده می‌کند
+CREATE OR REPLACE FUNCTION rollup_shard(user_id BIGINT)
+RETURNS SMALLINT AS $$
+    SELECT (abs(COALESCE(user_id, 0)) % 16)::smallint
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day DATE NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    income DECIMAL(14,2) NOT NULL DEFAULT 0,
+    buyers_hll BYTEA,
+    new_users INTEGER NOT NULL DEFAULT 0,
+    wallet_transactions INTEGER NOT NULL DEFAULT 0,
+    deposits DECIMAL(14,2) NOT NULL DEFAULT 0,
+    withdrawals DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, shard)
+);
+
+CREATE TABLE IF NOT EXISTS daily_product_sales (
+    day DATE NOT NULL,
+    product_id INTEGER REFERENCES products(product_id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, product_id, shard)
+);
+
+CREATE TABLE IF NOT EXISTS daily_category_sales (
+    day DATE NOT NULL,
+    category_id INTEGER REFERENCES categories(category_id) ON DELETE CASCADE,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category_id, shard)
+);
+
+-- سفارش با ورود به وضعیت فروش (paid یا delivered) اضافه و فقط با رفتن به وضعیت غیر فروش
+-- (مثلاً لغو یا استرداد) کم می‌شود؛ paid → delivered تغییری نمی‌دهد (روز ثبت سفارش)
+CREATE OR REPLACE FUNCTION rollup_order_sales()
+RETURNS TRIGGER AS $$
+DECLARE
+    direction INTEGER;
+    d DATE;
+    s SMALLINT;
+BEGIN
+    IF is_sale_status(NEW.status) AND (TG_OP = 'INSERT' OR NOT is_sale_status(OLD.status)) THEN
+        direction := 1;
+    ELSIF TG_OP = 'UPDATE' AND is_sale_status(OLD.status) AND NOT is_sale_status(NEW.status) THEN
+        direction := -1;
+    ELSE
+        RETURN NEW;
+    END IF;
+    d := report_day(NEW.created_at);
+    s := rollup_shard(NEW.user_id);
+
+    -- خریداران یکتا (HyperLogLog) فقط افزایشی است
+    INSERT INTO daily_stats (day, shard, orders, income, buyers_hll)
+    VALUES (d, s, direction, direction * NEW.total_amount,
+            CASE WHEN direction > 0 THEN hll_add(NULL, NEW.user_id) END)
+    ON CONFLICT (day, shard) DO UPDATE
+    SET orders = daily_stats.orders + EXCLUDED.orders,
+        income = daily_stats.income + EXCLUDED.income,
+        buyers_hll = CASE WHEN direction > 0 THEN hll_add(daily_stats.buyers_hll, NEW.user_id)
+                          ELSE daily_stats.buyers_hll END;
+
+    -- ترتیب ثابت قفل ردیف‌ها برای جلوگیری از بن‌بست سفارش‌های همزمان
+    INSERT INTO daily_product_sales (day, product_id, shard, sales, quantity, revenue)
+    SELECT d, oi.product_id, s, direction * COUNT(*), direction * SUM(oi.quantity),
+           direction * SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    WHERE oi.order_id = NEW.order_id
+    GROUP BY oi.product_id
+    ORDER BY oi.product_id
+    ON CONFLICT (day, product_id, shard) DO UPDATE
+    SET sales = daily_product_sales.sales + EXCLUDED.sales,
+        quantity = daily_product_sales.quantity + EXCLUDED.quantity,
+        revenue = daily_product_sales.revenue + EXCLUDED.revenue;
+
+    INSERT INTO daily_category_sales (day, category_id, shard, sales, quantity, revenue)
+    SELECT d, p.category_id, s, direction * COUNT(*), direction * SUM(oi.quantity),
+           direction * SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    JOIN products p ON p.product_id = oi.product_id
+    WHERE oi.order_id = NEW.order_id AND p.category_id IS NOT NULL
+    GROUP BY p.category_id
+    ORDER BY p.category_id
+    ON CONFLICT (day, category_id, shard) DO UPDATE
+    SET sales = daily_category_sales.sales + EXCLUDED.sales,
+        quantity = daily_category_sales.quantity + EXCLUDED.quantity,
+        revenue = daily_category_sales.revenue + EXCLUDED.revenue;
+
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER rollup_order_sales
+    AFTER INSERT OR UPDATE OF status ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION rollup_order_sales();
+
+-- فقط ردیف‌های دفتر کیف پول (seq دار) شمرده می‌شوند؛ درخواست‌های شارژ در انتظار جابجایی پول نیستند
+CREATE OR REPLACE FUNCTION rollup_wallet_transaction()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats (day, shard, wallet_transactions, deposits, withdrawals)
+    VALUES (report_day(NEW.created_at), rollup_shard(NEW.user_id), 1,
+            CASE WHEN NEW.type = 'deposit' THEN NEW.amount ELSE 0 END,
+            CASE WHEN NEW.type = 'withdrawal' THEN NEW.amount ELSE 0 END)
+    ON CONFLICT (day, shard) DO UPDATE
+    SET wallet_transactions = daily_stats.wallet_transactions + 1,
+        deposits = daily_stats.deposits + EXCLUDED.deposits,
+        withdrawals = daily_stats.withdrawals + EXCLUDED.withdrawals;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER rollup_wallet_transaction
+    AFTER INSERT ON transactions
+    FOR EACH ROW
+    WHEN (NEW.seq IS NOT NULL)
+    EXECUTE FUNCTION rollup_wallet_transaction();
+
+CREATE OR REPLACE FUNCTION rollup_new_user()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats (day, shard, new_users)
+    VALUES (report_day(NEW.created_at), rollup_shard(NEW.user_id), 1)
+    ON CONFLICT (day, shard) DO UPDATE
+    SET new_users = daily_stats.new_users + 1;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER rollup_new_user
+    AFTER INSERT ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION rollup_new_user();
+
+-- بازسازی جمع‌های یک بازه از داده خام (NULL: کل تاریخچه)؛ هر روز در یک ردیف shard صفر فشرده می‌شود
+-- قفل انحصاری جدول‌ها تریگرهای همزمان را تا پایان بازسازی نگه می‌دارد تا تغییری گم یا دوبار شمرده نشود
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups(start_day DATE, end_day DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    days INTEGER;
+BEGIN
+    LOCK TABLE daily_stats, daily_product_sales, daily_category_sales IN EXCLUSIVE MODE;
+    start_day := COALESCE(start_day, '-infinity'::date);
+    end_day := COALESCE(end_day, 'infinity'::date);
+
+    DELETE FROM daily_stats WHERE day BETWEEN start_day AND end_day;
+    DELETE FROM daily_product_sales WHERE day BETWEEN start_day AND end_day;
+    DELETE FROM daily_category_sales WHERE day BETWEEN start_day AND end_day;
+
+    INSERT INTO daily_stats (day, orders, income, buyers_hll, new_users,
+                             wallet_transactions, deposits, withdrawals)
+    SELECT day, SUM(orders), SUM(income), hll_agg(buyer), SUM(new_users),
+           SUM(wallet_transactions), SUM(deposits), SUM(withdrawals)
+    FROM (
+        SELECT report_day(created_at) AS day, 1 AS orders, total_amount AS income, user_id AS buyer,
+               0 AS new_users, 0 AS wallet_transactions, 0 AS deposits, 0 AS withdrawals
+        FROM orders
+        WHERE is_sale_status(status)
+        UNION ALL
+        SELECT report_day(created_at), 0, 0, NULL, 1, 0, 0, 0
+        FROM users
+        UNION ALL
+        SELECT report_day(created_at), 0, 0, NULL, 0, 1,
+               CASE WHEN type = 'deposit' THEN amount ELSE 0 END,
+               CASE WHEN type = 'withdrawal' THEN amount ELSE 0 END
+        FROM transactions
+        WHERE seq IS NOT NULL
+    ) raw
+    WHERE day BETWEEN start_day AND end_day
+    GROUP BY day;
+    GET DIAGNOSTICS days = ROW_COUNT;
+
+    INSERT INTO daily_product_sales (day, product_id, sales, quantity, revenue)
+    SELECT report_day(o.created_at), oi.product_id, COUNT(*), SUM(oi.quantity),
+           SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON o.order_id = oi.order_id
+    WHERE is_sale_status(o.status) AND report_day(o.created_at) BETWEEN start_day AND end_day
+    GROUP BY 1, 2;
+
+    INSERT INTO daily_category_sales (day, category_id, sales, quantity, revenue)
+    SELECT report_day(o.created_at), p.category_id, COUNT(*), SUM(oi.quantity),
+           SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON o.order_id = oi.order_id
+    JOIN products p ON p.product_id = oi.product_id
+    WHERE is_sale_status(o.status) AND p.category_id IS NOT NULL
+    AND report_day(o.created_at) BETWEEN start_day AND end_day
+    GROUP BY 1, 2;
+
+    RETURN days;
+END;
+$$ language 'plpgsql';
+
+SELECT rebuild_sales_rollups(NULL, NULL);
@@ -0,0 +1,9 @@
+-- گزارش‌های از پیش محاسبه شده دوره‌ای (تا پایان آخرین روز کامل)
+CREATE TABLE IF NOT EXISTS report_snapshots (
+    period VARCHAR(16) NOT NULL, -- daily, weekly, monthly
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    data JSONB NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (period, end_date)
+);
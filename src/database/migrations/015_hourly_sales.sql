@@ -0,0 +1,74 @@
+-- جمع ساعتی فروش هر محصول برای تحلیل سری زمانی (ساعت محلی فروشگاه، هم‌خوان با report_day)
+CREATE OR REPLACE FUNCTION report_hour(ts TIMESTAMP WITH TIME ZONE)
+RETURNS TIMESTAMP AS $$
+    SELECT date_trunc('hour', ts AT TIME ZONE report_timezone())
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS hourly_product_sales (
+    product_id INTEGER REFERENCES products(product_id) ON DELETE CASCADE,
+    hour TIMESTAMP NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0, -- rollup_shard خریدار (۰۱۳)
+    sales INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, hour, shard)
+);
+
+CREATE INDEX idx_hourly_product_sales_hour ON hourly_product_sales(hour);
+
+-- همان قاعده و shard بندی rollup_order_sales: ورود به وضعیت فروش افزوده و رفتن به وضعیت غیر فروش کم می‌شود
+CREATE OR REPLACE FUNCTION rollup_order_hourly()
+RETURNS TRIGGER AS $$
+DECLARE
+    direction INTEGER;
+BEGIN
+    IF is_sale_status(NEW.status) AND (TG_OP = 'INSERT' OR NOT is_sale_status(OLD.status)) THEN
+        direction := 1;
+    ELSIF TG_OP = 'UPDATE' AND is_sale_status(OLD.status) AND NOT is_sale_status(NEW.status) THEN
+        direction := -1;
+    ELSE
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO hourly_product_sales (product_id, hour, shard, sales, quantity, revenue)
+    SELECT oi.product_id, report_hour(NEW.created_at), rollup_shard(NEW.user_id), direction * COUNT(*),
+           direction * SUM(oi.quantity), direction * SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    WHERE oi.order_id = NEW.order_id
+    GROUP BY oi.product_id
+    ORDER BY oi.product_id
+    ON CONFLICT (product_id, hour, shard) DO UPDATE
+    SET sales = hourly_product_sales.sales + EXCLUDED.sales,
+        quantity = hourly_product_sales.quantity + EXCLUDED.quantity,
+        revenue = hourly_product_sales.revenue + EXCLUDED.revenue;
+
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER rollup_order_hourly
+    AFTER INSERT OR UPDATE OF status ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION rollup_order_hourly();
+
+-- بازسازی جمع‌های ساعتی روزهای بازه (NULL: کل تاریخچه) در shard صفر
+CREATE OR REPLACE FUNCTION rebuild_hourly_sales(start_day DATE, end_day DATE)
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE hourly_product_sales IN EXCLUSIVE MODE;
+    start_day := COALESCE(start_day, '-infinity'::date);
+    end_day := COALESCE(end_day, 'infinity'::date);
+
+    DELETE FROM hourly_product_sales WHERE hour::date BETWEEN start_day AND end_day;
+
+    INSERT INTO hourly_product_sales (product_id, hour, sales, quantity, revenue)
+    SELECT oi.product_id, report_hour(o.created_at), COUNT(*), SUM(oi.quantity),
+           SUM(oi.price_per_unit * oi.quantity)
+    FROM order_items oi
+    JOIN orders o ON o.order_id = oi.order_id
+    WHERE is_sale_status(o.status) AND report_day(o.created_at) BETWEEN start_day AND end_day
+    GROUP BY 1, 2;
+END;
+$$ language 'plpgsql';
+
+SELECT rebuild_hourly_sales(NULL, NULL);
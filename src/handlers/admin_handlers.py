@@ -1,5 +1,7 @@
 # src/handlers/admin_handlers.py
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes, ConversationHandler, CommandHandler,
@@ -9,6 +11,12 @@ from .base_handler import BaseHandler
 from ..services.product_service import ProductService
 from ..services.user_service import UserService
 from ..services.report_service import ReportService
+from ..services.export_service import ExportService
+from ..services.analytics_service import AnalyticsService
+from ..services.reconciliation_service import ReconciliationService
+from ..services.approval_service import ApprovalService
+from ..services.discount_service import DiscountService
+from ..models.discount import DiscountType
 from ..constants import *
 
 class AdminHandler(BaseHandler):
@@ -19,6 +27,10 @@ class AdminHandler(BaseHandler):
         self.product_service = ProductService(db)
         self.user_service = UserService(db)
         self.report_service = ReportService(db)
+        self.export_service = ExportService(db)
+        self.analytics_service = AnalyticsService(db)
+        self.approval_service = ApprovalService(db)
+        self.discount_service = DiscountService(db)
 
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش پنل ادمین"""
@@ -34,6 +46,300 @@ class AdminHandler(BaseHandler):
             reply_markup=self.keyboards.admin_menu()
         )
 
+    @staticmethod
+    def _start_job(update: Update, context: ContextTypes.DEFAULT_TYPE, job, title: str):
+        """اجرای کار طولانی ادمین در پس‌زمینه
+
+        به‌روزرسانی‌ها یکی‌یکی پردازش می‌شوند و انتظار هندلر برای کار طولانی ربات را برای همه
+        کاربران متوقف می‌کند؛ هندلر فقط کار را شروع می‌کند و job نتیجه را پس از پایان ارسال می‌کند.
+        """
+        async def run():
+            try:
+                await job
+            except Exception as e:
+                await update.effective_message.reply_text(f"❌ خطا در {title}: {e}")
+                raise
+
+        context.application.create_task(run(), update=update)
+
+    async def verify_pending_payments(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """بررسی دسته‌ای تراکنش‌های کریپتوی در انتظار"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        await update.message.reply_text("⏳ در حال بررسی تراکنش‌های در انتظار...")
+        self._start_job(
+            update, context, self._verify_pending_payments(update, context), "بررسی تراکنش‌ها"
+        )
+
+    async def _verify_pending_payments(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        stats = await context.bot_data['batch_verifier'].verify_pending()
+        await update.message.reply_text(
+            "✅ بررسی تراکنش‌ها انجام شد:\n\n"
+            f"🔍 بررسی شده: {stats['checked']}\n"
+            f"✅ تایید شده: {stats['completed']}\n"
+            f"❌ رد شده: {stats['failed']}\n"
+            f"⏳ در انتظار: {stats['pending']}"
+        )
+
+    async def reconcile_payments(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """تطبیق تراکنش‌های کریپتوی تکمیل شده با بلاکچین (/reconcile [روز])"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        days = int(context.args[0]) if context.args and context.args[0].isdigit() else None
+        await update.message.reply_text("⏳ در حال تطبیق تراکنش‌ها با بلاکچین...")
+        self._start_job(update, context, self._reconcile_payments(update, context, days), "تطبیق تراکنش‌ها")
+
+    async def _reconcile_payments(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                  days: Optional[int]):
+        service = ReconciliationService(self.db, context.bot_data.get('tron_client'))
+        summary = await service.run(days=days)
+
+        await update.message.reply_text(
+            "✅ تطبیق تراکنش‌ها انجام شد:\n\n"
+            f"🔍 بررسی شده: {summary['checked']}\n"
+            f"⚠️ مغایرت: {summary['discrepancies']}\n"
+            f"⏳ بررسی نشده (خطای شبکه): {summary['unverified']}"
+        )
+        if summary['discrepancies'] or summary['unverified']:
+            with open(summary['report'], 'rb') as report:
+                await update.message.reply_document(report)
+
+    async def rebuild_reports(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """بازسازی جمع‌های روزانه گزارش‌ها از داده خام (/rebuild_reports [روز])"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        days = int(context.args[0]) if context.args and context.args[0].isdigit() else None
+        start_date = None
+        if days:
+            start_date = datetime.now(self.report_service.tz).date() - timedelta(days=days)
+        await update.message.reply_text("⏳ در حال بازسازی آمار روزانه گزارش‌ها...")
+        self._start_job(update, context, self._rebuild_reports(update, start_date), "بازسازی آمار")
+
+    async def _rebuild_reports(self, update: Update, start_date: Optional[date]):
+        rebuilt = await self.report_service.rebuild_rollups(start_date)
+        await update.message.reply_text(f"✅ آمار {rebuilt} روز بازسازی شد.")
+
+    async def export_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """خروجی خام سفارش‌ها یا تراکنش‌ها (/export <orders|transactions> [روز] [csv|xlsx])"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        args = context.args or []
+        exports = {
+            "orders": self.export_service.export_orders,
+            "transactions": self.export_service.export_transactions
+        }
+        days = int(args[1]) if len(args) > 1 and args[1].isdigit() else 30
+        fmt = args[2].lower() if len(args) > 2 else "csv"
+        if not args or args[0] not in exports or fmt not in self.export_service.FORMATS:
+            await update.message.reply_text(
+                "❌ استفاده: /export <orders|transactions> [روز] [csv|xlsx]"
+            )
+            return
+
+        end_date = datetime.now(self.report_service.tz).date()
+        start_date = end_date - timedelta(days=days)
+        await update.message.reply_text("⏳ در حال آماده‌سازی فایل خروجی...")
+        self._start_job(
+            update, context,
+            self._send_export(update, exports[args[0]], args[0], start_date, end_date, fmt),
+            "تهیه فایل خروجی"
+        )
+
+    @staticmethod
+    async def _send_export(update: Update, export, name: str, start_date: date, end_date: date, fmt: str):
+        path = await export(start_date, end_date, fmt)
+        try:
+            with open(path, 'rb') as export_file:
+                await update.message.reply_document(
+                    export_file, filename=f"{name}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{fmt}"
+                )
+        finally:
+            path.unlink(missing_ok=True)
+
+    async def sales_chart(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """نمودار و تحلیل فروش (/sales_chart [شناسه محصول|all] [روز] [hour|day])"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        args = context.args or []
+        product_id = int(args[0]) if args and args[0].isdigit() else None
+        days = int(args[1]) if len(args) > 1 and args[1].isdigit() else 30
+        resolution = args[2].lower() if len(args) > 2 else "hour"
+        valid_product = not args or product_id is not None or args[0] == "all"
+        if not valid_product or resolution not in ("hour", "day") or not 1 <= days <= 366:
+            await update.message.reply_text(
+                "❌ استفاده: /sales_chart [شناسه محصول|all] [روز تا ۳۶۶] [hour|day]"
+            )
+            return
+
+        end_date = self.report_service.last_complete_day()
+        summary = await self.analytics_service.sales_chart(
+            end_date - timedelta(days=days - 1), end_date, resolution, product_id
+        )
+        title = f"📊 فروش محصول #{product_id}" if product_id else "📊 فروش همه محصولات"
+        await update.message.reply_photo(
+            summary["chart"], caption=self.analytics_service.caption(summary, title)
+        )
+
+    async def approve_pending(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """فهرست شارژها و رسیدهای در انتظار برای تایید گروهی (/approve_pending)"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        pending = await self.approval_service.get_pending()
+        if not pending["deposits"] and not pending["orders"]:
+            await update.message.reply_text("✅ موردی در انتظار تایید نیست.")
+            return
+
+        context.user_data['bulk_pending'] = pending
+        context.user_data['bulk_selected'] = set()
+        await update.message.reply_text(
+            self._bulk_text(pending), reply_markup=self._bulk_keyboard(pending, set())
+        )
+
+    async def handle_bulk_approval(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """انتخاب موارد و تایید گروهی (bulk_toggle_<d|o>_<id>، bulk_selected، bulk_all، bulk_cancel)"""
+        query = update.callback_query
+        await query.answer()
+
+        if not await self.is_admin(update.effective_user.id):
+            await query.edit_message_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        pending = context.user_data.get('bulk_pending')
+        selected = context.user_data.get('bulk_selected', set())
+        if pending is None:
+            await query.edit_message_text("⚠️ فهرست منقضی شده است؛ دوباره /approve_pending را بزنید.")
+            return
+
+        action = query.data[len("bulk_"):]
+        if action.startswith("toggle_"):
+            _, kind, item_id = action.split('_')
+            selected ^= {(kind, int(item_id))}
+            context.user_data['bulk_selected'] = selected
+            await query.edit_message_reply_markup(reply_markup=self._bulk_keyboard(pending, selected))
+            return
+
+        context.user_data.pop('bulk_pending', None)
+        context.user_data.pop('bulk_selected', None)
+        if action == "cancel":
+            await query.edit_message_text("❌ عملیات لغو شد.")
+            return
+
+        if action == "all":
+            deposit_ids = [d['transaction_id'] for d in pending["deposits"]]
+            order_ids = [o['order_id'] for o in pending["orders"]]
+        else:
+            deposit_ids = [item_id for kind, item_id in selected if kind == "d"]
+            order_ids = [item_id for kind, item_id in selected if kind == "o"]
+
+        approved = await self.approval_service.approve(deposit_ids, order_ids)
+        ApprovalService.notify_approved(context.bot_data['notification_service'], approved)
+
+        failed = approved["failed_orders"]
+        skipped = (
+            len(deposit_ids) + len(order_ids)
+            - len(approved["deposits"]) - len(approved["orders"]) - len(failed)
+        )
+        text = (
+            "✅ تایید گروهی انجام شد:\n\n"
+            f"💰 شارژ کیف پول: {len(approved['deposits'])}\n"
+            f"🛍 سفارش: {len(approved['orders'])}\n"
+            f"⏭ قبلاً بررسی شده: {skipped}"
+        )
+        if failed:
+            text += (
+                f"\n⚠️ تحویل ناموفق (تایید شده، نیاز به بررسی): "
+                f"{', '.join(str(o['order_id']) for o in failed)}"
+            )
+        await query.edit_message_text(text)
+
+    @staticmethod
+    def _bulk_text(pending: dict) -> str:
+        return (
+            "📋 موارد در انتظار تایید:\n\n"
+            f"💰 شارژ کیف پول: {len(pending['deposits'])}\n"
+            f"🛍 رسید سفارش: {len(pending['orders'])}\n\n"
+            "موارد را انتخاب کنید یا همه را تایید کنید."
+        )
+
+    @staticmethod
+    def _bulk_keyboard(pending: dict, selected: set) -> InlineKeyboardMarkup:
+        keyboard = []
+        for d in pending["deposits"]:
+            mark = "☑️" if ("d", d['transaction_id']) in selected else "⬜️"
+            keyboard.append([InlineKeyboardButton(
+                f"{mark} شارژ #{d['transaction_id']} - {d['amount']:,} تومان",
+                callback_data=f"bulk_toggle_d_{d['transaction_id']}"
+            )])
+        for o in pending["orders"]:
+            mark = "☑️" if ("o", o['order_id']) in selected else "⬜️"
+            keyboard.append([InlineKeyboardButton(
+                f"{mark} سفارش #{o['order_id']} - {o['total_amount']:,} تومان",
+                callback_data=f"bulk_toggle_o_{o['order_id']}"
+            )])
+        keyboard.append([
+            InlineKeyboardButton(f"✅ تایید انتخاب‌شده‌ها ({len(selected)})", callback_data="bulk_selected"),
+            InlineKeyboardButton("✅ تایید همه", callback_data="bulk_all")
+        ])
+        keyboard.append([InlineKeyboardButton("❌ انصراف", callback_data="bulk_cancel")])
+        return InlineKeyboardMarkup(keyboard)
+
+    async def generate_discount_codes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """تولید گروهی کد تخفیف یک‌بار مصرف (/generate_codes <تعداد> <percentage|fixed> <مقدار> [نام])"""
+        if not await self.is_admin(update.effective_user.id):
+            await update.message.reply_text("⛔️ شما به این بخش دسترسی ندارید.")
+            return
+
+        args = context.args or []
+        try:
+            count = int(args[0])
+            discount_type = DiscountType(args[1])
+            amount = Decimal(args[2])
+            if count <= 0 or count > 1_000_000 or amount <= 0:
+                raise ValueError
+        except (IndexError, ValueError, ArithmeticError):
+            await update.message.reply_text(
+                "❌ استفاده: /generate_codes <تعداد> <percentage|fixed> <مقدار> [نام کمپین]\n"
+                "مثال: /generate_codes 50000 percentage 15 کمپین اینفلوئنسر"
+            )
+            return
+
+        name = " ".join(args[3:]) or f"{count} کد {amount}"
+        await update.message.reply_text(f"⏳ در حال تولید {count:,} کد تخفیف...")
+        self._start_job(
+            update, context,
+            self._generate_discount_codes(update, name, count, discount_type, amount),
+            "تولید کدهای تخفیف"
+        )
+
+    async def _generate_discount_codes(self, update: Update, name: str, count: int,
+                                       discount_type: DiscountType, amount: Decimal):
+        try:
+            batch = await self.discount_service.create_code_batch(
+                name, count, {'type': discount_type.value, 'amount': amount},
+                created_by=update.effective_user.id
+            )
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        await update.message.reply_text(
+            f"✅ {batch['count']:,} کد تخفیف یک‌بار مصرف ساخته شد (دسته #{batch['batch_id']})."
+        )
+        with open(batch['file'], 'rb') as export:
+            await update.message.reply_document(export)
+
     async def add_product_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """شروع فرآیند افزودن محصول"""
         query = update.callback_query
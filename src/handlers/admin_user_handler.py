@@ -326,6 +326,9 @@ class SettingsHandler(BaseHandler):
 
         # ذخیره تنظیم
         result = await self.settings_service.update_setting(setting_key, value)
+        if result and setting_key == 'trx_rate':
+            # نرخ جدید بدون انتظار برای دوره بروزرسانی بعدی اعمال می‌شود
+            await context.bot_data['rate_service'].refresh()
         if result:
             await update.message.reply_text(
                 "✅ تنظیمات با موفقیت بروزرسانی شد.",
@@ -1,7 +1,12 @@
 # src/handlers/callback_handler.py
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
+from .admin_handlers import AdminHandler
 from .base_handler import BaseHandler
+from ..models.order import PaymentMethod
+from ..services.amount_allocator import get_amount_allocator
+from ..services.settings_service import crypto_wallet_address
+from ..services.analytics_service import AnalyticsService
 
 class CallbackHandler(BaseHandler):
     """پردازش callback queries"""
@@ -26,6 +31,10 @@ class CallbackHandler(BaseHandler):
             await self.handle_admin_callback(query)
         elif data.startswith("report_"):
             await self.handle_report_callback(query)
+        elif data.startswith("download_report_"):
+            await self.handle_report_download(update, context)
+        elif data.startswith("chart_report_"):
+            await self.handle_report_chart(query)
         else:
             await query.answer("⚠️ دستور نامعتبر")
 
@@ -101,7 +110,14 @@ class CallbackHandler(BaseHandler):
             await query.edit_message_text(message)
             
         elif payment_type == "crypto":
-            message = self.messages.payment_info(order, "crypto")
+            # ثبت روش پرداخت تا پایشگر کیف پول بتواند پرداخت را خودکار تطبیق دهد
+            await self.order_service.set_payment_method(order_id, PaymentMethod.CRYPTO)
+            allocation = await get_amount_allocator().allocate(
+                'order', order_id, order.user_id, order.total_amount
+            )
+            message = self.messages.payment_info(
+                order, "crypto", allocation.amount_trx, crypto_wallet_address()
+            )
             await query.edit_message_text(message)
             
         elif payment_type == "wallet":
@@ -172,26 +188,26 @@ class CallbackHandler(BaseHandler):
             
         data = query.data.replace("report_", "")
         
+        titles = {
+            "daily": "📊 گزارش روزانه",
+            "weekly": "📊 گزارش هفتگی",
+            "monthly": "📊 گزارش ماهانه"
+        }
         try:
-            if data == "daily":
-                report = await self.report_service.get_daily_report()
-                title = "📊 گزارش روزانه"
-            elif data == "weekly":
-                report = await self.report_service.get_weekly_report()
-                title = "📊 گزارش هفتگی"
-            elif data == "monthly":
-                report = await self.report_service.get_monthly_report()
-                title = "📊 گزارش ماهانه"
-            else:
+            if data not in titles:
                 await query.answer("❌ نوع گزارش نامعتبر است")
                 return
+            # گزارش از پیش محاسبه شده تا پایان دیروز (ReportScheduler)
+            report = await self.report_service.get_stored_report(data)
+            title = titles[data]
 
             message = (
-                f"{title}\n\n"
+                f"{title}\n"
+                f"🗓 {report['period']['start']} تا {report['period']['end']}\n\n"
                 f"💰 درآمد کل: {report['total_income']:,} تومان\n"
                 f"📦 تعداد سفارشات: {report['total_orders']:,}\n"
-                f"👥 کاربران جدید: {report['new_users']:,}\n"
-                f"🛍 محصولات فروخته شده: {report['products_sold']:,}\n\n"
+                f"👤 خریداران: {report['unique_buyers']:,}\n"
+                f"👥 کاربران جدید: {report['new_users']:,}\n\n"
                 f"🔝 پرفروش‌ترین محصولات:\n"
             )
 
@@ -214,6 +230,61 @@ class CallbackHandler(BaseHandler):
         except Exception as e:
             await query.answer(f"❌ خطا در دریافت گزارش: {str(e)}")
 
+    async def handle_report_download(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """ارسال فایل اکسل گزارش (download_report_<daily|weekly|monthly>) در پس‌زمینه"""
+        query = update.callback_query
+        if not await self.is_admin(query.from_user.id):
+            await query.answer("⛔️ شما به این بخش دسترسی ندارید")
+            return
+
+        try:
+            # همان بازه گزارش ذخیره شده (تا پایان دیروز)
+            start_date, end_date = self.report_service.period_range(
+                query.data.replace("download_report_", ""), self.report_service.last_complete_day()
+            )
+        except ValueError:
+            await query.answer("❌ نوع گزارش نامعتبر است")
+            return
+
+        await query.answer("⏳ در حال آماده‌سازی فایل گزارش...")
+        AdminHandler._start_job(
+            update, context, self._send_report(query, start_date, end_date), "تهیه فایل گزارش"
+        )
+
+    async def _send_report(self, query, start_date, end_date):
+        path = await self.report_service.generate_excel_report(start_date, end_date)
+        try:
+            with open(path, 'rb') as report_file:
+                await query.message.reply_document(
+                    report_file,
+                    filename=f"report_{start_date:%Y%m%d}_{end_date:%Y%m%d}.xlsx"
+                )
+        finally:
+            path.unlink(missing_ok=True)
+
+    async def handle_report_chart(self, query):
+        """ارسال نمودار فروش بازه گزارش (chart_report_<daily|weekly|monthly>)"""
+        if not await self.is_admin(query.from_user.id):
+            await query.answer("⛔️ شما به این بخش دسترسی ندارید")
+            return
+
+        period = query.data.replace("chart_report_", "")
+        try:
+            start_date, end_date = self.report_service.period_range(
+                period, self.report_service.last_complete_day()
+            )
+        except ValueError:
+            await query.answer("❌ نوع گزارش نامعتبر است")
+            return
+
+        await query.answer("⏳ در حال رسم نمودار...")
+        # گزارش ماهانه روزانه و بقیه ساعتی رسم می‌شوند
+        resolution = "day" if period == "monthly" else "hour"
+        summary = await AnalyticsService(self.db).sales_chart(start_date, end_date, resolution)
+        await query.message.reply_photo(
+            summary["chart"], caption=AnalyticsService.caption(summary, "📊 نمودار فروش")
+        )
+
     async def show_main_menu(self, query):
         """نمایش منوی اصلی"""
         await query.answer()
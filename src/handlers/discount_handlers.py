@@ -8,12 +8,20 @@ from decimal import Decimal
 from datetime import datetime
 from .base_handler import BaseHandler
 from ..models.discount import DiscountType, DiscountTarget
+from ..services.discount_index import normalize_code
+from ..services.discount_service import DiscountService
+from ..services.order_service import OrderService
 
 from ..constants import *
 
 class DiscountHandler(BaseHandler):
     """هندلر مدیریت تخفیف‌ها"""
 
+    def __init__(self, db):
+        super().__init__(db)
+        self.discount_service = DiscountService(db)
+        self.order_service = OrderService(db)
+
     async def show_discount_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش منوی مدیریت تخفیف"""
         query = update.callback_query
@@ -36,7 +44,9 @@ class DiscountHandler(BaseHandler):
         """پردازش کد تخفیف وارد شده توسط کاربر"""
         code = update.message.text
 
-        if 'cart' not in context.user_data:
+        cart_service = context.bot_data['cart_service']
+        cart_data = await cart_service.get_cart_data(update.effective_user.id)
+        if not cart_data['items']:
             await update.message.reply_text(
                 "❌ سبد خرید شما خالی است."
             )
@@ -45,7 +55,8 @@ class DiscountHandler(BaseHandler):
         # بررسی اعتبار کد تخفیف
         result = await self.discount_service.validate_discount_code(
             code=code,
-            cart_data=context.user_data['cart']
+            cart_data=cart_data,
+            user_id=update.effective_user.id
         )
 
         if result['valid']:
@@ -57,6 +68,8 @@ class DiscountHandler(BaseHandler):
                 f"💰 مبلغ تخفیف: {result['amount']:,} تومان\n"
                 f"📊 مبلغ نهایی: {result['final_amount']:,} تومان"
             )
+            if result.get('automatic') and result['code'] != normalize_code(code):
+                message += "\n\n🎁 تخفیف خودکار سبد شما بیشتر از این کد بود و به جای آن اعمال شد."
             
             keyboard = [
                 [InlineKeyboardButton("💳 ادامه پرداخت", callback_data="proceed_to_payment")],
@@ -75,6 +88,42 @@ class DiscountHandler(BaseHandler):
         )
         return ConversationHandler.END
 
+    async def proceed_to_payment(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """ثبت سفارش سبد با تخفیف معتبر شده و نمایش روش‌های پرداخت"""
+        query = update.callback_query
+        await query.answer()
+        user_id = update.effective_user.id
+
+        cart_service = context.bot_data['cart_service']
+        cart_data = await cart_service.get_cart_data(user_id)
+        if not cart_data['items']:
+            await query.edit_message_text("❌ سبد خرید شما خالی است.")
+            return
+
+        # استفاده از تخفیف در همان تراکنش ثبت سفارش claim می‌شود
+        discount = context.user_data.pop('discount', None)
+        order = await self.order_service.create_order(user_id, cart_data['items'], discount=discount)
+        if not order:
+            if discount:
+                message = "❌ کد تخفیف دیگر برای سبد شما معتبر نیست یا ظرفیت آن تمام شده است. لطفاً دوباره تلاش کنید."
+            else:
+                message = "❌ خطا در ثبت سفارش. لطفاً دوباره تلاش کنید."
+            await query.edit_message_text(message)
+            return
+
+        await cart_service.clear(user_id)
+        message = f"🧾 سفارش شماره {order['order_id']} ثبت شد\n\n"
+        if discount:
+            message += f"🎫 کد تخفیف اعمال شده: {discount['code']}\n"
+        message += (
+            f"💰 مبلغ قابل پرداخت: {order['total_amount']:,} تومان\n\n"
+            "روش پرداخت را انتخاب کنید:"
+        )
+        await query.edit_message_text(
+            message,
+            reply_markup=self.keyboards.payment_methods(order['order_id'])
+        )
+
     async def start_add_discount(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """شروع فرآیند افزودن تخفیف جدید"""
         query = update.callback_query
@@ -3,57 +3,95 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from . import BaseHandler
 from ..constants import *
+from ..services.approval_service import ApprovalService
+from ..services.amount_allocator import get_amount_allocator
+from ..utils.formatters import calculate_trx_amount
 
 class TransactionHandler(BaseHandler):
     """هندلر مدیریت تراکنش‌ها"""
 
     async def handle_crypto_payment(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """پردازش پرداخت کریپتو"""
-        if not context.user_data.get('payment_data'):
+        """پردازش TXID شارژ کریپتو
+
+        TXID به همان درخواست شارژ در انتظار (pending_tx_id) متصل می‌شود و تسویه در یک تراکنش
+        دیتابیسی انجام می‌شود؛ پایشگر کیف پول و بررسی دسته‌ای همان درخواست را دوباره شارژ نمی‌کنند.
+        اگر بررسی فوری نتیجه قطعی نداشته باشد، TXID روی درخواست ذخیره و به بررسی دسته‌ای سپرده می‌شود.
+        """
+        pending_tx_id = context.user_data.get('pending_tx_id')
+        if not pending_tx_id:
             await update.message.reply_text(
                 "❌ خطا: اطلاعات پرداخت یافت نشد.\n"
                 "لطفاً دوباره از منوی خرید اقدام کنید."
             )
             return ConversationHandler.END
 
-        tx_hash = update.message.text.strip()
-        payment_data = context.user_data['payment_data']
+        tx_hash = self.transaction_service.txid_registry.normalize(update.message.text)
+        if not tx_hash:
+            await update.message.reply_text(
+                "❌ شناسه تراکنش (TXID) نامعتبر است.\n"
+                "لطفاً مجدداً وارد کنید:"
+            )
+            return WAITING_CRYPTO_HASH
+
+        request = await self.transaction_service.get_pending_crypto_deposit(
+            pending_tx_id, update.effective_user.id
+        )
+        if not request:
+            await update.message.reply_text(
+                "⚠️ این درخواست شارژ قبلاً تایید شده یا دیگر معتبر نیست."
+            )
+            context.user_data.clear()
+            return ConversationHandler.END
+
+        # مبلغ مورد انتظار به TRX: مبلغ یکتای فاکتور که به کاربر نمایش داده شده است
+        allocation = get_amount_allocator().get('deposit', pending_tx_id)
+        expected_amount = (
+            allocation.amount_trx if allocation
+            else calculate_trx_amount(request['amount'])
+        )
 
         # بررسی تراکنش
         result = await self.transaction_service.verify_crypto_transaction(
             tx_hash=tx_hash,
-            expected_amount=payment_data['amount']
+            expected_amount=expected_amount,
+            expected_sun=allocation.amount_sun if allocation else None,
+            requested_at=request['created_at']
         )
 
         if result["success"]:
-            # ثبت تراکنش
-            tx_data = {
-                'user_id': update.effective_user.id,
-                'type': 'deposit',
-                'amount': payment_data['amount'],
-                'method': 'crypto',
-                'reference_id': tx_hash,
-                'description': f"شارژ کیف پول با ترون - {tx_hash[:8]}"
-            }
-            
-            tx_id = await self.transaction_service.create_transaction(tx_data)
-            
-            if tx_id:
-                # بروزرسانی موجودی کیف پول
-                await self.wallet_service.add_funds(
-                    user_id=update.effective_user.id,
-                    amount=payment_data['amount']
-                )
-                
+            # مصرف TXID، تکمیل درخواست و ثبت ردیف دفتر در یک تراکنش
+            new_balance = await self.transaction_service.settle_crypto_deposit(
+                transaction_id=pending_tx_id,
+                user_id=update.effective_user.id,
+                tx_hash=tx_hash,
+                amount_sun=result["transaction"]["amount_sun"]
+            )
+
+            if new_balance is not None:
+                await get_amount_allocator().release('deposit', pending_tx_id)
                 await update.message.reply_text(
-                    "✅ تراکنش با موفقیت تایید و کیف پول شما شارژ شد.",
+                    "✅ تراکنش با موفقیت تایید و کیف پول شما شارژ شد.\n"
+                    f"💰 موجودی جدید: {new_balance:,} تومان",
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton("👛 مشاهده کیف پول", callback_data="show_wallet")
                     ]])
                 )
             else:
                 await update.message.reply_text(
-                    "❌ خطا در ثبت تراکنش. لطفاً با پشتیبانی تماس بگیرید."
+                    "⚠️ این تراکنش قبلاً استفاده شده یا این شارژ قبلاً تایید شده است."
+                )
+        elif result.get("pending"):
+            # TronGrid در دسترس نیست یا تراکنش هنوز منتشر نشده؛ بررسی دسته‌ای همین درخواست را تسویه می‌کند
+            if await self.transaction_service.queue_crypto_deposit(
+                pending_tx_id, update.effective_user.id, tx_hash
+            ):
+                await update.message.reply_text(
+                    "⏳ تراکنش شما ثبت شد و در صف بررسی قرار گرفت.\n"
+                    "پس از تایید در شبکه، کیف پول شما به صورت خودکار شارژ می‌شود."
+                )
+            else:
+                await update.message.reply_text(
+                    "⚠️ این تراکنش قبلاً استفاده شده یا این شارژ قبلاً تایید شده است."
                 )
         else:
             await update.message.reply_text(
@@ -181,74 +219,51 @@ class TransactionHandler(BaseHandler):
             await query.edit_message_text("⛔️ شما به این بخش دسترسی ندارید.")
             return
 
-        action, tx_id = query.data.split('_')[1:]
-        tx_id = int(tx_id)
+        # approve_payment_<id> / reject_payment_<id>
+        parts = query.data.split('_')
+        action, tx_id = parts[0], int(parts[-1])
 
         # دریافت اطلاعات تراکنش
         async with self.db.pool.acquire() as conn:
             tx = await conn.fetchrow("""
-                SELECT * FROM transactions WHERE transaction_id = $1
+                SELECT transaction_id, status FROM transactions WHERE transaction_id = $1
             """, tx_id)
 
-            if not tx:
-                await query.edit_message_text("❌ تراکنش یافت نشد.")
-                return
-
-            if tx['status'] != TransactionStatus.PENDING.value:
-                await query.edit_message_text(
-                    f"⚠️ این تراکنش قبلاً {tx['status']} شده است."
-                )
-                return
+        if not tx:
+            await query.edit_message_text("❌ تراکنش یافت نشد.")
+            return
 
-            if action == "approve":
-                # تایید تراکنش
-                async with conn.transaction():
-                    # بروزرسانی وضعیت تراکنش
-                    await conn.execute("""
-                        UPDATE transactions
-                        SET status = $1, updated_at = NOW()
-                        WHERE transaction_id = $2
-                    """, TransactionStatus.COMPLETED.value, tx_id)
-
-                    # اضافه کردن موجودی به کیف پول
-                    await self.wallet_service.add_funds(
-                        user_id=tx['user_id'],
-                        amount=tx['amount']
-                    )
+        if tx['status'] != TransactionStatus.PENDING.value:
+            await query.edit_message_text(
+                f"⚠️ این تراکنش قبلاً {tx['status']} شده است."
+            )
+            return
 
-                # اطلاع‌رسانی به کاربر
-                try:
-                    await context.bot.send_message(
-                        chat_id=tx['user_id'],
-                        text=(
-                            "✅ پرداخت شما تایید شد!\n\n"
-                            f"💰 مبلغ: {tx['amount']:,} تومان\n"
-                            "کیف پول شما شارژ شد."
-                        ),
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("👛 مشاهده کیف پول", callback_data="show_wallet")
-                        ]])
-                    )
-                except Exception:
-                    pass  # اگر کاربر ربات را بلاک کرده باشد
+        if action == "approve":
+            # همان مسیر تایید گروهی: بروزرسانی وضعیت و ثبت ردیف دفتر در یک تراکنش
+            approved = await ApprovalService(self.db).approve(deposit_ids=[tx_id])
+            if not approved["deposits"]:
+                await query.edit_message_text("⚠️ این تراکنش همزمان توسط ادمین دیگری بررسی شد.")
+                return
 
-                await query.edit_message_text(
-                    "✅ تراکنش با موفقیت تایید و کیف پول کاربر شارژ شد."
-                )
+            ApprovalService.notify_approved(context.bot_data['notification_service'], approved)
+            await query.edit_message_text(
+                "✅ تراکنش با موفقیت تایید و کیف پول کاربر شارژ شد."
+            )
 
-            else:  # reject
-                # درخواست دلیل رد
-                context.user_data['rejecting_tx_id'] = tx_id
-                
-                keyboard = [[
-                    InlineKeyboardButton("🔙 انصراف", callback_data=f"cancel_rejection_{tx_id}")
-                ]]
-                
-                await query.edit_message_text(
-                    "❓ لطفاً دلیل رد تراکنش را وارد کنید:",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-                return WAITING_REJECTION_REASON
+        else:  # reject
+            # درخواست دلیل رد
+            context.user_data['rejecting_tx_id'] = tx_id
+            
+            keyboard = [[
+                InlineKeyboardButton("🔙 انصراف", callback_data=f"cancel_rejection_{tx_id}")
+            ]]
+            
+            await query.edit_message_text(
+                "❓ لطفاً دلیل رد تراکنش را وارد کنید:",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return WAITING_REJECTION_REASON
 
     async def handle_payment_rejection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پردازش دلیل رد پرداخت"""
@@ -4,11 +4,21 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from .base_handler import BaseHandler
 from datetime import datetime
+from ..services.wallet_service import WalletService
+from ..services.settings_service import SettingsService, crypto_wallet_address
+from ..services.transaction_service import TransactionService
+from ..services.amount_allocator import get_amount_allocator
 from ..constants import *
 
 class WalletHandler(BaseHandler):
     """هندلر مدیریت کیف پول"""
 
+    def __init__(self, db):
+        super().__init__(db)
+        self.wallet_service = WalletService(db)
+        self.settings_service = SettingsService(db)
+        self.transaction_service = TransactionService(db)
+
     async def handle_deposit_amount(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پردازش مبلغ شارژ کیف پول"""
         try:
@@ -74,19 +84,31 @@ class WalletHandler(BaseHandler):
             )
 
         else:  # crypto
-            # محاسبه معادل TRX
-            trx_rate = await self.crypto_service.get_trx_rate()
-            trx_amount = amount / trx_rate
-
-            # دریافت آدرس کیف پول از تنظیمات
-            wallet_address = await self.settings_service.get_setting('crypto_wallet_address')
+            # همان آدرسی که پایشگر کیف پول پایش می‌کند
+            wallet_address = crypto_wallet_address()
             
+            # ثبت شارژ در انتظار تا پایشگر کیف پول بتواند پرداخت را خودکار تطبیق دهد
+            tx_id = await self.transaction_service.create_transaction({
+                'user_id': query.from_user.id,
+                'type': 'deposit',
+                'amount': amount,
+                'method': 'crypto',
+                'description': "شارژ کیف پول با ترون - در انتظار پرداخت"
+            })
+            context.user_data['pending_tx_id'] = tx_id
+
+            # مبلغ یکتای TRX برای تطبیق بدون ابهام
+            allocation = await get_amount_allocator().allocate(
+                'deposit', tx_id, query.from_user.id, amount
+            )
+
             message = (
                 f"🌐 اطلاعات پرداخت ترون:\n\n"
                 f"💰 مبلغ: {amount:,} تومان\n"
-                f"💎 معادل: {trx_amount:.2f} TRX\n"
+                f"💎 مبلغ قابل پرداخت: {allocation.amount_trx} TRX\n"
                 f"📝 آدرس کیف پول: {wallet_address}\n\n"
-                "لطفاً پس از انجام تراکنش، TXID را ارسال کنید."
+                "لطفاً دقیقاً همین مبلغ را واریز کنید تا پرداخت شما به صورت خودکار شناسایی شود.\n"
+                "در صورت تاخیر، TXID تراکنش را ارسال کنید."
             )
 
         context.user_data['payment_method'] = method
@@ -31,5 +31,6 @@ class Discount(BaseModel):
     start_date: Optional[datetime]
     end_date: Optional[datetime]
     is_active: bool = True
+    is_automatic: bool = False  # اعمال خودکار بدون کد
     created_at: datetime
     updated_at: datetime
\ No newline at end of file
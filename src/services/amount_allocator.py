@@ -0,0 +1,225 @@
+# src/services/amount_allocator.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from ..config import Config
+from ..utils.formatters import calculate_trx_amount
+from .rate_service import get_rate_service
+
+# مبلغ پایه به مضرب 0.01 TRX گرد می‌شود و اختلاف هر فاکتور در ارقام سان کمتر از آن قرار می‌گیرد.
+# چون همه مبالغ یکتای یک پایه در فاصله 0.01 TRX از هم هستند، بررسی دستی TXID برای فاکتور دارای
+# تخصیص مبلغ را دقیقاً (به سان) مقایسه می‌کند و تلورانس فقط برای درخواست‌های بدون تخصیص است
+BASE_STEP_SUN = 10_000
+MAX_DELTA_SUN = BASE_STEP_SUN - 1
+
+
+@dataclass
+class Allocation:
+    """مبلغ یکتای تخصیص داده شده به یک سفارش یا شارژ کریپتو"""
+    kind: str  # order یا deposit
+    ref_id: int
+    user_id: int
+    amount: Decimal
+    amount_sun: int
+    created_ms: int
+    expires_ms: int
+    rate: Optional[Decimal] = None  # نرخ قفل شده در زمان صدور فاکتور
+
+    @property
+    def amount_trx(self) -> Decimal:
+        return Decimal(self.amount_sun) / 1_000_000
+
+    def is_expired(self, now_ms: Optional[int] = None) -> bool:
+        return (now_ms or int(time.time() * 1000)) >= self.expires_ms
+
+
+class AmountAllocationError(Exception):
+    """همه مبالغ یکتای یک بازه در حال استفاده هستند"""
+
+
+class AmountAllocator:
+    """تخصیص مبلغ یکتا (به سان) به فاکتورهای کریپتوی در انتظار
+
+    نگاشت مبلغ به فاکتور در حافظه نگهداری می‌شود تا مبلغ دریافتی در O(1) و بدون ابهام
+    به فاکتور خود برسد؛ جدول crypto_invoices یکتایی را بین پروسه‌ها و پس از راه‌اندازی مجدد تضمین می‌کند.
+    """
+
+    def __init__(self, db, ttl: Optional[int] = None):
+        self.db = db
+        self.ttl = ttl or Config.CRYPTO_INVOICE_TTL
+        self.logger = logging.getLogger(__name__)
+        self._by_amount: Dict[int, Allocation] = {}
+        self._by_ref: Dict[Tuple[str, int], int] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._by_amount)
+
+    async def load(self):
+        """بارگذاری تخصیص‌های فعال از دیتابیس (شامل فاکتورهای صادر شده در نمونه‌های دیگر ربات)
+
+        با قفل allocate اجرا می‌شود تا تخصیصی که همزمان ثبت می‌شود از نگاشت حافظه حذف نشود.
+        """
+        async with self._lock:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT amount_sun, kind, ref_id, user_id, amount, rate, created_at, expires_at
+                    FROM crypto_invoices
+                    WHERE expires_at > NOW()
+                """)
+            self._by_amount.clear()
+            self._by_ref.clear()
+            for row in rows:
+                self._add(Allocation(
+                    kind=row['kind'],
+                    ref_id=row['ref_id'],
+                    user_id=row['user_id'],
+                    amount=row['amount'],
+                    amount_sun=row['amount_sun'],
+                    created_ms=int(row['created_at'].timestamp() * 1000),
+                    expires_ms=int(row['expires_at'].timestamp() * 1000),
+                    rate=row['rate']
+                ))
+
+    async def allocate(self, kind: str, ref_id: int, user_id: int, amount: Decimal) -> Allocation:
+        """تخصیص مبلغ یکتا به فاکتور؛ برای فاکتور تکراری همان تخصیص قبلی برگردانده می‌شود"""
+        async with self._lock:
+            existing = self.get(kind, ref_id)
+            if existing:
+                return existing
+            stale_sun = self._by_ref.get((kind, ref_id))
+            if stale_sun is not None:
+                self._discard(self._by_amount[stale_sun])
+
+            # نرخ تا پایان اعتبار فاکتور ثابت می‌ماند
+            rate = get_rate_service().current()
+            expected_sun = int(round(calculate_trx_amount(amount, rate) * 1_000_000))
+            base_sun = expected_sun - expected_sun % BASE_STEP_SUN
+            now_ms = int(time.time() * 1000)
+
+            async with self.db.pool.acquire() as conn:
+                for delta in range(1, MAX_DELTA_SUN + 1):
+                    amount_sun = base_sun + delta
+                    current = self._by_amount.get(amount_sun)
+                    if current and not current.is_expired(now_ms):
+                        continue
+
+                    # رکورد منقضی شده همان مبلغ بازنویسی می‌شود؛ رکورد فعال پروسه دیگر دست نمی‌خورد.
+                    # فاکتور منقضی قبلی همین سفارش یا شارژ (UNIQUE(kind, ref_id)) در همان دستور حذف
+                    # می‌شود؛ ارجاع به stale اجرای حذف را پیش از درج تضمین می‌کند
+                    row = await conn.fetchrow("""
+                        WITH stale AS (
+                            DELETE FROM crypto_invoices
+                            WHERE kind = $2 AND ref_id = $3 AND expires_at <= NOW()
+                            RETURNING amount_sun
+                        )
+                        INSERT INTO crypto_invoices (amount_sun, kind, ref_id, user_id, amount, rate, expires_at)
+                        SELECT $1, $2, $3, $4, $5, $7, NOW() + make_interval(secs => $6)
+                        FROM (SELECT COUNT(*) FROM stale) AS removed
+                        ON CONFLICT (amount_sun) DO UPDATE
+                        SET kind = EXCLUDED.kind,
+                            ref_id = EXCLUDED.ref_id,
+                            user_id = EXCLUDED.user_id,
+                            amount = EXCLUDED.amount,
+                            rate = EXCLUDED.rate,
+                            created_at = NOW(),
+                            expires_at = EXCLUDED.expires_at
+                        WHERE crypto_invoices.expires_at <= NOW()
+                        RETURNING created_at, expires_at
+                    """, amount_sun, kind, ref_id, user_id, amount, self.ttl, rate)
+                    if not row:
+                        continue
+
+                    if current:
+                        self._discard(current)
+                    allocation = Allocation(
+                        kind=kind,
+                        ref_id=ref_id,
+                        user_id=user_id,
+                        amount=amount,
+                        amount_sun=amount_sun,
+                        created_ms=int(row['created_at'].timestamp() * 1000),
+                        expires_ms=int(row['expires_at'].timestamp() * 1000),
+                        rate=rate
+                    )
+                    self._add(allocation)
+                    return allocation
+
+        raise AmountAllocationError(f"مبلغ یکتای آزاد برای {amount} تومان یافت نشد")
+
+    def lookup(self, amount_sun: int) -> Optional[Allocation]:
+        """یافتن فاکتور مبلغ دریافتی (O(1))"""
+        allocation = self._by_amount.get(amount_sun)
+        if allocation and not allocation.is_expired():
+            return allocation
+        return None
+
+    def get(self, kind: str, ref_id: int) -> Optional[Allocation]:
+        """تخصیص فعال یک سفارش یا شارژ"""
+        amount_sun = self._by_ref.get((kind, ref_id))
+        return self.lookup(amount_sun) if amount_sun is not None else None
+
+    def oldest_created_ms(self) -> Optional[int]:
+        """زمان ثبت قدیمی‌ترین فاکتور فعال"""
+        now_ms = int(time.time() * 1000)
+        active = [a.created_ms for a in self._by_amount.values() if not a.is_expired(now_ms)]
+        return min(active) if active else None
+
+    async def release(self, kind: str, ref_id: int):
+        """آزادسازی مبلغ پس از تسویه یا لغو فاکتور"""
+        amount_sun = self._by_ref.get((kind, ref_id))
+        if amount_sun is not None:
+            self._discard(self._by_amount[amount_sun])
+        async with self.db.pool.acquire() as conn:
+            await conn.execute("""
+                DELETE FROM crypto_invoices WHERE kind = $1 AND ref_id = $2
+            """, kind, ref_id)
+
+    async def release_many(self, kind: str, ref_ids: List[int]):
+        """آزادسازی دسته‌ای مبالغ"""
+        if not ref_ids:
+            return
+        for ref_id in ref_ids:
+            amount_sun = self._by_ref.get((kind, ref_id))
+            if amount_sun is not None:
+                self._discard(self._by_amount[amount_sun])
+        async with self.db.pool.acquire() as conn:
+            await conn.execute("""
+                DELETE FROM crypto_invoices WHERE kind = $1 AND ref_id = ANY($2::int[])
+            """, kind, ref_ids)
+
+    async def release_expired(self) -> int:
+        """آزادسازی مبالغ فاکتورهای منقضی شده"""
+        now_ms = int(time.time() * 1000)
+        for allocation in [a for a in self._by_amount.values() if a.is_expired(now_ms)]:
+            self._discard(allocation)
+        async with self.db.pool.acquire() as conn:
+            result = await conn.execute("""
+                DELETE FROM crypto_invoices WHERE expires_at <= NOW()
+            """)
+        return int(result.split()[-1])
+
+    def _add(self, allocation: Allocation):
+        self._by_amount[allocation.amount_sun] = allocation
+        self._by_ref[(allocation.kind, allocation.ref_id)] = allocation.amount_sun
+
+    def _discard(self, allocation: Allocation):
+        self._by_amount.pop(allocation.amount_sun, None)
+        if self._by_ref.get((allocation.kind, allocation.ref_id)) == allocation.amount_sun:
+            del self._by_ref[(allocation.kind, allocation.ref_id)]
+
+
+_allocator: Optional[AmountAllocator] = None
+
+
+def get_amount_allocator(db=None) -> AmountAllocator:
+    """تخصیص‌دهنده مشترک برنامه"""
+    global _allocator
+    if _allocator is None:
+        if db is None:
+            raise RuntimeError("تخصیص‌دهنده مبلغ هنوز راه‌اندازی نشده است")
+        _allocator = AmountAllocator(db)
+    return _allocator
@@ -0,0 +1,163 @@
+# src/services/analytics_service.py
+import asyncio
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional
+import numpy as np
+from ..config import Config
+from ..utils.charts import render_line_chart
+from ..utils.timeseries import moving_average, period_delta, ses_forecast, window_change
+
+RESOLUTIONS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+@dataclass
+class SalesSeries:
+    """سری فروش پیوسته (بازه‌های بدون فروش صفر) از ابتدای start با گام step به وقت فروشگاه"""
+    start: datetime
+    step: timedelta
+    revenue: np.ndarray
+    quantity: np.ndarray
+    sales: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.revenue)
+
+    @property
+    def season(self) -> int:
+        """تعداد گام‌های یک هفته (۷ روز یا ۱۶۸ ساعت)"""
+        return int(timedelta(days=7) / self.step)
+
+    @property
+    def window(self) -> int:
+        """پنجره میانگین متحرک و افق پیش‌بینی: ۲۴ ساعت یا ۷ روز"""
+        return 24 if self.step < timedelta(days=1) else 7
+
+
+class AnalyticsService:
+    """تحلیل سری زمانی فروش از جمع‌های daily_product_sales و hourly_product_sales
+
+    سری با یک پرس‌وجوی گروه‌بندی شده خوانده و با شماره گام در آرایه NumPy جایگذاری می‌شود؛
+    میانگین متحرک، مقایسه هفته به هفته و پیش‌بینی هموارسازی نمایی به صورت برداری محاسبه
+    می‌شوند و نمودار با Pillow رسم می‌شود.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def sales_series(self, start_date: date, end_date: date, resolution: str = "day",
+                           product_id: Optional[int] = None) -> SalesSeries:
+        """سری فروش روزهای start_date تا end_date (همه محصولات یا یک محصول)"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"دقت نامعتبر: {resolution}")
+        step = RESOLUTIONS[resolution]
+        start = datetime.combine(start_date, time.min)
+        end = datetime.combine(end_date + timedelta(days=1), time.min)
+        length = int((end - start) / step)
+
+        async with self.db.pool.acquire() as conn:
+            if resolution == "hour":
+                rows = await conn.fetch("""
+                    SELECT (EXTRACT(EPOCH FROM hour - $1) / 3600)::int,
+                           SUM(revenue)::float8, SUM(quantity)::float8, SUM(sales)::float8
+                    FROM hourly_product_sales
+                    WHERE hour >= $1 AND hour < $2
+                    AND ($3::int IS NULL OR product_id = $3)
+                    GROUP BY hour
+                """, start, end, product_id)
+            else:
+                rows = await conn.fetch("""
+                    SELECT day - $1::date,
+                           SUM(revenue)::float8, SUM(quantity)::float8, SUM(sales)::float8
+                    FROM daily_product_sales
+                    WHERE day >= $1::date AND day < $2::date
+                    AND ($3::int IS NULL OR product_id = $3)
+                    GROUP BY day
+                """, start.date(), end.date(), product_id)
+
+        columns = np.zeros((3, length))
+        if rows:
+            data = np.array([tuple(row) for row in rows], dtype=float)
+            columns[:, data[:, 0].astype(int)] = data[:, 1:].T
+        return SalesSeries(start, step, *columns)
+
+    @staticmethod
+    def summarize(series: SalesSeries, alpha: float = None) -> Dict[str, Any]:
+        """میانگین متحرک، تغییر هفته به هفته و پیش‌بینی یک پنجره آینده (۲۴ ساعت یا ۷ روز)
+
+        اختلاف هر گام با همان گام هفته قبل (week_delta) به صورت برداری محاسبه می‌شود و بیشترین
+        رشد و افت آن (top_gain و top_drop) در کپشن نمایش داده می‌شوند.
+        """
+        alpha = alpha or Config.ANALYTICS_SMOOTHING
+        revenue = series.revenue
+        forecast = ses_forecast(revenue, alpha, series.window)
+        current, previous, change = window_change(revenue, series.season)
+        delta, ratio = period_delta(revenue, series.season)
+
+        def extreme(index: int, sign: int) -> Optional[Dict[str, Any]]:
+            if sign * delta[index] <= 0:
+                return None
+            return {
+                "at": series.start + series.step * index,
+                "delta": float(delta[index]),
+                "change": None if math.isnan(ratio[index]) else float(ratio[index]) * 100
+            }
+
+        has_delta = not np.isnan(delta).all()
+        return {
+            "total_revenue": float(revenue.sum()),
+            "total_quantity": int(series.quantity.sum()),
+            "average": moving_average(revenue, series.window),
+            "week_revenue": current,
+            "previous_week_revenue": previous,
+            "week_change": None if math.isnan(change) else change,
+            "forecast": forecast,
+            "forecast_total": float(forecast.sum()),
+            "week_delta": delta,
+            "top_gain": extreme(int(np.nanargmax(delta)), 1) if has_delta else None,
+            "top_drop": extreme(int(np.nanargmin(delta)), -1) if has_delta else None
+        }
+
+    async def sales_chart(self, start_date: date, end_date: date, resolution: str = "day",
+                          product_id: Optional[int] = None) -> Dict[str, Any]:
+        """تحلیل و نمودار PNG فروش؛ بازه برای مقایسه هفتگی حداقل دو هفته در نظر گرفته می‌شود"""
+        start_date = min(start_date, end_date - timedelta(days=13))
+        series = await self.sales_series(start_date, end_date, resolution, product_id)
+        summary = self.summarize(series)
+        scope = f"product {product_id}" if product_id else "all products"
+        title = f"{scope} | {start_date:%Y-%m-%d} .. {end_date:%Y-%m-%d} | per {resolution}"
+        # رسم نمودار محاسبه CPU است و حلقه رویداد را نگه نمی‌دارد
+        summary["chart"] = await asyncio.to_thread(
+            render_line_chart, series.revenue, series.start, series.step,
+            summary["average"], summary["forecast"], title=title
+        )
+        summary["series"] = series
+        return summary
+
+    @staticmethod
+    def caption(summary: Dict[str, Any], title: str) -> str:
+        """متن همراه نمودار"""
+        series = summary["series"]
+        unit = "۲۴ ساعت" if series.window == 24 else "۷ روز"
+        change = summary["week_change"]
+        change_text = "—" if change is None else f"{change:+.1f}٪"
+        text = (
+            f"{title}\n\n"
+            f"💰 فروش کل بازه: {summary['total_revenue']:,.0f} تومان\n"
+            f"🛍 تعداد فروخته شده: {summary['total_quantity']:,}\n"
+            f"📅 هفت روز اخیر: {summary['week_revenue']:,.0f} تومان "
+            f"(هفته قبل {summary['previous_week_revenue']:,.0f}، تغییر {change_text})\n"
+            f"🔮 پیش‌بینی {unit} آینده: {summary['forecast_total']:,.0f} تومان"
+        )
+        # بیشترین رشد و افت نسبت به همان ساعت یا روز هفته قبل
+        time_format = "%Y-%m-%d %H:00" if series.window == 24 else "%Y-%m-%d"
+        for key, label in (("top_gain", "📈 بیشترین رشد"), ("top_drop", "📉 بیشترین افت")):
+            point = summary.get(key)
+            if point:
+                percent = "" if point["change"] is None else f"، {point['change']:+.0f}٪"
+                text += (
+                    f"\n{label} نسبت به هفته قبل: {point['at']:{time_format}} "
+                    f"({point['delta']:+,.0f} تومان{percent})"
+                )
+        return text
@@ -0,0 +1,138 @@
+# src/services/approval_service.py
+import logging
+from typing import Dict, List, Optional, Any
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from ..config import Config
+from ..constants import TransactionStatus
+from ..models.order import OrderStatus
+from .order_service import OrderService
+from .wallet_service import WalletService, wallet_transaction
+
+
+class ApprovalService:
+    """تایید گروهی شارژهای کارت به کارت و رسیدهای پرداخت سفارش
+
+    همه موارد انتخاب شده در یک تراکنش دیتابیسی با بروزرسانی‌های مجموعه‌ای تایید می‌شوند:
+    یک UPDATE برای درخواست‌های شارژ، یک دستور برای افزایش موجودی و ثبت ردیف‌های دفتر و
+    یک UPDATE برای سفارش‌ها. مواردی که در این فاصله تایید یا رد شده‌اند نادیده گرفته می‌شوند.
+    سفارش‌های تایید شده پس از commit مانند تایید تکی از update_order_status می‌گذرند (کسر
+    موجودی و تحویل محصول) و فقط سفارش‌های تحویل شده به کاربر اطلاع داده می‌شوند.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.order_service = OrderService(db)
+        self.logger = logging.getLogger(__name__)
+
+    async def get_pending(self, limit: int = None) -> Dict[str, List[Dict[str, Any]]]:
+        """شارژهای کارت و سفارش‌های در انتظار تایید (قدیمی‌ترین اول)"""
+        limit = limit or Config.APPROVAL_PAGE_SIZE
+        async with self.db.pool.acquire() as conn:
+            deposits = await conn.fetch("""
+                SELECT transaction_id, user_id, amount, created_at
+                FROM transactions
+                WHERE type = 'deposit' AND method = 'card' AND status = $1
+                ORDER BY created_at
+                LIMIT $2
+            """, TransactionStatus.PENDING.value, limit)
+            orders = await conn.fetch("""
+                SELECT order_id, user_id, total_amount, created_at
+                FROM orders
+                WHERE status = $1
+                ORDER BY created_at
+                LIMIT $2
+            """, OrderStatus.PAYMENT_VERIFICATION.value, limit)
+        return {
+            "deposits": [dict(row) for row in deposits],
+            "orders": [dict(row) for row in orders]
+        }
+
+    async def approve(self, deposit_ids: Optional[List[int]] = None,
+                      order_ids: Optional[List[int]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """تایید گروهی در یک تراکنش؛ فقط موارد واقعاً تایید شده برگردانده می‌شوند
+
+        سفارش‌هایی که تایید شدند ولی تحویل آن‌ها ناموفق بود در failed_orders برگردانده می‌شوند.
+        """
+        deposit_ids = list(deposit_ids or [])
+        order_ids = list(order_ids or [])
+        deposits: List[Any] = []
+        orders: List[Any] = []
+
+        user_ids: List[int] = []
+        if deposit_ids:
+            # نوبت کیف پول کاربران پیش از شروع تراکنش گرفته می‌شود
+            async with self.db.pool.acquire() as conn:
+                user_ids = [row['user_id'] for row in await conn.fetch("""
+                    SELECT DISTINCT user_id FROM transactions
+                    WHERE transaction_id = ANY($1::int[]) AND type = 'deposit' AND status = $2
+                """, deposit_ids, TransactionStatus.PENDING.value)]
+
+        async with wallet_transaction(self.db, *user_ids) as conn:
+            if user_ids:
+                deposits = await conn.fetch("""
+                    UPDATE transactions
+                    SET status = $2, updated_at = NOW()
+                    WHERE transaction_id = ANY($1::int[])
+                    AND type = 'deposit' AND status = $3
+                    AND user_id = ANY($4::bigint[])
+                    RETURNING transaction_id, user_id, amount
+                """, deposit_ids, TransactionStatus.COMPLETED.value,
+                    TransactionStatus.PENDING.value, user_ids)
+                if deposits:
+                    await WalletService.credit_many(conn, deposits, 'شارژ کیف پول با کارت')
+
+            if order_ids:
+                orders = await conn.fetch("""
+                    UPDATE orders
+                    SET status = $2, updated_at = NOW()
+                    WHERE order_id = ANY($1::int[]) AND status = $3
+                    RETURNING order_id, user_id, total_amount, payment_method, payment_receipt
+                """, order_ids, OrderStatus.PAID.value, OrderStatus.PAYMENT_VERIFICATION.value)
+
+        # کسر موجودی و تحویل، همان مسیر تایید تکی؛ روش پرداخت و رسید ثبت شده حفظ می‌شوند
+        delivered, failed = [], []
+        for order in orders:
+            if await self.order_service.update_order_status(
+                order_id=order['order_id'],
+                status=OrderStatus.PAID,
+                payment_data={'method': order['payment_method'], 'receipt': order['payment_receipt']}
+            ):
+                delivered.append(order)
+            else:
+                failed.append(order)
+        if failed:
+            self.logger.error(
+                f"تحویل سفارش‌های تایید شده ناموفق بود: {[o['order_id'] for o in failed]}"
+            )
+
+        self.logger.info(
+            f"تایید گروهی: {len(deposits)} شارژ از {len(deposit_ids)}، "
+            f"{len(delivered)} سفارش از {len(order_ids)}"
+        )
+        return {
+            "deposits": [dict(row) for row in deposits],
+            "orders": [dict(row) for row in delivered],
+            "failed_orders": [dict(row) for row in failed]
+        }
+
+    @staticmethod
+    def notify_approved(notifier, approved: Dict[str, List[Dict[str, Any]]]):
+        """افزودن پیام تایید هر مورد به صف اطلاع‌رسانی"""
+        wallet_keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton("👛 مشاهده کیف پول", callback_data="show_wallet")
+        ]])
+        for tx in approved["deposits"]:
+            notifier.notify(
+                tx['user_id'],
+                "✅ پرداخت شما تایید شد!\n\n"
+                f"💰 مبلغ: {tx['amount']:,} تومان\n"
+                "کیف پول شما شارژ شد.",
+                reply_markup=wallet_keyboard
+            )
+        for order in approved["orders"]:
+            notifier.notify(
+                order['user_id'],
+                "✅ پرداخت شما تایید شد!\n\n"
+                f"شماره سفارش: {order['order_id']}\n"
+                f"مبلغ: {order['total_amount']:,} تومان"
+            )
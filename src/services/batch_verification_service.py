@@ -0,0 +1,195 @@
+# src/services/batch_verification_service.py
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any
+from ..config import Config
+from ..constants import TransactionStatus
+from ..utils.formatters import calculate_trx_amount
+from .tron_client import TronClient, TronClientError, get_tron_client
+from .transaction_service import TronTransactionVerifier
+from .amount_allocator import AmountAllocator, get_amount_allocator
+from .wallet_service import WalletService, wallet_transaction
+
+
+class BatchVerificationService:
+    """بررسی دسته‌ای و همزمان تراکنش‌های کریپتوی در انتظار
+
+    همه TXIDهای در انتظار یک‌جا خوانده می‌شوند، با حداکثر همزمانی محدود بررسی می‌شوند
+    (سهمیه TronGrid را سطل توکن کلاینت مشترک رعایت می‌کند) و نتیجه با یک بروزرسانی گروهی ثبت می‌شود.
+    """
+
+    def __init__(self, db, tron_client: Optional[TronClient] = None,
+                 allocator: Optional[AmountAllocator] = None, concurrency: int = None):
+        self.db = db
+        self.tron_client = tron_client or get_tron_client()
+        self.verifier = TronTransactionVerifier(tron_client=self.tron_client)
+        self.allocator = allocator or get_amount_allocator(db)
+        self.concurrency = concurrency or Config.TRON_VERIFY_CONCURRENCY
+        self.interval = Config.TRON_VERIFY_INTERVAL
+        self.logger = logging.getLogger(__name__)
+        self._task: Optional[asyncio.Task] = None
+        # جلوگیری از اجرای همزمان دستور ادمین و اجرای زمان‌بندی شده
+        self._run_lock = asyncio.Lock()
+
+    async def start(self):
+        """شروع اجرای زمان‌بندی شده"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف اجرای زمان‌بندی شده"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.verify_pending()
+            except Exception as e:
+                self.logger.error(f"خطا در بررسی دسته‌ای تراکنش‌ها: {e}")
+
+    async def verify_pending(self) -> Dict[str, int]:
+        """بررسی همه تراکنش‌های کریپتوی در انتظار دارای TXID"""
+        async with self._run_lock:
+            rows = await self._load_pending()
+            if not rows:
+                return {"checked": 0, "completed": 0, "failed": 0, "pending": 0}
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def verify(row):
+                async with semaphore:
+                    return await self._verify(row)
+
+            results = await asyncio.gather(*(verify(row) for row in rows))
+            decided = [r for r in results if r is not None]
+            completed = await self._apply(decided)
+
+            stats = {
+                "checked": len(rows),
+                "completed": len(completed),
+                "failed": sum(1 for r in decided if r["status"] == TransactionStatus.FAILED.value),
+                "pending": len(rows) - len(decided)
+            }
+            self.logger.info(f"بررسی دسته‌ای تراکنش‌ها: {stats}")
+            return stats
+
+    async def _load_pending(self) -> List[Dict[str, Any]]:
+        """درخواست‌های در انتظار دارای TXID؛ TXIDهای مصرف شده (تسویه شده در مسیر دیگر) کنار می‌روند"""
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT t.transaction_id, t.user_id, t.amount, t.tx_hash, t.created_at
+                FROM transactions t
+                WHERE t.status = $1 AND t.method = 'crypto' AND t.tx_hash IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM consumed_tx_hashes c WHERE c.tx_hash = t.tx_hash)
+                ORDER BY t.created_at
+            """, TransactionStatus.PENDING.value)
+        return [dict(row) for row in rows]
+
+    async def _verify(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """نتیجه قطعی یک تراکنش؛ None یعنی فعلاً قابل تصمیم نیست و در دور بعد بررسی می‌شود"""
+        try:
+            tx_data = await self.tron_client.get_transaction(row['tx_hash'])
+        except (TronClientError, asyncio.TimeoutError) as e:
+            self.logger.debug(f"بررسی {row['tx_hash']} به دور بعد موکول شد: {e}")
+            return None
+
+        if not tx_data:
+            # ممکن است تراکنش هنوز در شبکه منتشر نشده باشد
+            age = (datetime.now(timezone.utc) - row['created_at']).total_seconds()
+            if age < Config.CRYPTO_INVOICE_TTL:
+                return None
+
+        allocation = self.allocator.get('deposit', row['transaction_id'])
+        expected_amount = (
+            float(allocation.amount_trx) if allocation
+            else calculate_trx_amount(row['amount'])
+        )
+        result = self.verifier.evaluate(
+            row['tx_hash'], tx_data, expected_amount,
+            expected_sun=allocation.amount_sun if allocation else None,
+            requested_at=row['created_at']
+        )
+        return {
+            "transaction_id": row['transaction_id'],
+            "user_id": row['user_id'],
+            "tx_hash": row['tx_hash'],
+            "status": (TransactionStatus.COMPLETED if result["success"] else TransactionStatus.FAILED).value,
+            "error": None if result["success"] else result["error"],
+            "amount_sun": result["transaction"]["amount_sun"] if result["success"] else None
+        }
+
+    async def _apply(self, results: List[Dict[str, Any]]) -> List[int]:
+        """ثبت گروهی نتایج و افزایش موجودی شارژهای تایید شده در یک تراکنش دیتابیسی
+
+        TXID هر شارژ تایید شده در همین تراکنش مصرف می‌شود؛ TXID مصرف شده در مسیر دیگر (پیام
+        کاربر یا پایشگر کیف پول) شارژ دوباره نمی‌دهد و درخواست رد می‌شود.
+        """
+        if not results:
+            return []
+
+        completed_results = [r for r in results if r["status"] == TransactionStatus.COMPLETED.value]
+        async with wallet_transaction(self.db, *(r["user_id"] for r in completed_results)) as conn:
+            claimed = set()
+            if completed_results:
+                rows = await conn.fetch("""
+                    INSERT INTO consumed_tx_hashes (tx_hash, user_id)
+                    SELECT * FROM unnest($1::varchar[], $2::bigint[])
+                    ON CONFLICT (tx_hash) DO NOTHING
+                    RETURNING tx_hash
+                """, [r["tx_hash"] for r in completed_results], [r["user_id"] for r in completed_results])
+                claimed = {row['tx_hash'] for row in rows}
+            for r in completed_results:
+                if r["tx_hash"] not in claimed:
+                    r.update(status=TransactionStatus.FAILED.value, amount_sun=None,
+                             error="این تراکنش قبلاً استفاده شده است")
+
+            updated = await conn.fetch("""
+                UPDATE transactions t
+                SET status = v.status,
+                    error_message = v.error,
+                    amount_sun = v.amount_sun
+                FROM unnest($1::int[], $2::varchar[], $3::text[], $4::bigint[])
+                    AS v(transaction_id, status, error, amount_sun)
+                WHERE t.transaction_id = v.transaction_id
+                AND t.status = $5
+                RETURNING t.transaction_id, t.user_id, t.amount, t.type, t.status
+            """,
+                [r["transaction_id"] for r in results],
+                [r["status"] for r in results],
+                [r["error"] for r in results],
+                [r["amount_sun"] for r in results],
+                TransactionStatus.PENDING.value
+            )
+
+            deposits = [
+                row for row in updated
+                if row['status'] == TransactionStatus.COMPLETED.value and row['type'] == 'deposit'
+            ]
+            if deposits:
+                await WalletService.credit_many(conn, deposits, 'شارژ کیف پول با ترون')
+
+            # درخواست‌هایی که همزمان در مسیر دیگری تسویه شده‌اند TXID را نگه نمی‌دارند
+            settled = {row['transaction_id'] for row in updated}
+            unused = [
+                r["tx_hash"] for r in completed_results
+                if r["tx_hash"] in claimed and r["transaction_id"] not in settled
+            ]
+            if unused:
+                await conn.execute("""
+                    DELETE FROM consumed_tx_hashes WHERE tx_hash = ANY($1::varchar[])
+                """, unused)
+
+        completed = [
+            row['transaction_id'] for row in updated
+            if row['status'] == TransactionStatus.COMPLETED.value
+        ]
+        await self.allocator.release_many('deposit', [row['transaction_id'] for row in updated])
+        return completed
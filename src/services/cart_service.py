@@ -0,0 +1,321 @@
+# src/services/cart_service.py
+import asyncio
+import logging
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, List, Optional, Any, Tuple
+from ..config import Config
+
+# سرآیند داده فشرده: تعداد اقلام (uint16 little-endian)
+_HEADER = struct.Struct('<H')
+
+
+class Cart:
+    """سبد خرید فشرده یک کاربر (شناسه محصولات و تعدادها در آرایه‌های بسته‌بندی شده)"""
+
+    __slots__ = ('product_ids', 'quantities', 'loaded_at')
+
+    def __init__(self, product_ids: Optional[array] = None, quantities: Optional[array] = None):
+        self.product_ids = product_ids if product_ids is not None else array('I')
+        self.quantities = quantities if quantities is not None else array('H')
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def _index(self, product_id: int) -> int:
+        try:
+            return self.product_ids.index(product_id)
+        except ValueError:
+            return -1
+
+    def get_quantity(self, product_id: int) -> int:
+        """تعداد یک محصول در سبد"""
+        i = self._index(product_id)
+        return self.quantities[i] if i >= 0 else 0
+
+    def set_quantity(self, product_id: int, quantity: int):
+        """تنظیم تعداد یک محصول (صفر یعنی حذف)"""
+        i = self._index(product_id)
+        if quantity <= 0:
+            if i >= 0:
+                del self.product_ids[i]
+                del self.quantities[i]
+            return
+
+        quantity = min(quantity, 0xFFFF)
+        if i >= 0:
+            self.quantities[i] = quantity
+        else:
+            self.product_ids.append(product_id)
+            self.quantities.append(quantity)
+
+    def items(self) -> List[Tuple[int, int]]:
+        """لیست (شناسه محصول، تعداد)"""
+        return list(zip(self.product_ids, self.quantities))
+
+    def to_bytes(self) -> bytes:
+        """سریال‌سازی فشرده (6 بایت برای هر قلم)"""
+        ids = array('I', self.product_ids)
+        qtys = array('H', self.quantities)
+        if sys.byteorder == 'big':
+            ids.byteswap()
+            qtys.byteswap()
+        return _HEADER.pack(len(ids)) + ids.tobytes() + qtys.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Cart':
+        """بازسازی سبد از داده فشرده"""
+        if not data:
+            return cls()
+
+        (count,) = _HEADER.unpack_from(data)
+        ids = array('I')
+        qtys = array('H')
+        offset = _HEADER.size
+        ids_end = offset + count * ids.itemsize
+        ids.frombytes(data[offset:ids_end])
+        qtys.frombytes(data[ids_end:ids_end + count * qtys.itemsize])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+            qtys.byteswap()
+        return cls(ids, qtys)
+
+
+class PostgresCartStore:
+    """ذخیره‌ساز سبدهای خرید در PostgreSQL"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def load(self, user_id: int) -> Optional[bytes]:
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT data FROM carts
+                WHERE user_id = $1 AND expires_at > NOW()
+            """, user_id)
+
+    async def save_many(self, entries: List[Tuple[int, bytes]], ttl: int):
+        async with self.db.pool.acquire() as conn:
+            await conn.executemany("""
+                INSERT INTO carts (user_id, data, updated_at, expires_at)
+                VALUES ($1, $2, NOW(), NOW() + make_interval(secs => $3))
+                ON CONFLICT (user_id)
+                DO UPDATE SET data = EXCLUDED.data,
+                              updated_at = EXCLUDED.updated_at,
+                              expires_at = EXCLUDED.expires_at
+            """, [(user_id, data, ttl) for user_id, data in entries])
+
+    async def delete_many(self, user_ids: List[int]):
+        async with self.db.pool.acquire() as conn:
+            await conn.execute("""
+                DELETE FROM carts WHERE user_id = ANY($1::bigint[])
+            """, user_ids)
+
+    async def purge_expired(self) -> int:
+        async with self.db.pool.acquire() as conn:
+            result = await conn.execute("DELETE FROM carts WHERE expires_at <= NOW()")
+            return int(result.split()[-1])
+
+
+class RedisCartStore:
+    """ذخیره‌ساز سبدهای خرید در Redis"""
+
+    KEY_PREFIX = "cart:"
+
+    def __init__(self, redis_url: str):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(redis_url)
+
+    async def load(self, user_id: int) -> Optional[bytes]:
+        return await self.redis.get(f"{self.KEY_PREFIX}{user_id}")
+
+    async def save_many(self, entries: List[Tuple[int, bytes]], ttl: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, data in entries:
+                pipe.set(f"{self.KEY_PREFIX}{user_id}", data, ex=ttl)
+            await pipe.execute()
+
+    async def delete_many(self, user_ids: List[int]):
+        await self.redis.delete(*(f"{self.KEY_PREFIX}{user_id}" for user_id in user_ids))
+
+    async def purge_expired(self) -> int:
+        # کلیدها با TTL خود Redis منقضی می‌شوند
+        return 0
+
+    async def close(self):
+        await self.redis.close()
+
+
+class CartService:
+    """سرویس سبد خرید با کش LRU محلی و نوشتن تاخیری (write-behind) در Redis یا PostgreSQL"""
+
+    def __init__(self, db, store=None):
+        self.db = db
+        if store is None:
+            store = RedisCartStore(Config.REDIS_URL) if Config.REDIS_URL else PostgresCartStore(db)
+        self.store = store
+        self.ttl = Config.CART_TTL
+        self.max_entries = Config.CART_CACHE_SIZE
+        self.flush_interval = Config.CART_FLUSH_INTERVAL
+        self.local_ttl = Config.CART_LOCAL_TTL
+        self.logger = logging.getLogger(__name__)
+
+        self._cache: "OrderedDict[int, Cart]" = OrderedDict()
+        self._dirty: set = set()
+        # سبدهای تغییر یافته‌ای که پیش از ذخیره از LRU خارج شده‌اند
+        self._evicted: Dict[int, bytes] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """شروع حلقه ذخیره‌سازی پس‌زمینه"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """توقف حلقه و ذخیره تغییرات باقی‌مانده"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if hasattr(self.store, 'close'):
+            await self.store.close()
+
+    async def get_cart(self, user_id: int) -> Cart:
+        """دریافت سبد خرید کاربر"""
+        cart = self._cache.get(user_id)
+        if cart is not None and (
+            user_id in self._dirty or time.monotonic() - cart.loaded_at < self.local_ttl
+        ):
+            self._cache.move_to_end(user_id)
+            return cart
+
+        if user_id in self._evicted:
+            data = self._evicted[user_id]
+        else:
+            data = await self.store.load(user_id)
+        cart = Cart.from_bytes(data) if data else Cart()
+        self._put(user_id, cart)
+        return cart
+
+    async def add_item(self, user_id: int, product_id: int, quantity: int = 1) -> Cart:
+        """افزودن محصول به سبد"""
+        cart = await self.get_cart(user_id)
+        cart.set_quantity(product_id, cart.get_quantity(product_id) + quantity)
+        self._mark_dirty(user_id)
+        return cart
+
+    async def set_quantity(self, user_id: int, product_id: int, quantity: int) -> Cart:
+        """تغییر تعداد یک محصول در سبد"""
+        cart = await self.get_cart(user_id)
+        cart.set_quantity(product_id, quantity)
+        self._mark_dirty(user_id)
+        return cart
+
+    async def remove_item(self, user_id: int, product_id: int) -> Cart:
+        """حذف محصول از سبد"""
+        return await self.set_quantity(user_id, product_id, 0)
+
+    async def clear(self, user_id: int):
+        """خالی کردن سبد"""
+        self._put(user_id, Cart())
+        self._mark_dirty(user_id)
+
+    async def get_cart_data(self, user_id: int) -> Dict[str, Any]:
+        """اقلام سبد همراه با قیمت روز و مبلغ کل"""
+        cart = await self.get_cart(user_id)
+        if not len(cart):
+            return {"items": [], "total_amount": Decimal(0)}
+
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT product_id, name, price, category_id
+                FROM products
+                WHERE product_id = ANY($1::int[]) AND is_active = true
+            """, list(cart.product_ids))
+        products = {row['product_id']: row for row in rows}
+
+        items = []
+        total_amount = Decimal(0)
+        for product_id, quantity in cart.items():
+            product = products.get(product_id)
+            if not product:
+                continue
+            items.append({
+                'product_id': product_id,
+                'name': product['name'],
+                'category_id': product['category_id'],
+                'quantity': quantity,
+                'price_per_unit': product['price']
+            })
+            total_amount += product['price'] * quantity
+
+        return {"items": items, "total_amount": total_amount}
+
+    def _put(self, user_id: int, cart: Cart):
+        self._cache[user_id] = cart
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            old_id, old_cart = self._cache.popitem(last=False)
+            if old_id in self._dirty:
+                self._dirty.discard(old_id)
+                self._evicted[old_id] = old_cart.to_bytes()
+
+    def _mark_dirty(self, user_id: int):
+        self._dirty.add(user_id)
+        self._evicted.pop(user_id, None)
+
+    async def flush(self):
+        """ذخیره سبدهای تغییر یافته در ذخیره‌ساز مشترک"""
+        if not self._dirty and not self._evicted:
+            return
+
+        pending = dict(self._evicted)
+        self._evicted.clear()
+        for user_id in self._dirty:
+            cart = self._cache.get(user_id)
+            if cart is not None:
+                pending[user_id] = cart.to_bytes()
+        self._dirty.clear()
+
+        to_save = [(user_id, data) for user_id, data in pending.items() if len(data) > _HEADER.size]
+        to_delete = [user_id for user_id, data in pending.items() if len(data) <= _HEADER.size]
+
+        try:
+            if to_save:
+                await self.store.save_many(to_save, self.ttl)
+            if to_delete:
+                await self.store.delete_many(to_delete)
+            now = time.monotonic()
+            for user_id in pending:
+                cart = self._cache.get(user_id)
+                if cart is not None:
+                    cart.loaded_at = now
+        except Exception as e:
+            self.logger.error(f"خطا در ذخیره سبدهای خرید: {e}")
+            # بازگرداندن به صف برای تلاش بعدی
+            for user_id, data in pending.items():
+                if user_id in self._cache:
+                    self._dirty.add(user_id)
+                else:
+                    self._evicted.setdefault(user_id, data)
+
+    async def _flush_loop(self):
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                try:
+                    await self.store.purge_expired()
+                except Exception as e:
+                    self.logger.error(f"خطا در حذف سبدهای منقضی: {e}")
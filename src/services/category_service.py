@@ -1,12 +1,15 @@
 # src/services/category_service.py
 from typing import List, Dict, Optional, Any
 from ..models.category import Category
+from .discount_index import get_discount_index
 
 class CategoryService:
     """سرویس مدیریت دسته‌بندی‌ها"""
     
     def __init__(self, db):
         self.db = db
+        # والدهای دسته‌بندی در نمایه تخفیف پیش‌محاسبه شده‌اند
+        self.discount_index = get_discount_index(db)
 
     async def add_category(self, category_data: Dict[str, Any]) -> int:
         """افزودن دسته‌بندی جدید"""
@@ -20,7 +23,8 @@ class CategoryService:
                 category_data.get('description'),
                 category_data.get('parent_id')
             )
-            return category_id
+        self.discount_index.invalidate()
+        return category_id
 
     async def get_category(self, category_id: int) -> Optional[Dict[str, Any]]:
         """دریافت اطلاعات دسته‌بندی"""
@@ -78,7 +82,8 @@ class CategoryService:
 
         async with self.db.pool.acquire() as conn:
             result = await conn.execute(query, *params)
-            return result == "UPDATE 1"
+        self.discount_index.invalidate()
+        return result == "UPDATE 1"
 
     async def delete_category(self, category_id: int) -> bool:
         """حذف دسته‌بندی و تمام وابستگی‌ها"""
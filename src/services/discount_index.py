@@ -0,0 +1,289 @@
+# src/services/discount_index.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, FrozenSet, List, Optional
+from ..config import Config
+from ..models.discount import DiscountType, DiscountTarget
+from ..utils.bloom import BloomFilter
+
+# شرط تخفیف قابل استفاده (فعال، منقضی نشده و دارای ظرفیت)
+_ACTIVE_FILTER = """
+    is_active = true
+    AND (end_date IS NULL OR end_date > NOW())
+    AND (usage_limit IS NULL OR used_count < usage_limit)
+"""
+_ENTRY_COLUMNS = """
+    discount_id, code, type, amount, target, target_id,
+    min_purchase, max_discount, usage_limit, used_count,
+    start_date, end_date, is_automatic
+"""
+
+
+def normalize_code(code: str) -> str:
+    """شکل یکسان کد تخفیف برای ذخیره و جستجو"""
+    return (code or "").strip().upper()
+
+
+@dataclass
+class DiscountEntry:
+    """تخفیف فعال با بازه اعتبار پیش‌محاسبه شده (ثانیه یونیکس)"""
+    discount_id: int
+    code: str
+    type: str
+    amount: Decimal
+    target: str
+    target_id: Optional[int]
+    min_purchase: Optional[Decimal]
+    max_discount: Optional[Decimal]
+    usage_limit: Optional[int]
+    used_count: int
+    starts_at: Optional[float]
+    ends_at: Optional[float]
+    is_automatic: bool = False
+
+    @classmethod
+    def from_row(cls, row) -> "DiscountEntry":
+        return cls(
+            discount_id=row['discount_id'],
+            code=normalize_code(row['code']),
+            type=row['type'],
+            amount=row['amount'],
+            target=row['target'],
+            target_id=row['target_id'],
+            min_purchase=row['min_purchase'],
+            max_discount=row['max_discount'],
+            usage_limit=row['usage_limit'],
+            used_count=row['used_count'] or 0,
+            starts_at=row['start_date'].timestamp() if row['start_date'] else None,
+            ends_at=row['end_date'].timestamp() if row['end_date'] else None,
+            is_automatic=row['is_automatic']
+        )
+
+    @property
+    def is_exhausted(self) -> bool:
+        return bool(self.usage_limit) and self.used_count >= self.usage_limit
+
+    def calculate(self, total_amount: Decimal) -> Decimal:
+        """مبلغ تخفیف برای مبلغ خرید داده شده"""
+        if self.type == DiscountType.PERCENTAGE:
+            discount_amount = total_amount * (self.amount / 100)
+            if self.max_discount:
+                discount_amount = min(discount_amount, self.max_discount)
+            return discount_amount
+        return min(self.amount, total_amount)
+
+
+class DiscountIndex:
+    """نمایه حافظه‌ای تخفیف‌های فعال بر اساس کد نرمال شده
+
+    اعتبارسنجی کد بدون پرس‌وجوی دیتابیس انجام می‌شود؛ هر تغییر در DiscountService نمایه را
+    باطل می‌کند و بارگذاری مجدد با یک پرس‌وجو انجام می‌شود. بارگذاری دوره‌ای (DISCOUNT_INDEX_TTL)
+    تغییرات نمونه‌های دیگر ربات را هم می‌آورد. used_count حافظه فقط برای رد سریع است؛
+    ظرفیت واقعی هنگام ثبت استفاده با UPDATE شرطی دیتابیس تضمین می‌شود.
+
+    کدهای یک‌بار مصرف دسته‌ها (batch_id) در نمایه نگهداری نمی‌شوند و فقط در فیلتر بلوم هستند؛
+    کدی که از فیلتر عبور کند و در نمایه نباشد با کلید یکتای code از دیتابیس خوانده می‌شود.
+
+    برای موتور قیمت‌گذاری، مجموعه والدهای هر دسته‌بندی و تخفیف‌های خودکار به تفکیک هدف هم
+    در همین بارگذاری ساخته می‌شوند.
+    """
+
+    def __init__(self, db, ttl: float = None):
+        self.db = db
+        self.ttl = ttl or Config.DISCOUNT_INDEX_TTL
+        self.logger = logging.getLogger(__name__)
+        self._by_code: Dict[str, DiscountEntry] = {}
+        self._by_id: Dict[int, DiscountEntry] = {}
+        # تخفیف‌های خودکار بر اساس هدف: همه محصولات، محصول، دسته‌بندی
+        self._automatic_all: List[DiscountEntry] = []
+        self._automatic_by_product: Dict[int, List[DiscountEntry]] = {}
+        self._automatic_by_category: Dict[int, List[DiscountEntry]] = {}
+        # فیلتر بلوم کدها: رد قطعی کدهای حدسی حتی وقتی نمایه باطل شده و منتظر بارگذاری است
+        self._bloom: Optional[BloomFilter] = None
+        # None یعنی فیلتر فعلی کامل نیست (کدی در حین بارگذاری اضافه شده) و به آن اعتماد نمی‌شود
+        self._bloom_built_at: Optional[float] = None
+        # دسته‌بندی → خودش و همه دسته‌های والد
+        self._ancestors: Dict[int, FrozenSet[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def invalidate(self):
+        """باطل کردن نمایه پس از تغییر تخفیف‌ها"""
+        self._generation += 1
+        self._loaded_at = None
+
+    def might_contain(self, code: str) -> bool:
+        """False یعنی کد قطعاً وجود ندارد؛ True یعنی باید در نمایه جستجو شود
+
+        کدهای ساخته شده در همین نمونه با add_code اضافه می‌شوند؛ پس از TTL فیلتر معتبر
+        شمرده نمی‌شود تا کدهای نمونه‌های دیگر ربات با بارگذاری بعدی دیده شوند.
+        """
+        if (self._bloom is None or self._bloom_built_at is None
+                or time.monotonic() - self._bloom_built_at >= self.ttl):
+            return True
+        return normalize_code(code) in self._bloom
+
+    def add_code(self, code: str):
+        """افزودن کد جدید به فیلتر بلوم پیش از بارگذاری مجدد نمایه"""
+        self.add_codes((code,))
+
+    def add_codes(self, codes):
+        """افزودن گروهی کدها؛ اگر از ظرفیت فیلتر بیشتر شوند فیلتر تا بارگذاری بعدی کنار گذاشته می‌شود"""
+        if self._bloom is None:
+            return
+        for code in codes:
+            if self._bloom.count >= self._bloom.capacity:
+                self._bloom = None
+                return
+            self._bloom.add(normalize_code(code))
+
+    async def get(self, code: str) -> Optional[DiscountEntry]:
+        """تخفیف فعال با کد داده شده (بدون بررسی بازه زمانی و ظرفیت)"""
+        await self.ensure_loaded()
+        code = normalize_code(code)
+        entry = self._by_code.get(code)
+        if entry is None and self.might_contain(code):
+            entry = await self._get_batch_code(code)
+        return entry
+
+    async def _get_batch_code(self, code: str) -> Optional[DiscountEntry]:
+        """جستجوی کد دسته با کلید یکتا"""
+        async with self.db.pool.acquire() as conn:
+            row = await conn.fetchrow(f"""
+                SELECT {_ENTRY_COLUMNS}
+                FROM discounts
+                WHERE code = $1 AND batch_id IS NOT NULL
+                AND {_ACTIVE_FILTER}
+            """, code)
+        return DiscountEntry.from_row(row) if row else None
+
+    def ancestors(self, category_id: Optional[int]) -> FrozenSet[int]:
+        """دسته‌بندی و همه والدهای آن"""
+        if category_id is None:
+            return frozenset()
+        return self._ancestors.get(category_id) or frozenset((category_id,))
+
+    def automatic_candidates(self, product_ids, category_ids) -> List[DiscountEntry]:
+        """تخفیف‌های خودکار مرتبط با محصولات و دسته‌بندی‌های داده شده"""
+        candidates = list(self._automatic_all)
+        for product_id in product_ids:
+            candidates.extend(self._automatic_by_product.get(product_id, ()))
+        for category_id in category_ids:
+            candidates.extend(self._automatic_by_category.get(category_id, ()))
+        return candidates
+
+    def record_usage(self, discount_id: int, used_count: int):
+        """بروزرسانی شمارنده حافظه پس از ثبت موفق استفاده"""
+        entry = self._by_id.get(discount_id)
+        if entry is None:
+            return
+        entry.used_count = used_count
+        if entry.is_exhausted:
+            # فهرست‌های خودکار با بارگذاری بعدی بازسازی می‌شوند؛ تا آن زمان is_exhausted آن را رد می‌کند
+            self._by_code.pop(entry.code, None)
+            del self._by_id[discount_id]
+
+    async def ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            # بارگذاری همزمان فقط یک بار انجام می‌شود
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            await self.load()
+
+    async def load(self):
+        """بارگذاری تخفیف‌های فعال، منقضی نشده و دارای ظرفیت (بدون کدهای دسته)"""
+        started, generation = time.monotonic(), self._generation
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {_ENTRY_COLUMNS}
+                FROM discounts
+                WHERE batch_id IS NULL
+                AND {_ACTIVE_FILTER}
+            """)
+            batch_codes = await conn.fetch(f"""
+                SELECT code FROM discounts
+                WHERE batch_id IS NOT NULL
+                AND {_ACTIVE_FILTER}
+            """)
+            categories = await conn.fetch("SELECT category_id, parent_id FROM categories")
+
+        entries = [DiscountEntry.from_row(row) for row in rows]
+        self._by_code = {entry.code: entry for entry in entries}
+        self._by_id = {entry.discount_id: entry for entry in entries}
+        # هش کردن صدها هزار کد دسته حلقه رویداد را نگه نمی‌دارد
+        self._bloom = await asyncio.to_thread(
+            self._build_bloom, list(self._by_code), [normalize_code(row['code']) for row in batch_codes]
+        )
+        self._ancestors = self._build_ancestors({row['category_id']: row['parent_id'] for row in categories})
+
+        automatic_all, by_product, by_category = [], {}, {}
+        for entry in entries:
+            if not entry.is_automatic:
+                continue
+            if entry.target == DiscountTarget.PRODUCT:
+                by_product.setdefault(entry.target_id, []).append(entry)
+            elif entry.target == DiscountTarget.CATEGORY:
+                by_category.setdefault(entry.target_id, []).append(entry)
+            else:
+                automatic_all.append(entry)
+        self._automatic_all = automatic_all
+        self._automatic_by_product = by_product
+        self._automatic_by_category = by_category
+        # تغییر همزمان با بارگذاری: داده ممکن است کهنه باشد و بار بعد دوباره خوانده می‌شود. کدهایی
+        # که در این فاصله با add_code به فیلتر قبلی اضافه شده‌اند در فیلتر جدید نیستند، پس فیلتر هم
+        # تا بارگذاری بعدی معتبر شمرده نمی‌شود
+        fresh = generation == self._generation
+        self._loaded_at = started if fresh else None
+        self._bloom_built_at = started if fresh else None
+        self.logger.debug(
+            f"{len(self._by_code)} تخفیف فعال در نمایه و {len(batch_codes)} کد دسته در فیلتر بارگذاری شد"
+        )
+
+    @staticmethod
+    def _build_bloom(codes: List[str], batch_codes: List[str]) -> BloomFilter:
+        """فیلتر بلوم همه کدها با ظرفیت اضافه برای کدهایی که تا بارگذاری بعدی با add_code اضافه می‌شوند"""
+        total = len(codes) + len(batch_codes)
+        bloom = BloomFilter(total + max(total // 2, 64))
+        for code in codes:
+            bloom.add(code)
+        for code in batch_codes:
+            bloom.add(code)
+        return bloom
+
+    @staticmethod
+    def _build_ancestors(parents: Dict[int, Optional[int]]) -> Dict[int, FrozenSet[int]]:
+        """مجموعه والدهای هر دسته‌بندی (با حافظه‌سازی؛ حلقه احتمالی در داده قطع می‌شود)"""
+        ancestors: Dict[int, FrozenSet[int]] = {}
+        for category_id in parents:
+            chain = []
+            current = category_id
+            while current is not None and current not in ancestors and current not in chain:
+                chain.append(current)
+                current = parents.get(current)
+            inherited = ancestors.get(current, frozenset())
+            for node in reversed(chain):
+                inherited = inherited | {node}
+                ancestors[node] = inherited
+        return ancestors
+
+
+_discount_index: Optional[DiscountIndex] = None
+
+
+def get_discount_index(db=None) -> DiscountIndex:
+    """نمایه تخفیف مشترک برنامه"""
+    global _discount_index
+    if _discount_index is None:
+        if db is None:
+            raise RuntimeError("نمایه تخفیف هنوز راه‌اندازی نشده است")
+        _discount_index = DiscountIndex(db)
+    return _discount_index
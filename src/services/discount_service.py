@@ -1,27 +1,38 @@
 # src/services/discount_service.py
 from typing import Dict, List, Optional, Any
-from datetime import datetime
 from decimal import Decimal
-from ..models.discount import DiscountType, DiscountTarget, Discount
+from ..config import Config
+from ..models.discount import DiscountTarget
+from ..utils.hyperloglog import hll_estimate
+from ..utils.rate_limit import AttemptLimiter
+from ..utils.security import CODE_ALPHABET, generate_codes
+from .discount_index import get_discount_index, normalize_code
+from .pricing_engine import PricingEngine
+
+# تلاش‌های ناموفق وارد کردن کد تخفیف به ازای هر کاربر (مشترک بین نمونه‌های سرویس)
+_attempt_limiter = AttemptLimiter(Config.DISCOUNT_MAX_ATTEMPTS, Config.DISCOUNT_ATTEMPT_WINDOW)
 
 class DiscountService:
     """سرویس مدیریت تخفیف‌ها"""
     
     def __init__(self, db):
         self.db = db
+        self.index = get_discount_index(db)
+        self.engine = PricingEngine(self.index)
         
     async def create_discount(self, discount_data: Dict[str, Any]) -> int:
         """ایجاد تخفیف جدید"""
+        code = normalize_code(discount_data['code'])
         async with self.db.pool.acquire() as conn:
             discount_id = await conn.fetchval("""
                 INSERT INTO discounts (
                     code, type, amount, target, target_id,
                     min_purchase, max_discount, usage_limit,
-                    start_date, end_date, is_active
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+                    start_date, end_date, is_active, is_automatic
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
                 RETURNING discount_id
             """,
-                discount_data['code'],
+                code,
                 discount_data['type'],
                 discount_data['amount'],
                 discount_data['target'],
@@ -31,9 +42,76 @@ class DiscountService:
                 discount_data.get('usage_limit'),
                 discount_data.get('start_date'),
                 discount_data.get('end_date'),
-                discount_data.get('is_active', True)
+                discount_data.get('is_active', True),
+                discount_data.get('is_automatic', False)
             )
-            return discount_id
+        self.index.add_code(code)
+        self.index.invalidate()
+        return discount_id
+
+    async def create_code_batch(self, name: str, count: int, template: Dict[str, Any],
+                                created_by: Optional[int] = None, prefix: str = "",
+                                length: int = None, alphabet: str = None) -> Dict[str, Any]:
+        """تولید count کد تخفیف یک‌بار مصرف یکتا با تنظیمات template و خروجی CSV
+
+        کدها با COPY در جدول موقت بارگذاری و با یک INSERT ... SELECT در یک تراکنش ثبت می‌شوند؛
+        کدهای تکراری با کدهای موجود (ON CONFLICT) کنار گذاشته و دوباره تولید می‌شوند.
+        """
+        length = length or Config.DISCOUNT_CODE_LENGTH
+        # کدها به شکل نرمال (حروف بزرگ) ذخیره می‌شوند
+        alphabet = (alphabet or Config.DISCOUNT_CODE_ALPHABET or CODE_ALPHABET).upper()
+        prefix = normalize_code(prefix)
+        generated: set = set()
+
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction():
+                batch_id = await conn.fetchval("""
+                    INSERT INTO discount_batches (name, code_count, created_by)
+                    VALUES ($1, $2, $3)
+                    RETURNING batch_id
+                """, name, count, created_by)
+                await conn.execute("""
+                    CREATE TEMP TABLE discount_code_staging (code VARCHAR(50)) ON COMMIT DROP
+                """)
+
+                remaining = count
+                while remaining > 0:
+                    codes = generate_codes(remaining, length, alphabet, prefix, exclude=generated)
+                    generated.update(codes)
+                    await conn.execute("TRUNCATE discount_code_staging")
+                    await conn.copy_records_to_table(
+                        'discount_code_staging', records=((code,) for code in codes), columns=['code']
+                    )
+                    result = await conn.execute("""
+                        INSERT INTO discounts (
+                            code, type, amount, target, target_id,
+                            min_purchase, max_discount, usage_limit,
+                            start_date, end_date, batch_id
+                        )
+                        SELECT code, $1, $2, $3, $4, $5, $6, 1, $7, $8, $9
+                        FROM discount_code_staging
+                        ON CONFLICT (code) DO NOTHING
+                    """,
+                        template['type'],
+                        template['amount'],
+                        template.get('target', DiscountTarget.ALL.value),
+                        template.get('target_id'),
+                        template.get('min_purchase'),
+                        template.get('max_discount'),
+                        template.get('start_date'),
+                        template.get('end_date'),
+                        batch_id
+                    )
+                    remaining -= int(result.split()[-1])
+
+            export_path = Config.REPORT_DIR / f"discount_batch_{batch_id}.csv"
+            await conn.copy_from_query("""
+                SELECT code FROM discounts WHERE batch_id = $1 ORDER BY code
+            """, batch_id, output=str(export_path), format='csv', header=True)
+
+        self.index.add_codes(generated)
+        self.index.invalidate()
+        return {"batch_id": batch_id, "count": count, "file": str(export_path)}
 
     async def get_discount(self, discount_id: int) -> Optional[Dict[str, Any]]:
         """دریافت اطلاعات تخفیف"""
@@ -45,89 +123,88 @@ class DiscountService:
             """, discount_id)
             return dict(discount) if discount else None
 
-    async def validate_discount_code(self, code: str, cart_data: Dict[str, Any]) -> Dict[str, Any]:
-        """اعتبارسنجی و محاسبه تخفیف"""
-        async with self.db.pool.acquire() as conn:
-            # دریافت اطلاعات تخفیف
-            discount = await conn.fetchrow("""
-                SELECT *
-                FROM discounts
-                WHERE code = $1 AND is_active = true
-            """, code)
-            
-            if not discount:
-                return {
-                    "valid": False,
-                    "error": "کد تخفیف نامعتبر است"
-                }
-                
-            # تبدیل به دیکشنری
-            discount = dict(discount)
-            
-            # بررسی زمان
-            now = datetime.now()
-            if discount['start_date'] and now < discount['start_date']:
-                return {
-                    "valid": False,
-                    "error": "کد تخفیف هنوز فعال نشده است"
-                }
-                
-            if discount['end_date'] and now > discount['end_date']:
-                return {
-                    "valid": False,
-                    "error": "کد تخفیف منقضی شده است"
-                }
-                
-            # بررسی محدودیت استفاده
-            if discount['usage_limit'] and discount['used_count'] >= discount['usage_limit']:
-                return {
-                    "valid": False,
-                    "error": "ظرفیت استفاده از این کد تکمیل شده است"
-                }
-                
-            # بررسی حداقل خرید
-            total_amount = Decimal(str(cart_data['total_amount']))
-            if discount['min_purchase'] and total_amount < discount['min_purchase']:
-                return {
-                    "valid": False,
-                    "error": f"حداقل مبلغ خرید برای استفاده از این کد {discount['min_purchase']:,} تومان است"
-                }
-                
-            # محاسبه مقدار تخفیف
-            if discount['type'] == DiscountType.PERCENTAGE:
-                discount_amount = total_amount * (discount['amount'] / 100)
-                if discount['max_discount']:
-                    discount_amount = min(discount_amount, discount['max_discount'])
-                    
-            else:  # تخفیف ثابت
-                discount_amount = min(discount['amount'], total_amount)
-                
+    async def validate_discount_code(self, code: str, cart_data: Dict[str, Any],
+                                     user_id: Optional[int] = None) -> Dict[str, Any]:
+        """اعتبارسنجی و محاسبه تخفیف از نمایه حافظه (کدهای دسته با یک جستجوی کلید یکتا)
+
+        تخفیف فقط روی خطوط هدف (محصول یا دسته‌بندی و زیردسته‌های آن) محاسبه می‌شود؛ اگر یک
+        تخفیف خودکار برای این سبد بیشتر باشد همان برگردانده می‌شود (automatic=True).
+        کاربری که در یک پنجره DISCOUNT_ATTEMPT_WINDOW بیش از حد کد نامعتبر وارد کند تا پایان آن مسدود می‌شود؛
+        ورود کد معتبر شمارنده تلاش‌های ناموفق را صفر نمی‌کند.
+        """
+        retry_after = _attempt_limiter.retry_after(user_id) if user_id else 0
+        if retry_after:
             return {
-                "valid": True,
-                "discount_id": discount['discount_id'],
-                "amount": discount_amount,
-                "final_amount": total_amount - discount_amount
+                "valid": False,
+                "error": f"تعداد تلاش‌های ناموفق زیاد است؛ {int(retry_after // 60) + 1} دقیقه دیگر تلاش کنید"
             }
 
-    async def apply_discount(self, discount_id: int, order_id: int) -> bool:
-        """اعمال تخفیف روی سفارش"""
-        async with self.db.pool.acquire() as conn:
-            async with conn.transaction():
-                # افزایش تعداد استفاده
-                await conn.execute("""
-                    UPDATE discounts
-                    SET used_count = used_count + 1
-                    WHERE discount_id = $1
-                """, discount_id)
-                
-                # ثبت استفاده از تخفیف
-                await conn.execute("""
-                    INSERT INTO discount_usage (
-                        discount_id, order_id, used_at
-                    ) VALUES ($1, $2, NOW())
-                """, discount_id, order_id)
-                
-                return True
+        # کدهای حدسی پیش از جستجو در نمایه (و بارگذاری احتمالی آن) رد می‌شوند
+        discount = await self.index.get(code) if self.index.might_contain(code) else None
+        if not discount:
+            if user_id:
+                _attempt_limiter.record_failure(user_id)
+            return {
+                "valid": False,
+                "error": "کد تخفیف نامعتبر است"
+            }
+
+        totals = self.engine.totals(cart_data)
+        result = self.engine.quote(discount, totals)
+        if not result["valid"]:
+            return result
+
+        automatic = self.engine.best_automatic(totals)
+        if automatic and automatic["amount"] > result["amount"]:
+            return automatic
+        return result
+
+    async def get_automatic_discount(self, cart_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """بیشترین تخفیف خودکار قابل اعمال روی سبد (بدون کد)"""
+        if not cart_data['items']:
+            return None
+        await self.index.ensure_loaded()
+        return self.engine.best_automatic(self.engine.totals(cart_data))
+
+    @staticmethod
+    async def claim(conn, discount_id: int, order_id: int, user_id: Optional[int],
+                    order_amount: Decimal, discount_amount: Decimal) -> Optional[int]:
+        """ثبت اتمی یک استفاده از تخفیف و برگرداندن used_count جدید
+
+        باید روی اتصال تراکنش ثبت سفارش (OrderService.create_order) فراخوانی شود تا سفارش و
+        استفاده از تخفیف با هم ثبت یا برگردانده شوند.
+
+        بررسی ظرفیت و افزایش شمارنده در همان UPDATE انجام می‌شود، پس درخواست‌های همزمان
+        نمی‌توانند بیش از usage_limit استفاده ثبت کنند. در صورت نامعتبر بودن None برمی‌گرداند.
+        آمار تجمعی discount_stats (تعداد، فروش، مبلغ تخفیف و ثبات‌های HyperLogLog کاربران)
+        در همین دستور بروز می‌شود؛ قفل ردیف تخفیف بروزرسانی‌های همزمان آمار را به نوبت می‌اندازد.
+        """
+        return await conn.fetchval("""
+            WITH claimed AS (
+                UPDATE discounts
+                SET used_count = used_count + 1
+                WHERE discount_id = $1
+                AND is_active = true
+                AND (usage_limit IS NULL OR used_count < usage_limit)
+                AND (start_date IS NULL OR start_date <= NOW())
+                AND (end_date IS NULL OR end_date > NOW())
+                RETURNING discount_id, used_count
+            ), usage AS (
+                INSERT INTO discount_usage (discount_id, order_id, user_id, order_amount,
+                                            discount_amount, used_at)
+                SELECT discount_id, $2, $3, $4, $5, NOW() FROM claimed
+            ), stats AS (
+                INSERT INTO discount_stats (discount_id, usage_count, revenue, discount_given, users_hll)
+                SELECT discount_id, 1, $4, $5, hll_add(NULL, $3) FROM claimed
+                ON CONFLICT (discount_id) DO UPDATE
+                SET usage_count = discount_stats.usage_count + 1,
+                    revenue = discount_stats.revenue + EXCLUDED.revenue,
+                    discount_given = discount_stats.discount_given + EXCLUDED.discount_given,
+                    users_hll = hll_add(discount_stats.users_hll, $3),
+                    updated_at = NOW()
+            )
+            SELECT used_count FROM claimed
+        """, discount_id, order_id, user_id, order_amount, discount_amount)
 
     async def get_active_discounts(self) -> List[Dict[str, Any]]:
         """دریافت تخفیف‌های فعال"""
@@ -136,6 +213,7 @@ class DiscountService:
                 SELECT *
                 FROM discounts
                 WHERE is_active = true
+                AND batch_id IS NULL
                 AND (end_date IS NULL OR end_date > NOW())
                 AND (usage_limit IS NULL OR used_count < usage_limit)
                 ORDER BY created_at DESC
@@ -149,6 +227,9 @@ class DiscountService:
         param_count = 1
 
         for key, value in update_data.items():
+            if key == 'code':
+                value = normalize_code(value)
+                self.index.add_code(value)
             query_parts.append(f"{key} = ${param_count}")
             params.append(value)
             param_count += 1
@@ -165,7 +246,8 @@ class DiscountService:
 
         async with self.db.pool.acquire() as conn:
             result = await conn.execute(query, *params)
-            return result == "UPDATE 1"
+        self.index.invalidate()
+        return result == "UPDATE 1"
 
     async def deactivate_discount(self, discount_id: int) -> bool:
         """غیرفعال کردن تخفیف"""
@@ -175,19 +257,27 @@ class DiscountService:
                 SET is_active = false, updated_at = NOW()
                 WHERE discount_id = $1
             """, discount_id)
-            return result == "UPDATE 1"
+        self.index.invalidate()
+        return result == "UPDATE 1"
 
     async def get_discount_usage_stats(self, discount_id: int) -> Dict[str, Any]:
-        """دریافت آمار استفاده از تخفیف"""
+        """دریافت آمار استفاده از تخفیف (یک ردیف discount_stats؛ تعداد کاربران تخمینی است)"""
         async with self.db.pool.acquire() as conn:
             stats = await conn.fetchrow("""
-                SELECT 
-                    COUNT(*) as total_usage,
-                    SUM(o.total_amount) as total_purchase_amount,
-                    SUM(o.total_amount - o.final_amount) as total_discount_amount,
-                    COUNT(DISTINCT du.user_id) as unique_users
-                FROM discount_usage du
-                JOIN orders o ON o.order_id = du.order_id
-                WHERE du.discount_id = $1
+                SELECT usage_count, revenue, discount_given, users_hll
+                FROM discount_stats
+                WHERE discount_id = $1
             """, discount_id)
-            return dict(stats)
\ No newline at end of file
+        if not stats:
+            return {
+                "total_usage": 0,
+                "total_purchase_amount": Decimal(0),
+                "total_discount_amount": Decimal(0),
+                "unique_users": 0
+            }
+        return {
+            "total_usage": stats['usage_count'],
+            "total_purchase_amount": stats['revenue'],
+            "total_discount_amount": stats['discount_given'],
+            "unique_users": min(hll_estimate(stats['users_hll']), stats['usage_count'])
+        }
\ No newline at end of file
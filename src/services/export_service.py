@@ -0,0 +1,135 @@
+# src/services/export_service.py
+import logging
+import tempfile
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import pytz
+from ..config import Config
+from ..utils.spreadsheet import CsvSheet, XlsxWriter
+
+
+class ExportService:
+    """خروجی CSV و XLSX با حافظه ثابت
+
+    سطرها با cursor سمت سرور (EXPORT_FETCH_SIZE سطر در هر رفت و برگشت) خوانده و بلافاصله در
+    فایل موقت پوشه گزارش‌ها نوشته می‌شوند؛ حجم خروجی به حافظه فرایند وابسته نیست.
+    فایل برگردانده شده پس از ارسال باید توسط فراخواننده حذف شود.
+    """
+
+    FORMATS = ("csv", "xlsx")
+
+    # (عنوان برگه، سرستون‌ها، پرس‌وجو روی بازه [$1, $2))
+    ORDERS_EXPORT = ("سفارش‌ها", [
+        "شماره سفارش", "کاربر", "وضعیت", "روش پرداخت", "مبلغ", "تاریخ ثبت"
+    ], """
+        SELECT order_id, user_id, status, payment_method, total_amount, created_at
+        FROM orders
+        WHERE created_at >= $1 AND created_at < $2
+        ORDER BY created_at, order_id
+    """)
+
+    TRANSACTIONS_EXPORT = ("تراکنش‌ها", [
+        "شماره تراکنش", "کاربر", "نوع", "روش", "وضعیت", "مبلغ", "موجودی پس از تراکنش",
+        "توضیحات", "هش تراکنش", "تاریخ ثبت"
+    ], """
+        SELECT transaction_id, user_id, type, method, status, amount, balance_after,
+               description, tx_hash, created_at
+        FROM transactions
+        WHERE created_at >= $1 AND created_at < $2
+        ORDER BY created_at, transaction_id
+    """)
+
+    def __init__(self, db):
+        self.db = db
+        self.tz = pytz.timezone(Config.TIMEZONE)
+        self.logger = logging.getLogger(__name__)
+
+    def _bounds(self, start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+        """بازه روزهای گزارش به صورت زمان‌های منطقه فروشگاه (قابل استفاده با ایندکس created_at)"""
+        return (
+            self.tz.localize(datetime.combine(start_date, time.min)),
+            self.tz.localize(datetime.combine(end_date + timedelta(days=1), time.min))
+        )
+
+    def _temp_path(self, prefix: str, fmt: str) -> Path:
+        if fmt not in self.FORMATS:
+            raise ValueError(f"قالب خروجی نامعتبر: {fmt}")
+        handle = tempfile.NamedTemporaryFile(
+            dir=Config.REPORT_DIR, prefix=f"{prefix}_", suffix=f".{fmt}", delete=False
+        )
+        handle.close()
+        return Path(handle.name)
+
+    async def _stream_rows(self, sheet, query: str, *args) -> int:
+        """نوشتن نتیجه پرس‌وجو در برگه با cursor سمت سرور"""
+        async with self.db.pool.acquire() as conn:
+            # cursor فقط داخل تراکنش کار می‌کند
+            async with conn.transaction():
+                async for row in conn.cursor(query, *args, prefetch=Config.EXPORT_FETCH_SIZE):
+                    sheet.write_row(row.values())
+        return sheet.rows
+
+    async def export_table(self, export: Tuple[str, List[str], str],
+                           start_date: date, end_date: date, fmt: str = "csv") -> Path:
+        """خروجی خام یک جدول (ORDERS_EXPORT یا TRANSACTIONS_EXPORT) برای بازه روزها"""
+        title, header, query = export
+        path = self._temp_path(f"export_{start_date:%Y%m%d}_{end_date:%Y%m%d}", fmt)
+        try:
+            if fmt == "csv":
+                with CsvSheet(path, header) as sheet:
+                    rows = await self._stream_rows(sheet, query, *self._bounds(start_date, end_date))
+            else:
+                with XlsxWriter(path) as workbook:
+                    sheet = workbook.add_sheet(title, header)
+                    rows = await self._stream_rows(sheet, query, *self._bounds(start_date, end_date))
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        self.logger.info(f"خروجی {title}: {rows} سطر در {path.name}")
+        return path
+
+    async def export_orders(self, start_date: date, end_date: date, fmt: str = "csv") -> Path:
+        return await self.export_table(self.ORDERS_EXPORT, start_date, end_date, fmt)
+
+    async def export_transactions(self, start_date: date, end_date: date, fmt: str = "csv") -> Path:
+        return await self.export_table(self.TRANSACTIONS_EXPORT, start_date, end_date, fmt)
+
+    async def export_report(self, report: Dict[str, Any], start_date: date, end_date: date) -> Path:
+        """کارنامه XLSX گزارش: برگه‌های خلاصه و سپس سفارش‌ها و تراکنش‌های خام بازه"""
+        path = self._temp_path(f"report_{start_date:%Y%m%d}_{end_date:%Y%m%d}", "xlsx")
+        bounds = self._bounds(start_date, end_date)
+        try:
+            with XlsxWriter(path) as workbook:
+                summary = workbook.add_sheet("آمار کلی", ["شاخص", "مقدار"])
+                wallet = report["wallet_stats"]
+                for label, value in (
+                    ("تعداد سفارشات", report["total_orders"]),
+                    ("درآمد کل", report["total_income"]),
+                    ("خریداران منحصر به فرد", report["unique_buyers"]),
+                    ("کاربران جدید", report["new_users"]),
+                    ("تراکنش‌های کیف پول", wallet["total_transactions"]),
+                    ("مجموع واریز", wallet["total_deposits"]),
+                    ("مجموع برداشت", wallet["total_withdrawals"])
+                ):
+                    summary.write_row([label, value])
+
+                products = workbook.add_sheet("محصولات پرفروش", ["محصول", "فروش", "تعداد", "درآمد"])
+                for product in report["top_products"]:
+                    products.write_row([
+                        product["name"], product["sales"],
+                        product["total_quantity"], product["total_revenue"]
+                    ])
+
+                categories = workbook.add_sheet("دسته‌بندی‌ها", ["دسته‌بندی", "فروش", "تعداد"])
+                for category in report["category_stats"]:
+                    categories.write_row([
+                        category["category_name"], category["total_sales"], category["total_quantity"]
+                    ])
+
+                for title, header, query in (self.ORDERS_EXPORT, self.TRANSACTIONS_EXPORT):
+                    await self._stream_rows(workbook.add_sheet(title, header), query, *bounds)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return path
@@ -0,0 +1,141 @@
+# src/services/ledger_service.py
+import asyncio
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Any
+from ..config import Config
+
+
+class LedgerService:
+    """دفتر فقط-افزودنی کیف پول: تصاویر دوره‌ای موجودی، موجودی تاریخی و بررسی صحت دفتر
+
+    هر ردیف دفتر شماره ترتیبی کاربر (seq) و مقدار علامت‌دار (delta) دارد؛ موجودی در هر زمان
+    برابر آخرین تصویر پیش از آن به علاوه جمع delta ردیف‌های بعد از آن است.
+    """
+
+    def __init__(self, db, interval: float = None):
+        self.db = db
+        self.interval = interval or Config.LEDGER_SNAPSHOT_INTERVAL
+        self.logger = logging.getLogger(__name__)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """شروع ثبت دوره‌ای تصویر موجودی و بررسی دفتر"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف اجرای دوره‌ای"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                mismatches = await self.verify()
+                if not mismatches:
+                    # تصویر جدید فقط از دفتر سالم گرفته می‌شود
+                    await self.take_snapshots()
+            except Exception as e:
+                self.logger.error(f"خطا در اجرای دوره‌ای دفتر کیف پول: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def take_snapshots(self) -> int:
+        """ثبت تصویر موجودی کیف پول‌هایی که از آخرین تصویر تراکنش داشته‌اند"""
+        async with self.db.pool.acquire() as conn:
+            result = await conn.execute("""
+                INSERT INTO wallet_balance_snapshots (user_id, seq, balance)
+                SELECT w.user_id, w.ledger_seq, w.balance
+                FROM wallets w
+                WHERE w.ledger_seq > COALESCE((
+                    SELECT MAX(s.seq) FROM wallet_balance_snapshots s WHERE s.user_id = w.user_id
+                ), 0)
+                ON CONFLICT (user_id, seq) DO NOTHING
+            """)
+        count = int(result.split()[-1])
+        self.logger.info(f"{count} تصویر موجودی کیف پول ثبت شد")
+        return count
+
+    async def balance_at(self, user_id: int, at: datetime) -> Decimal:
+        """موجودی کاربر در زمان داده شده (آخرین تصویر + ردیف‌های بعد از آن)"""
+        async with self.db.pool.acquire() as conn:
+            return await self._balance_at(conn, user_id, at)
+
+    @staticmethod
+    async def _balance_at(conn, user_id: int, at: datetime) -> Decimal:
+        return await conn.fetchval("""
+            WITH snap AS (
+                SELECT seq, balance
+                FROM wallet_balance_snapshots
+                WHERE user_id = $1 AND taken_at <= $2
+                ORDER BY seq DESC
+                LIMIT 1
+            )
+            SELECT COALESCE((SELECT balance FROM snap), 0) + COALESCE(SUM(t.delta), 0)
+            FROM transactions t
+            WHERE t.user_id = $1
+            AND t.seq > COALESCE((SELECT seq FROM snap), 0)
+            AND t.created_at <= $2
+        """, user_id, at)
+
+    async def get_statement(self, user_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+        """صورت‌حساب بازه: موجودی ابتدا، ردیف‌های دفتر و موجودی انتها"""
+        async with self.db.pool.acquire() as conn:
+            opening = await self._balance_at(conn, user_id, start)
+            entries = await conn.fetch("""
+                SELECT seq, type, amount, delta, balance_after, description, created_at
+                FROM transactions
+                WHERE user_id = $1 AND seq IS NOT NULL
+                AND created_at > $2 AND created_at <= $3
+                ORDER BY seq
+            """, user_id, start, end)
+
+        closing = opening + sum((e['delta'] for e in entries), Decimal(0))
+        return {
+            "opening_balance": opening,
+            "entries": [dict(e) for e in entries],
+            "closing_balance": closing
+        }
+
+    async def verify(self, full: bool = False) -> List[Dict[str, Any]]:
+        """بررسی برابری دفتر با wallets.balance و پیوستگی شماره‌های ترتیبی
+
+        به صورت پیش‌فرض از آخرین تصویر هر کاربر شروع می‌کند؛ full=True کل تاریخچه را بررسی می‌کند.
+        """
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                WITH snap AS (
+                    SELECT DISTINCT ON (user_id) user_id, seq, balance
+                    FROM wallet_balance_snapshots
+                    WHERE NOT $1
+                    ORDER BY user_id, seq DESC
+                ), tail AS (
+                    SELECT t.user_id, COALESCE(SUM(t.delta), 0) AS delta, COUNT(*) AS entries
+                    FROM transactions t
+                    LEFT JOIN snap s ON s.user_id = t.user_id
+                    WHERE t.seq > COALESCE(s.seq, 0)
+                    GROUP BY t.user_id
+                )
+                SELECT w.user_id, w.balance, w.ledger_seq,
+                       COALESCE(s.balance, 0) + COALESCE(tail.delta, 0) AS ledger_balance,
+                       COALESCE(s.seq, 0) + COALESCE(tail.entries, 0) AS ledger_entries
+                FROM wallets w
+                LEFT JOIN snap s ON s.user_id = w.user_id
+                LEFT JOIN tail ON tail.user_id = w.user_id
+                WHERE w.balance <> COALESCE(s.balance, 0) + COALESCE(tail.delta, 0)
+                OR w.ledger_seq <> COALESCE(s.seq, 0) + COALESCE(tail.entries, 0)
+            """, full)
+
+        mismatches = [dict(row) for row in rows]
+        for row in mismatches:
+            self.logger.error(
+                f"مغایرت دفتر کیف پول کاربر {row['user_id']}: موجودی {row['balance']} "
+                f"(دفتر {row['ledger_balance']})، شماره {row['ledger_seq']} (دفتر {row['ledger_entries']})"
+            )
+        return mismatches
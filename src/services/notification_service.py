@@ -0,0 +1,82 @@
+# src/services/notification_service.py
+import asyncio
+import logging
+from typing import Optional, Any
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+from ..config import Config
+from ..utils.rate_limit import TokenBucket
+
+
+class NotificationService:
+    """صف ارسال پیام به کاربران با نرخ محدود
+
+    پیام‌ها در صف قرار می‌گیرند و یک کار پس‌زمینه آن‌ها را با رعایت سطل توکن
+    (NOTIFY_RATE پیام در ثانیه) ارسال می‌کند؛ پاسخ RetryAfter تلگرام باعث توقف موقت صف می‌شود
+    و پیام کاربرانی که ربات را مسدود کرده‌اند کنار گذاشته می‌شود.
+    """
+
+    def __init__(self, bot, rate: float = None, max_retries: int = 3):
+        self.bot = bot
+        self.bucket = TokenBucket(rate or Config.NOTIFY_RATE)
+        self.max_retries = max_retries
+        self.logger = logging.getLogger(__name__)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """شروع ارسال پس‌زمینه"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف ارسال (پیام‌های باقی‌مانده در صف ارسال نمی‌شوند)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not self._queue.empty():
+            self.logger.warning(f"{self._queue.qsize()} پیام در صف اطلاع‌رسانی ارسال نشد")
+
+    def notify(self, chat_id: int, text: str, reply_markup: Any = None, **kwargs):
+        """افزودن پیام به صف ارسال (بدون انتظار)"""
+        self._queue.put_nowait((chat_id, text, reply_markup, kwargs))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self):
+        while True:
+            chat_id, text, reply_markup, kwargs = await self._queue.get()
+            try:
+                await self._send(chat_id, text, reply_markup, kwargs)
+            except Exception as e:
+                self.logger.error(f"خطا در ارسال پیام به {chat_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, chat_id: int, text: str, reply_markup: Any, kwargs: dict):
+        for _ in range(self.max_retries):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    chat_id=chat_id, text=text, reply_markup=reply_markup, **kwargs
+                )
+                return
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if hasattr(retry_after, "total_seconds"):
+                    retry_after = retry_after.total_seconds()
+                self.logger.warning(f"محدودیت ارسال تلگرام؛ توقف {retry_after} ثانیه")
+                await asyncio.sleep(retry_after)
+            except (Forbidden, BadRequest) as e:
+                # کاربر ربات را مسدود کرده یا چت وجود ندارد؛ تلاش مجدد فایده‌ای ندارد
+                self.logger.info(f"پیام به {chat_id} ارسال نشد: {e}")
+                return
+            except TelegramError as e:
+                self.logger.warning(f"خطا در ارسال پیام به {chat_id}: {e}")
+                await asyncio.sleep(1)
+        self.logger.error(f"ارسال پیام به {chat_id} پس از {self.max_retries} تلاش ناموفق بود")
@@ -3,19 +3,36 @@ from typing import Dict, List, Optional, Any
 from decimal import Decimal
 from datetime import datetime
 import json
+import logging
 from ..models.order import Order, OrderStatus, PaymentMethod
 from ..services.product_service import ProductService
 from ..services.payment_service import PaymentService
+from ..services.discount_index import get_discount_index
+from ..services.discount_service import DiscountService
+from ..services.pricing_engine import CartTotals, PricingEngine
 from ..config import Config
 
+
+class _DiscountUnavailable(Exception):
+    """تخفیف برای اقلام سفارش دیگر معتبر نیست یا ظرفیت آن تمام شده است (برای rollback تراکنش)"""
+
+
 class OrderService:
     def __init__(self, db):
         self.db = db
         self.product_service = ProductService(db)
         self.payment_service = PaymentService(db)
+        self.logger = logging.getLogger(__name__)
+
+    async def create_order(self, user_id: int, items: List[Dict[str, Any]],
+                           discount: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """ایجاد سفارش جدید
 
-    async def create_order(self, user_id: int, items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """ایجاد سفارش جدید"""
+        اگر تخفیف معتبر شده (نتیجه validate_discount_code) داده شود، مبلغ آن روی همان اقلامی که ثبت
+        می‌شوند (با قیمت روز) دوباره محاسبه و استفاده از آن در همان تراکنش ثبت سفارش claim می‌شود؛
+        اگر تخفیف دیگر برای این اقلام معتبر نباشد یا ظرفیتش تمام شده باشد، سفارشی ثبت نمی‌شود و None برمی‌گردد.
+        """
+        used_count = None
         try:
             async with self.db.pool.acquire() as conn:
                 async with conn.transaction():
@@ -41,17 +58,39 @@ class OrderService:
                         
                         order_items.append({
                             'product_id': item['product_id'],
+                            'category_id': product['category_id'],
                             'quantity': item['quantity'],
                             'price_per_unit': product['price']
                         })
 
+                    # مبلغ تخفیف زمان اعتبارسنجی ممکن است برای سبد یا قیمت‌های فعلی معتبر نباشد
+                    discount_amount = Decimal(0)
+                    if discount:
+                        index = get_discount_index(self.db)
+                        entry = await index.get(discount['code'])
+                        if entry is None or entry.discount_id != discount['discount_id']:
+                            raise _DiscountUnavailable()
+                        quote = PricingEngine.quote(entry, CartTotals.from_items(order_items, index))
+                        if not quote['valid']:
+                            raise _DiscountUnavailable()
+                        discount_amount = min(quote['amount'], total_amount)
+
                     # ایجاد سفارش
                     order_id = await conn.fetchval("""
                         INSERT INTO orders (
                             user_id, status, total_amount
                         ) VALUES ($1, $2, $3)
                         RETURNING order_id
-                    """, user_id, OrderStatus.PENDING.value, total_amount)
+                    """, user_id, OrderStatus.PENDING.value, total_amount - discount_amount)
+
+                    # ثبت استفاده از تخفیف؛ شکست آن کل سفارش را برمی‌گرداند
+                    if discount:
+                        used_count = await DiscountService.claim(
+                            conn, discount['discount_id'], order_id, user_id,
+                            total_amount, discount_amount
+                        )
+                        if used_count is None:
+                            raise _DiscountUnavailable()
 
                     # ثبت آیتم‌های سفارش
                     for item in order_items:
@@ -62,13 +101,19 @@ class OrderService:
                         """, order_id, item['product_id'], 
                              item['quantity'], item['price_per_unit'])
 
-                    # دریافت اطلاعات کامل سفارش
-                    return await self.get_order(order_id)
-
+        except _DiscountUnavailable:
+            # نمایه تخفیف قدیمی بوده است
+            get_discount_index(self.db).invalidate()
+            return None
         except Exception as e:
             self.logger.error(f"خطا در ایجاد سفارش: {e}")
             return None
 
+        if discount:
+            get_discount_index(self.db).record_usage(discount['discount_id'], used_count)
+        # دریافت اطلاعات کامل سفارش
+        return await self.get_order(order_id)
+
     async def get_order(self, order_id: int) -> Optional[Dict[str, Any]]:
         """دریافت اطلاعات سفارش"""
         async with self.db.pool.acquire() as conn:
@@ -152,6 +197,23 @@ class OrderService:
             self.logger.error(f"خطا در بروزرسانی سفارش: {e}")
             return False
 
+    async def set_payment_method(self, order_id: int, payment_method: PaymentMethod) -> bool:
+        """ثبت روش پرداخت انتخاب شده و انتقال سفارش به وضعیت در انتظار پرداخت"""
+        async with self.db.pool.acquire() as conn:
+            result = await conn.execute("""
+                UPDATE orders
+                SET payment_method = $1,
+                    status = $2,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE order_id = $3 AND status IN ($4, $2)
+            """,
+                payment_method.value,
+                OrderStatus.AWAITING_PAYMENT.value,
+                order_id,
+                OrderStatus.PENDING.value
+            )
+            return result == "UPDATE 1"
+
     async def process_payment(self, order_id: int, payment_method: PaymentMethod,
                             payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """پردازش پرداخت سفارش"""
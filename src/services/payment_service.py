@@ -1,19 +1,22 @@
 # src/services/payment_service.py
 from decimal import Decimal
 from typing import Optional, Dict, Any
-import asyncio
-import aiohttp
 from datetime import datetime
-import hashlib
-import base58
 from ..models.order import Order, OrderStatus, PaymentMethod
-from ..config import Config
 from ..models.wallet import Transaction, TransactionType
+from .tron_client import TronClient, get_tron_client, parse_trx_transfer
+from .txid_registry import TxidRegistry
+from .wallet_service import WalletService, wallet_transaction
+from ..utils.tron_address import WalletAddress, get_wallet_address
+from .settings_service import crypto_wallet_address
+from .amount_allocator import get_amount_allocator
+from ..utils.formatters import calculate_trx_amount
 
 class PaymentService:
-    def __init__(self, database):
+    def __init__(self, database, tron_client: Optional[TronClient] = None):
         self.db = database
-        self.tron_checker = TronPaymentChecker(Config.CRYPTO_WALLET)
+        self.tron_checker = TronPaymentChecker(tron_client=tron_client)
+        self.txid_registry = TxidRegistry(database)
         
     async def process_payment(self, order: Order, payment_method: PaymentMethod, 
                             payment_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -45,21 +48,53 @@ class PaymentService:
                 "error": "شناسه تراکنش (TXID) ارائه نشده است"
             }
 
+        tx_id = self.txid_registry.normalize(tx_id)
+        if not tx_id:
+            return {
+                "success": False,
+                "error": "شناسه تراکنش (TXID) نامعتبر است"
+            }
+
+        # رد TXID تکراری پیش از هر درخواست شبکه
+        if await self.txid_registry.is_consumed(tx_id):
+            return {
+                "success": False,
+                "error": "این تراکنش قبلاً استفاده شده است"
+            }
+
+        # مبلغ مورد انتظار: مبلغ یکتای تخصیص داده شده یا معادل TRX سفارش
+        allocation = get_amount_allocator(self.db).get('order', order.order_id)
+        expected_amount = (
+            float(allocation.amount_trx) if allocation
+            else calculate_trx_amount(order.total_amount)
+        )
+
         # بررسی تراکنش
         result = await self.tron_checker.check_transaction(
             tx_id=tx_id,
-            expected_amount=float(order.total_amount)
+            expected_amount=expected_amount,
+            expected_sun=allocation.amount_sun if allocation else None
         )
 
         if result["success"]:
-            # بروزرسانی وضعیت سفارش
+            # ثبت TXID و بروزرسانی وضعیت سفارش در یک تراکنش
             async with self.db.pool.acquire() as conn:
-                await conn.execute("""
-                    UPDATE orders 
-                    SET status = $1, payment_receipt = $2, updated_at = NOW()
-                    WHERE order_id = $3
-                """, OrderStatus.PAID, tx_id, order.order_id)
-                
+                async with conn.transaction():
+                    if not await self.txid_registry.claim(conn, tx_id, order.user_id, order.order_id):
+                        return {
+                            "success": False,
+                            "error": "این تراکنش قبلاً استفاده شده است"
+                        }
+
+                    await conn.execute("""
+                        UPDATE orders 
+                        SET status = $1, payment_receipt = $2, updated_at = NOW()
+                        WHERE order_id = $3
+                    """, OrderStatus.PAID, tx_id, order.order_id)
+
+            if allocation:
+                await get_amount_allocator(self.db).release('order', order.order_id)
+
             return {
                 "success": True,
                 "transaction": result["transaction"]
@@ -91,123 +126,105 @@ class PaymentService:
 
     async def process_wallet_payment(self, order: Order) -> Dict[str, Any]:
         """Process payment from user wallet"""
-        async with self.db.pool.acquire() as conn:
-            # بررسی موجودی کیف پول
-            wallet = await conn.fetchrow("""
-                SELECT balance FROM wallets WHERE user_id = $1
-            """, order.user_id)
-
-            if not wallet or wallet['balance'] < order.total_amount:
-                return {
-                    "success": False,
-                    "error": "موجودی کیف پول کافی نیست"
-                }
-
-            # شروع تراکنش
-            async with conn.transaction():
-                # کم کردن از موجودی کیف پول
-                await conn.execute("""
-                    UPDATE wallets 
-                    SET balance = balance - $1 
-                    WHERE user_id = $2
-                """, order.total_amount, order.user_id)
-
-                # ثبت تراکنش
-                await conn.execute("""
-                    INSERT INTO transactions (
-                        user_id, type, amount, balance_after, related_order_id
-                    ) VALUES (
-                        $1, $2, $3, 
-                        (SELECT balance FROM wallets WHERE user_id = $1),
-                        $4
-                    )
-                """, order.user_id, TransactionType.PURCHASE, order.total_amount, order.order_id)
-
-                # بروزرسانی وضعیت سفارش
-                await conn.execute("""
+        try:
+            async with wallet_transaction(self.db, order.user_id) as conn:
+                # فقط سفارش پرداخت نشده قابل پرداخت است (جلوگیری از پرداخت تکراری)
+                result = await conn.execute("""
                     UPDATE orders 
-                    SET status = $1, updated_at = NOW()
-                    WHERE order_id = $2
-                """, OrderStatus.PAID, order.order_id)
+                    SET status = $1, payment_method = $2, updated_at = NOW()
+                    WHERE order_id = $3 AND status IN ($4, $5)
+                """, OrderStatus.PAID.value, PaymentMethod.WALLET.value, order.order_id,
+                    OrderStatus.PENDING.value, OrderStatus.AWAITING_PAYMENT.value)
+                if result != "UPDATE 1":
+                    return {
+                        "success": False,
+                        "error": "این سفارش قبلاً پرداخت شده است"
+                    }
+
+                # کسر شرطی موجودی و ثبت تراکنش در یک دستور
+                new_balance = await WalletService.debit(
+                    conn, order.user_id, order.total_amount,
+                    TransactionType.PURCHASE.value, related_order_id=order.order_id
+                )
+                if new_balance is None:
+                    # برگشت تغییر وضعیت سفارش
+                    raise _InsufficientFunds()
+        except _InsufficientFunds:
+            return {
+                "success": False,
+                "error": "موجودی کیف پول کافی نیست"
+            }
 
         return {
             "success": True,
             "message": "پرداخت از کیف پول با موفقیت انجام شد"
         }
 
+
+class _InsufficientFunds(Exception):
+    """موجودی کیف پول برای پرداخت کافی نیست"""
+
+
 class TronPaymentChecker:
-    def __init__(self, wallet_address: str, node_url: str = "https://api.trongrid.io"):
+    def __init__(self, wallet_address: Optional[str] = None, tron_client: Optional[TronClient] = None):
+        # بدون آدرس صریح، آدرس فعلی فروشگاه در هر بررسی از تنظیمات خوانده می‌شود
         self.wallet_address = wallet_address
-        self.node_url = node_url
+        self.tron_client = tron_client or get_tron_client()
+
+    @property
+    def wallet(self) -> WalletAddress:
+        return get_wallet_address(self.wallet_address or crypto_wallet_address())
         
-    async def check_transaction(self, tx_id: str, expected_amount: Optional[float] = None) -> Dict[str, Any]:
-        """Check TRON transaction asynchronously"""
+    async def check_transaction(self, tx_id: str, expected_amount: Optional[float] = None,
+                                expected_sun: Optional[int] = None) -> Dict[str, Any]:
+        """Check TRON transaction asynchronously
+
+        با expected_sun (مبلغ یکتای فاکتور) فقط پرداخت دقیق همان مبلغ پذیرفته می‌شود؛ تلورانس
+        0.01 TRX فقط برای سفارش‌های قدیمی بدون تخصیص است.
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.node_url}/wallet/gettransactionbyid",
-                    json={"value": tx_id}
-                ) as response:
-                    if response.status != 200:
-                        return {
-                            "success": False,
-                            "error": f"خطا در دریافت اطلاعات تراکنش: {response.status}"
-                        }
-                    
-                    tx_data = await response.json()
-                    
+            tx_data = await self.tron_client.get_transaction(tx_id)
             if not tx_data:
                 return {
                     "success": False,
                     "error": "تراکنش یافت نشد"
                 }
 
-            # بررسی وضعیت تراکنش
-            ret = tx_data.get("ret", [{}])[0]
-            if ret.get("contractRet") != "SUCCESS":
-                return {
-                    "success": False,
-                    "error": f"تراکنش ناموفق: {ret.get('contractRet')}"
-                }
-
-            # استخراج اطلاعات تراکنش
-            contract = tx_data.get("raw_data", {}).get("contract", [{}])[0]
-            value = contract.get("parameter", {}).get("value", {})
-            
-            to_address = value.get("to_address")
-            from_address = value.get("owner_address")
-            amount_sun = value.get("amount", 0)
-            amount_trx = amount_sun / 1_000_000
-            timestamp = tx_data.get("raw_data", {}).get("timestamp", 0)
-
-            # تبدیل آدرس‌ها
-            to_address = self._hex_to_base58(to_address) if to_address else None
-            from_address = self._hex_to_base58(from_address) if from_address else None
+            transfer = parse_trx_transfer(tx_data)
+            if not transfer["success"]:
+                return transfer
 
             # بررسی آدرس گیرنده
-            if to_address != self.wallet_address:
+            if not self.wallet.matches(transfer["to_address_hex"]):
                 return {
                     "success": False,
                     "error": "این تراکنش به آدرس کیف پول فروشگاه نیست"
                 }
 
             # بررسی مقدار
-            if expected_amount and abs(amount_trx - expected_amount) > 0.01:
+            amount_trx = transfer["amount_trx"]
+            if expected_sun is not None:
+                if transfer["amount_sun"] != expected_sun:
+                    return {
+                        "success": False,
+                        "error": f"مقدار تراکنش ({amount_trx} TRX) با مبلغ فاکتور ({expected_sun / 1_000_000} TRX) مطابقت ندارد"
+                    }
+            elif expected_amount and abs(amount_trx - expected_amount) > 0.01:
                 return {
                     "success": False,
                     "error": f"مقدار تراکنش ({amount_trx} TRX) با مقدار مورد انتظار ({expected_amount} TRX) مطابقت ندارد"
                 }
 
-            tx_date = datetime.fromtimestamp(timestamp/1000).strftime('%Y-%m-%d %H:%M:%S')
+            tx_date = datetime.fromtimestamp(transfer["timestamp"]/1000).strftime('%Y-%m-%d %H:%M:%S')
 
             return {
                 "success": True,
                 "transaction": {
                     "txID": tx_id,
-                    "from_address": from_address,
-                    "to_address": to_address,
+                    "from_address": transfer["from_address"],
+                    "to_address": transfer["to_address"],
                     "amount_trx": amount_trx,
-                    "amount_sun": amount_sun,
+                    "amount_sun": transfer["amount_sun"],
                     "timestamp": tx_date,
                     "status": "موفق"
                 }
@@ -218,20 +235,3 @@ class TronPaymentChecker:
                 "success": False,
                 "error": f"خطا در بررسی تراکنش: {str(e)}"
             }
-
-    @staticmethod
-    def _hex_to_base58(hex_address: str) -> str:
-        """Convert hex address to base58 format"""
-        if not hex_address.startswith("41"):
-            hex_address = "41" + hex_address
-        
-        address_bytes = bytes.fromhex(hex_address)
-        
-        h = address_bytes
-        for _ in range(2):
-            h = bytes(hashlib.sha256(h).digest())
-        checksum = h[:4]
-        
-        address_bytes += checksum
-        
-        return base58.b58encode(address_bytes).decode()
\ No newline at end of file
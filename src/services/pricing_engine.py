@@ -0,0 +1,92 @@
+# src/services/pricing_engine.py
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from ..models.discount import DiscountTarget
+from .discount_index import DiscountEntry, DiscountIndex
+
+
+@dataclass
+class CartTotals:
+    """جمع مبالغ سبد به تفکیک محصول و دسته‌بندی (هر خط در همه دسته‌های والد خود شمرده می‌شود)"""
+    total: Decimal = Decimal(0)
+    by_product: Dict[int, Decimal] = field(default_factory=dict)
+    by_category: Dict[int, Decimal] = field(default_factory=dict)
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]], index: DiscountIndex) -> "CartTotals":
+        totals = cls()
+        for item in items:
+            line_total = Decimal(item['price_per_unit']) * item['quantity']
+            totals.total += line_total
+            product_id = item['product_id']
+            totals.by_product[product_id] = totals.by_product.get(product_id, Decimal(0)) + line_total
+            for category_id in index.ancestors(item.get('category_id')):
+                totals.by_category[category_id] = totals.by_category.get(category_id, Decimal(0)) + line_total
+        return totals
+
+    def eligible(self, entry: DiscountEntry) -> Decimal:
+        """مبلغ خطوطی از سبد که هدف تخفیف هستند"""
+        if entry.target == DiscountTarget.PRODUCT:
+            return self.by_product.get(entry.target_id, Decimal(0))
+        if entry.target == DiscountTarget.CATEGORY:
+            return self.by_category.get(entry.target_id, Decimal(0))
+        return self.total
+
+
+class PricingEngine:
+    """محاسبه تخفیف سبد با رعایت هدف تخفیف (همه، دسته‌بندی با زیردسته‌ها، محصول)
+
+    سبد یک بار پیمایش می‌شود و جمع هر محصول و هر دسته (با والدهای پیش‌محاسبه شده نمایه)
+    به دست می‌آید؛ سپس هر قاعده با یک جستجوی دیکشنری ارزیابی می‌شود. تخفیف‌ها با هم جمع
+    نمی‌شوند و از بین کد وارد شده و تخفیف‌های خودکار بیشترین مبلغ انتخاب می‌شود.
+    """
+
+    def __init__(self, index: DiscountIndex):
+        self.index = index
+
+    def totals(self, cart_data: Dict[str, Any]) -> CartTotals:
+        return CartTotals.from_items(cart_data['items'], self.index)
+
+    @staticmethod
+    def quote(entry: DiscountEntry, totals: CartTotals, now: Optional[float] = None) -> Dict[str, Any]:
+        """نتیجه اعمال یک تخفیف روی سبد (همان قالب validate_discount_code)"""
+        now = now or time.time()
+        if entry.starts_at and now < entry.starts_at:
+            return {"valid": False, "error": "کد تخفیف هنوز فعال نشده است"}
+        if entry.ends_at and now > entry.ends_at:
+            return {"valid": False, "error": "کد تخفیف منقضی شده است"}
+        # ظرفیت قطعی هنگام ثبت استفاده بررسی می‌شود
+        if entry.is_exhausted:
+            return {"valid": False, "error": "ظرفیت استفاده از این کد تکمیل شده است"}
+        if entry.min_purchase and totals.total < entry.min_purchase:
+            return {
+                "valid": False,
+                "error": f"حداقل مبلغ خرید برای استفاده از این کد {entry.min_purchase:,} تومان است"
+            }
+
+        eligible = totals.eligible(entry)
+        if not eligible:
+            return {"valid": False, "error": "این کد تخفیف برای محصولات سبد شما قابل استفاده نیست"}
+
+        discount_amount = entry.calculate(eligible)
+        return {
+            "valid": True,
+            "discount_id": entry.discount_id,
+            "code": entry.code,
+            "automatic": entry.is_automatic,
+            "eligible_amount": eligible,
+            "amount": discount_amount,
+            "final_amount": totals.total - discount_amount
+        }
+
+    def best_automatic(self, totals: CartTotals, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """بیشترین تخفیف خودکار قابل اعمال روی سبد"""
+        now = now or time.time()
+        best = None
+        for entry in self.index.automatic_candidates(totals.by_product, totals.by_category):
+            result = self.quote(entry, totals, now)
+            if result["valid"] and (best is None or result["amount"] > best["amount"]):
+                best = result
+        return best
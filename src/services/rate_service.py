@@ -0,0 +1,230 @@
+# src/services/rate_service.py
+import asyncio
+import json
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Optional
+import aiohttp
+from ..config import Config
+
+
+class RateSourceError(Exception):
+    """خطا در دریافت نرخ از منبع"""
+
+
+def _to_rate(value: Any) -> Decimal:
+    try:
+        rate = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        raise RateSourceError(f"نرخ نامعتبر: {value!r}")
+    if rate <= 0:
+        raise RateSourceError(f"نرخ باید بزرگتر از صفر باشد: {rate}")
+    return rate
+
+
+class RateSource:
+    """منبع نرخ TRX به تومان"""
+    name = "base"
+
+    async def fetch(self) -> Decimal:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class StaticRateSource(RateSource):
+    """نرخ ثابت (برای تست و محیط توسعه)"""
+    name = "static"
+
+    def __init__(self, rate: Decimal):
+        self.rate = _to_rate(rate)
+
+    async def fetch(self) -> Decimal:
+        return self.rate
+
+
+class FileRateSource(RateSource):
+    """نرخ از فایل محلی (عدد خام یا JSON با کلید rate)"""
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def fetch(self) -> Decimal:
+        try:
+            content = await asyncio.to_thread(self.path.read_text)
+        except OSError as e:
+            raise RateSourceError(f"خطا در خواندن فایل نرخ: {e}")
+        content = content.strip()
+        if content.startswith("{"):
+            return _to_rate(json.loads(content).get("rate"))
+        return _to_rate(content)
+
+
+class SettingsRateSource(RateSource):
+    """نرخ تنظیم شده توسط ادمین (کلید trx_rate جدول settings)"""
+    name = "settings"
+
+    def __init__(self, db, key: str = "trx_rate"):
+        self.db = db
+        self.key = key
+
+    async def fetch(self) -> Decimal:
+        async with self.db.pool.acquire() as conn:
+            value = await conn.fetchval("SELECT value FROM settings WHERE key = $1", self.key)
+        if value is None:
+            raise RateSourceError("نرخ TRX در تنظیمات ثبت نشده است")
+        return _to_rate(value)
+
+
+class HttpRateSource(RateSource):
+    """نرخ از API قیمت (پاسخ JSON؛ field مسیر نقطه‌دار تا مقدار نرخ)"""
+    name = "http"
+
+    def __init__(self, url: str, field: str = "rate", timeout: float = 10.0):
+        self.url = url
+        self.field = field
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def fetch(self) -> Decimal:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        try:
+            async with self._session.get(self.url) as response:
+                if response.status != 200:
+                    raise RateSourceError(f"خطای API نرخ: {response.status}")
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RateSourceError(f"خطا در ارتباط با API نرخ: {e}")
+
+        for part in self.field.split("."):
+            if not isinstance(data, dict) or part not in data:
+                raise RateSourceError(f"فیلد {self.field} در پاسخ API نرخ یافت نشد")
+            data = data[part]
+        return _to_rate(data)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def build_rate_source(spec: str, db=None) -> RateSource:
+    """ساخت منبع نرخ از تنظیمات: static، settings، file:<path> یا آدرس http(s)"""
+    spec = (spec or "static").strip()
+    if spec.startswith(("http://", "https://")):
+        return HttpRateSource(spec, Config.TRX_RATE_FIELD)
+    if spec.startswith("file:"):
+        return FileRateSource(spec[len("file:"):])
+    if spec == "settings" and db is not None:
+        return SettingsRateSource(db)
+    return StaticRateSource(Config.TRX_TOMAN_RATE)
+
+
+class RateService:
+    """نرخ TRX به تومان از حافظه با بروزرسانی پس‌زمینه
+
+    خواندن نرخ هیچ‌گاه منتظر شبکه نمی‌ماند: پس از پایان TTL همان نرخ قبلی برگردانده می‌شود و
+    بروزرسانی در پس‌زمینه انجام می‌شود (stale-while-revalidate). تا اولین دریافت موفق
+    نرخ پیش‌فرض تنظیمات استفاده می‌شود.
+    """
+
+    def __init__(self, source: RateSource, ttl: float = None, refresh_interval: float = None,
+                 fallback_rate: Decimal = None):
+        self.source = source
+        self.ttl = ttl or Config.TRX_RATE_TTL
+        self.refresh_interval = refresh_interval or Config.TRX_RATE_REFRESH_INTERVAL
+        self.logger = logging.getLogger(__name__)
+        self._rate = _to_rate(fallback_rate or Config.TRX_TOMAN_RATE)
+        self._fetched_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """عمر نرخ فعلی (ثانیه)؛ None یعنی هنوز از منبع دریافت نشده"""
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    @property
+    def is_stale(self) -> bool:
+        return self._fetched_at is None or self.age > self.ttl
+
+    def current(self) -> Decimal:
+        """نرخ فعلی از حافظه؛ نرخ کهنه بروزرسانی پس‌زمینه را آغاز می‌کند"""
+        if self.is_stale:
+            self._schedule_refresh()
+        return self._rate
+
+    async def refresh(self) -> Decimal:
+        """دریافت نرخ از منبع (درخواست‌های همزمان با هم ادغام می‌شوند)"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch())
+        return await asyncio.shield(self._refreshing)
+
+    async def start(self):
+        """دریافت اولیه نرخ و شروع بروزرسانی دوره‌ای"""
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف بروزرسانی و بستن منبع"""
+        for task in (self._task, self._refreshing):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._refreshing = None
+        await self.source.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    def _schedule_refresh(self):
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        try:
+            self._refreshing = asyncio.get_running_loop().create_task(self._fetch())
+        except RuntimeError:
+            # خارج از حلقه رویداد (مثلاً در اسکریپت‌ها) فقط نرخ فعلی برگردانده می‌شود
+            pass
+
+    async def _fetch(self) -> Decimal:
+        try:
+            rate = await self.source.fetch()
+        except Exception as e:
+            self.logger.warning(f"خطا در دریافت نرخ TRX از منبع {self.source.name}: {e}")
+            return self._rate
+        if rate != self._rate:
+            self.logger.info(f"نرخ TRX بروزرسانی شد: {rate:,} تومان")
+        self._rate = rate
+        self._fetched_at = time.monotonic()
+        return rate
+
+
+_rate_service: Optional[RateService] = None
+
+
+def get_rate_service(db=None) -> RateService:
+    """سرویس نرخ مشترک برنامه (منبع بر اساس TRX_RATE_SOURCE)"""
+    global _rate_service
+    if _rate_service is None:
+        _rate_service = RateService(build_rate_source(Config.TRX_RATE_SOURCE, db))
+    return _rate_service
+
+
+async def close_rate_service():
+    """بستن سرویس نرخ مشترک هنگام خاموش شدن برنامه"""
+    global _rate_service
+    if _rate_service is not None:
+        await _rate_service.close()
+        _rate_service = None
@@ -0,0 +1,122 @@
+# src/services/reconciliation_service.py
+import asyncio
+import csv
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from ..config import Config
+from ..constants import TransactionStatus
+from .tron_client import TronClient, TronClientError, get_tron_client, parse_trx_transfer
+from ..utils.tron_address import get_wallet_address
+from .settings_service import crypto_wallet_address
+
+
+class ReconciliationService:
+    """تطبیق دسته‌ای دفتر تراکنش‌های کریپتو با بلاکچین
+
+    ردیف‌ها در دسته‌های batch_size با صفحه‌بندی keyset روی transaction_id خوانده می‌شوند و
+    اتصال دیتابیس پیش از بررسی هر دسته با کلاینت مشترک ترون آزاد می‌شود؛ هیچ تراکنش یا اتصالی
+    در طول درخواست‌های شبکه باز نمی‌ماند. در هر لحظه فقط یک دسته در حافظه است و مغایرت‌ها
+    همان لحظه در فایل گزارش نوشته می‌شوند.
+    """
+
+    REPORT_FIELDS = ["transaction_id", "user_id", "tx_hash", "created_at", "issue", "detail"]
+
+    def __init__(self, db, tron_client: Optional[TronClient] = None,
+                 batch_size: int = 200, concurrency: int = None):
+        self.db = db
+        self.tron_client = tron_client or get_tron_client()
+        self.wallet = get_wallet_address(crypto_wallet_address())
+        self.batch_size = batch_size
+        self.concurrency = concurrency or Config.TRON_VERIFY_CONCURRENCY
+        self.logger = logging.getLogger(__name__)
+
+    async def run(self, since: Optional[datetime] = None, days: Optional[int] = None) -> Dict[str, Any]:
+        """اجرای تطبیق و برگرداندن خلاصه نتیجه به همراه مسیر فایل گزارش"""
+        if since is None and days:
+            since = datetime.now() - timedelta(days=days)
+
+        report_path = Config.REPORT_DIR / f"reconciliation_{datetime.now():%Y%m%d_%H%M%S}.csv"
+        summary = {"checked": 0, "discrepancies": 0, "unverified": 0, "report": str(report_path)}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with open(report_path, "w", newline="", encoding="utf-8") as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=self.REPORT_FIELDS)
+            writer.writeheader()
+
+            last_id = 0
+            while True:
+                batch = await self._load_batch(since, last_id)
+                if not batch:
+                    break
+                last_id = batch[-1]['transaction_id']
+                await self._check_batch(batch, semaphore, writer, summary)
+                if len(batch) < self.batch_size:
+                    break
+
+        self.logger.info(f"تطبیق تراکنش‌های کریپتو انجام شد: {summary}")
+        return summary
+
+    async def _load_batch(self, since: Optional[datetime], after_id: int) -> List[Any]:
+        """دسته بعدی تراکنش‌های کریپتوی تکمیل شده پس از after_id"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetch("""
+                SELECT transaction_id, user_id, amount, amount_sun, created_at,
+                       COALESCE(tx_hash, reference_id) AS tx_hash
+                FROM transactions
+                WHERE method = 'crypto' AND status = $1
+                AND ($2::timestamptz IS NULL OR created_at >= $2)
+                AND transaction_id > $3
+                ORDER BY transaction_id
+                LIMIT $4
+            """, TransactionStatus.COMPLETED.value, since, after_id, self.batch_size)
+
+    async def _check_batch(self, batch: List[Any], semaphore: asyncio.Semaphore,
+                           writer: csv.DictWriter, summary: Dict[str, Any]):
+        async def check(row):
+            async with semaphore:
+                return await self._check(row)
+
+        issues = await asyncio.gather(*(check(row) for row in batch))
+        summary["checked"] += len(batch)
+        for row, issue in zip(batch, issues):
+            if issue is None:
+                continue
+            if issue[0] == "unverified":
+                summary["unverified"] += 1
+            else:
+                summary["discrepancies"] += 1
+            writer.writerow({
+                "transaction_id": row['transaction_id'],
+                "user_id": row['user_id'],
+                "tx_hash": row['tx_hash'] or "",
+                "created_at": row['created_at'].isoformat(),
+                "issue": issue[0],
+                "detail": issue[1]
+            })
+
+    async def _check(self, row: Any) -> Optional[tuple]:
+        """(نوع مغایرت، توضیح) یا None در صورت تطابق"""
+        if not row['tx_hash']:
+            return ("missing_tx_hash", "تراکنش تکمیل شده بدون TXID")
+
+        try:
+            tx_data = await self.tron_client.get_transaction(row['tx_hash'])
+        except (TronClientError, asyncio.TimeoutError) as e:
+            # خطای شبکه مغایرت نیست؛ در اجرای بعدی دوباره بررسی می‌شود
+            return ("unverified", str(e))
+
+        if not tx_data:
+            return ("not_found", "تراکنش روی بلاکچین یافت نشد")
+
+        transfer = parse_trx_transfer(tx_data)
+        if not transfer["success"]:
+            return ("failed_on_chain", transfer["error"])
+        if not self.wallet.matches(transfer["to_address_hex"]):
+            return ("wrong_recipient", transfer["to_address"] or "")
+        if row['amount_sun'] is not None and transfer["amount_sun"] != row['amount_sun']:
+            return (
+                "amount_mismatch",
+                f"ثبت شده {row['amount_sun']} سان، روی بلاکچین {transfer['amount_sun']} سان"
+            )
+        return None
@@ -0,0 +1,92 @@
+# src/services/report_scheduler.py
+import logging
+from typing import Any, Dict, Optional
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from ..config import Config
+from .report_service import ReportService
+
+
+class ReportScheduler:
+    """محاسبه شبانه گزارش‌ها و ارسال خلاصه به ادمین‌ها
+
+    هر روز در ساعت کم‌بار (REPORT_SCHEDULE_HOUR) گزارش روزانه، هفتگی و ماهانه تا پایان دیروز
+    در report_snapshots ذخیره و خلاصه آن به صف اطلاع‌رسانی ادمین‌ها اضافه می‌شود؛ دکمه‌های
+    گزارش فقط نتیجه ذخیره شده را می‌خوانند. اگر ربات در زمان اجرا خاموش بوده باشد، هنگام
+    راه‌اندازی گزارش‌های جا مانده بدون ارسال خلاصه محاسبه می‌شوند.
+    """
+
+    JOB_ID = "report_snapshots"
+
+    def __init__(self, db, notifier=None, hour: int = None):
+        self.report_service = ReportService(db)
+        self.notifier = notifier
+        self.hour = Config.REPORT_SCHEDULE_HOUR if hour is None else hour
+        self.logger = logging.getLogger(__name__)
+        self._scheduler: Optional[AsyncIOScheduler] = None
+
+    async def start(self):
+        """زمان‌بندی اجرای روزانه و جبران اجرای جا مانده
+
+        اگر منطقه زمانی جمع‌های دیتابیس با TZ برنامه یکی نباشد راه‌اندازی متوقف می‌شود.
+        """
+        if self._scheduler is not None:
+            return
+        await self.report_service.check_timezone()
+        self._scheduler = AsyncIOScheduler(timezone=Config.TIMEZONE)
+        self._scheduler.add_job(
+            self.run,
+            CronTrigger(hour=self.hour, minute=0, timezone=Config.TIMEZONE),
+            id=self.JOB_ID,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600
+        )
+        self._scheduler.start()
+
+        try:
+            if not await self.report_service.has_snapshots(self.report_service.last_complete_day()):
+                await self.run(notify=False)
+        except Exception as e:
+            self.logger.error(f"خطا در محاسبه گزارش‌های جا مانده: {e}")
+
+    async def close(self):
+        """توقف زمان‌بندی"""
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+    async def run(self, notify: bool = True):
+        """محاسبه و ذخیره گزارش‌ها تا پایان دیروز و ارسال خلاصه"""
+        try:
+            reports = await self.report_service.store_snapshots()
+        except Exception as e:
+            self.logger.error(f"خطا در محاسبه گزارش‌های دوره‌ای: {e}")
+            return
+        self.logger.info(f"گزارش‌های دوره‌ای تا {reports['daily']['period']['end']} ذخیره شد")
+
+        if notify and self.notifier is not None:
+            digest = self.digest_text(reports)
+            for admin_id in Config.ADMIN_IDS:
+                self.notifier.notify(admin_id, digest)
+
+    @staticmethod
+    def digest_text(reports: Dict[str, Dict[str, Any]]) -> str:
+        """متن خلاصه گزارش‌ها برای ادمین‌ها"""
+        daily, weekly, monthly = reports["daily"], reports["weekly"], reports["monthly"]
+        text = (
+            f"🗓 خلاصه گزارش {daily['period']['end']}\n\n"
+            f"📊 دیروز:\n"
+            f"💰 درآمد: {daily['total_income']:,} تومان\n"
+            f"📦 سفارشات: {daily['total_orders']:,}\n"
+            f"👤 خریداران: {daily['unique_buyers']:,}\n"
+            f"👥 کاربران جدید: {daily['new_users']:,}\n"
+            f"💳 واریز کیف پول: {daily['wallet_stats']['total_deposits']:,} تومان\n\n"
+            f"📈 هفت روز اخیر: {weekly['total_income']:,} تومان از {weekly['total_orders']:,} سفارش\n"
+            f"📉 ماه جاری: {monthly['total_income']:,} تومان از {monthly['total_orders']:,} سفارش\n"
+        )
+        if daily['top_products']:
+            text += "\n🔝 پرفروش‌های دیروز:\n"
+            for product in daily['top_products']:
+                text += f"- {product['name']}: {product['sales']} فروش\n"
+        return text
@@ -1,141 +1,272 @@
 # src/services/report_service.py
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 import pytz
 from decimal import Decimal
 from ..config import Config
+from .export_service import ExportService
+from ..utils.hyperloglog import hll_estimate, hll_merge
+
+
+class ReportCache:
+    """نگهداری گزارش‌های محاسبه شده با عمر محدود
+
+    درخواست‌های همزمان یک کلید منتظر همان محاسبه در جریان می‌مانند و فقط یک بار پرس‌وجو
+    اجرا می‌شود. محاسبه ناموفق ذخیره نمی‌شود. گزارش برگردانده شده مشترک است و نباید تغییر کند.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._pending: Dict[tuple, asyncio.Task] = {}
+
+    async def get_or_compute(self, key: tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if time.monotonic() - stored_at < self.ttl:
+                return value
+            del self._entries[key]
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(compute())
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        # لغو یک درخواست محاسبه مشترک را لغو نمی‌کند
+        return await asyncio.shield(task)
+
+    def _store(self, key: tuple, task: asyncio.Task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        else:
+            # پس از invalidate شروع شده است
+            return
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (task.result(), time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self._entries.clear()
+        self._pending.clear()
+
+
+def _json_default(value: Any):
+    """مبالغ DECIMAL(14,2) بدون خطا به عدد JSON تبدیل و با parse_float=Decimal بازخوانی می‌شوند"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} قابل تبدیل به JSON نیست")
+
+
+# مشترک بین نمونه‌های ReportService (هر هندلر نمونه خود را می‌سازد)
+_report_cache = ReportCache(Config.REPORT_CACHE_TTL)
+
 
 class ReportService:
-    """سرویس تولید گزارشات"""
+    """سرویس تولید گزارشات
+
+    گزارش‌ها از جمع‌های روزانه‌ای خوانده می‌شوند که تریگرهای دیتابیس (migration 013) همراه
+    پرداخت سفارش‌ها، ثبت ردیف‌های دفتر کیف پول و ثبت کاربران بروز می‌کنند؛ هزینه گزارش فقط
+    به طول بازه بستگی دارد نه به حجم تاریخچه. پرس‌وجوهای یک گزارش همزمان روی اتصال‌های
+    جداگانه اجرا می‌شوند و نتیجه به ازای (بازه، ساعت) تا REPORT_CACHE_TTL نگه داشته می‌شود.
+    """
     
     def __init__(self, db):
         self.db = db
         self.tz = pytz.timezone(Config.TIMEZONE)
 
+    PERIODS = ("daily", "weekly", "monthly")
+
+    async def check_timezone(self):
+        """روزهای جمع‌های دیتابیس (report_timezone) باید با Config.TIMEZONE یکی باشند"""
+        async with self.db.pool.acquire() as conn:
+            db_timezone = await conn.fetchval("SELECT report_timezone()")
+        if pytz.timezone(db_timezone) != self.tz:
+            raise RuntimeError(
+                f"منطقه زمانی گزارش‌های دیتابیس ({db_timezone}) با TZ برنامه ({Config.TIMEZONE}) یکی نیست؛ "
+                "report_timezone را بازتعریف و جمع‌ها را بازسازی کنید"
+            )
+
+    def period_range(self, period: str, as_of: Optional[date] = None) -> Tuple[date, date]:
+        """بازه روزهای گزارش daily، weekly یا monthly تا as_of (پیش‌فرض امروز)"""
+        today = as_of or datetime.now(self.tz).date()
+        if period == "daily":
+            return today, today
+        if period == "weekly":
+            return today - timedelta(days=7), today
+        if period == "monthly":
+            return today.replace(day=1), today
+        raise ValueError(f"نوع گزارش نامعتبر: {period}")
+
     async def get_daily_report(self) -> Dict[str, Any]:
         """تولید گزارش روزانه"""
-        today = datetime.now(self.tz).date()
-        return await self._generate_report(today, today)
+        return await self.get_report(*self.period_range("daily"))
 
     async def get_weekly_report(self) -> Dict[str, Any]:
         """تولید گزارش هفتگی"""
-        today = datetime.now(self.tz).date()
-        start_date = today - timedelta(days=7)
-        return await self._generate_report(start_date, today)
+        return await self.get_report(*self.period_range("weekly"))
 
     async def get_monthly_report(self) -> Dict[str, Any]:
         """تولید گزارش ماهانه"""
-        today = datetime.now(self.tz).date()
-        start_date = today.replace(day=1)
-        return await self._generate_report(start_date, today)
+        return await self.get_report(*self.period_range("monthly"))
+
+    async def get_report(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """گزارش بازه از حافظه نهان یا با محاسبه (کلید: بازه و ساعت جاری)"""
+        as_of = datetime.now(self.tz).replace(minute=0, second=0, microsecond=0)
+        return await _report_cache.get_or_compute(
+            (start_date, end_date, as_of),
+            lambda: self._generate_report(start_date, end_date)
+        )
+
+    def last_complete_day(self) -> date:
+        return datetime.now(self.tz).date() - timedelta(days=1)
+
+    async def store_snapshots(self, as_of: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+        """محاسبه و ذخیره گزارش همه دوره‌ها تا پایان as_of (پیش‌فرض دیروز)"""
+        as_of = as_of or self.last_complete_day()
+        reports, rows = {}, []
+        for period in self.PERIODS:
+            start_date, end_date = self.period_range(period, as_of)
+            reports[period] = await self._generate_report(start_date, end_date)
+            rows.append((period, start_date, end_date, json.dumps(reports[period], default=_json_default)))
 
-    async def _generate_report(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """تولید گزارش برای بازه زمانی مشخص"""
         async with self.db.pool.acquire() as conn:
-            # آمار کلی
-            orders_data = await conn.fetchrow("""
-                SELECT 
-                    COUNT(*) as total_orders,
-                    SUM(total_amount) as total_income,
-                    COUNT(DISTINCT user_id) as unique_buyers
-                FROM orders
-                WHERE status = 'paid'
-                AND DATE(created_at) BETWEEN $1 AND $2
-            """, start_date, end_date)
+            await conn.executemany("""
+                INSERT INTO report_snapshots (period, start_date, end_date, data)
+                VALUES ($1, $2, $3, $4::jsonb)
+                ON CONFLICT (period, end_date) DO UPDATE
+                SET start_date = EXCLUDED.start_date, data = EXCLUDED.data, computed_at = NOW()
+            """, rows)
+        return reports
+
+    async def has_snapshots(self, as_of: date) -> bool:
+        async with self.db.pool.acquire() as conn:
+            count = await conn.fetchval(
+                "SELECT COUNT(*) FROM report_snapshots WHERE end_date = $1", as_of
+            )
+        return count >= len(self.PERIODS)
+
+    async def get_stored_report(self, period: str) -> Dict[str, Any]:
+        """آخرین گزارش ذخیره شده دوره (در نبود آن، محاسبه و ذخیره تا دیروز)"""
+        if period not in self.PERIODS:
+            raise ValueError(f"نوع گزارش نامعتبر: {period}")
+        async with self.db.pool.acquire() as conn:
+            data = await conn.fetchval("""
+                SELECT data FROM report_snapshots
+                WHERE period = $1
+                ORDER BY end_date DESC
+                LIMIT 1
+            """, period)
+        if data is None:
+            return (await self.store_snapshots())[period]
+        # مبالغ به صورت عدد ذخیره شده‌اند و دوباره Decimal می‌شوند
+        return json.loads(data, parse_float=Decimal)
+
+    async def rebuild_rollups(self, start_date: Optional[date] = None,
+                              end_date: Optional[date] = None) -> int:
+        """بازسازی جمع‌های روزانه و ساعتی از داده خام (بدون بازه: کل تاریخچه)؛ تعداد روزها را برمی‌گرداند"""
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction():
+                days = await conn.fetchval(
+                    "SELECT rebuild_sales_rollups($1, $2)", start_date, end_date
+                )
+                await conn.execute("SELECT rebuild_hourly_sales($1, $2)", start_date, end_date)
+        _report_cache.invalidate()
+        await self.store_snapshots()
+        return days
+
+    async def _generate_report(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """تولید گزارش برای بازه زمانی مشخص از جمع‌های روزانه (daily_stats و جداول فروش روزانه)
 
-            # تعداد کاربران جدید
-            new_users = await conn.fetchval("""
-                SELECT COUNT(*)
-                FROM users
-                WHERE DATE(created_at) BETWEEN $1 AND $2
+        هر روز چند ردیف shard دارد؛ همه خواندن‌ها با SUM و اجتماع HyperLogLog روی آن‌ها جمع می‌زنند.
+        """
+        totals, top_products, category_stats = await asyncio.gather(
+            self._fetch_totals(start_date, end_date),
+            self._fetch_top_products(start_date, end_date),
+            self._fetch_category_stats(start_date, end_date)
+        )
+
+        # خریداران یکتای بازه از اجتماع HyperLogLog روزها (تخمینی)
+        unique_buyers = hll_estimate(hll_merge(totals['buyers'] or ()))
+        return {
+            "period": {
+                "start": start_date.strftime("%Y-%m-%d"),
+                "end": end_date.strftime("%Y-%m-%d")
+            },
+            "total_orders": totals['total_orders'],
+            "total_income": totals['total_income'],
+            "unique_buyers": min(unique_buyers, totals['total_orders']),
+            "new_users": totals['new_users'],
+            "top_products": [dict(p) for p in top_products],
+            "wallet_stats": {
+                "total_transactions": totals['total_transactions'],
+                "total_deposits": totals['total_deposits'],
+                "total_withdrawals": totals['total_withdrawals']
+            },
+            "category_stats": [dict(c) for c in category_stats]
+        }
+
+    async def _fetch_totals(self, start_date: date, end_date: date):
+        """آمار کلی، کاربران جدید و تراکنش‌های کیف پول"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchrow("""
+                SELECT
+                    COALESCE(SUM(orders), 0) as total_orders,
+                    COALESCE(SUM(income), 0) as total_income,
+                    COALESCE(SUM(new_users), 0) as new_users,
+                    COALESCE(SUM(wallet_transactions), 0) as total_transactions,
+                    COALESCE(SUM(deposits), 0) as total_deposits,
+                    COALESCE(SUM(withdrawals), 0) as total_withdrawals,
+                    array_agg(buyers_hll) as buyers
+                FROM daily_stats
+                WHERE day BETWEEN $1 AND $2
             """, start_date, end_date)
 
-            # محصولات پرفروش
-            top_products = await conn.fetch("""
+    async def _fetch_top_products(self, start_date: date, end_date: date):
+        """محصولات پرفروش"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetch("""
                 SELECT 
                     p.name,
-                    COUNT(*) as sales,
-                    SUM(oi.quantity) as total_quantity,
-                    SUM(oi.price_per_unit * oi.quantity) as total_revenue
-                FROM order_items oi
-                JOIN orders o ON o.order_id = oi.order_id
-                JOIN products p ON p.product_id = oi.product_id
-                WHERE o.status = 'paid'
-                AND DATE(o.created_at) BETWEEN $1 AND $2
+                    SUM(s.sales) as sales,
+                    SUM(s.quantity) as total_quantity,
+                    SUM(s.revenue) as total_revenue
+                FROM daily_product_sales s
+                JOIN products p ON p.product_id = s.product_id
+                WHERE s.day BETWEEN $1 AND $2
                 GROUP BY p.product_id, p.name
+                HAVING SUM(s.sales) > 0
                 ORDER BY sales DESC
                 LIMIT 5
             """, start_date, end_date)
 
-            # تراکنش‌های کیف پول
-            wallet_transactions = await conn.fetchrow("""
-                SELECT 
-                    COUNT(*) as total_transactions,
-                    SUM(CASE WHEN type = 'deposit' THEN amount ELSE 0 END) as total_deposits,
-                    SUM(CASE WHEN type = 'withdrawal' THEN amount ELSE 0 END) as total_withdrawals
-                FROM transactions
-                WHERE DATE(created_at) BETWEEN $1 AND $2
-            """, start_date, end_date)
-
-            # آمار دسته‌بندی‌ها
-            category_stats = await conn.fetch("""
+    async def _fetch_category_stats(self, start_date: date, end_date: date):
+        """آمار دسته‌بندی‌ها"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetch("""
                 SELECT 
                     c.name as category_name,
-                    COUNT(*) as total_sales,
-                    SUM(oi.quantity) as total_quantity
-                FROM order_items oi
-                JOIN orders o ON o.order_id = oi.order_id
-                JOIN products p ON p.product_id = oi.product_id
-                JOIN categories c ON c.category_id = p.category_id
-                WHERE o.status = 'paid'
-                AND DATE(o.created_at) BETWEEN $1 AND $2
+                    SUM(s.sales) as total_sales,
+                    SUM(s.quantity) as total_quantity
+                FROM daily_category_sales s
+                JOIN categories c ON c.category_id = s.category_id
+                WHERE s.day BETWEEN $1 AND $2
                 GROUP BY c.category_id, c.name
+                HAVING SUM(s.sales) > 0
                 ORDER BY total_sales DESC
             """, start_date, end_date)
 
-            return {
-                "period": {
-                    "start": start_date.strftime("%Y-%m-%d"),
-                    "end": end_date.strftime("%Y-%m-%d")
-                },
-                "total_orders": orders_data['total_orders'] or 0,
-                "total_income": orders_data['total_income'] or Decimal(0),
-                "unique_buyers": orders_data['unique_buyers'] or 0,
-                "new_users": new_users,
-                "top_products": [dict(p) for p in top_products],
-                "wallet_stats": dict(wallet_transactions),
-                "category_stats": [dict(c) for c in category_stats]
-            }
-
-    async def generate_excel_report(self, start_date: datetime, end_date: datetime) -> bytes:
-        """تولید گزارش اکسل"""
-        import pandas as pd
-        import io
-
-        report_data = await self._generate_report(start_date, end_date)
-        
-        # ایجاد فایل اکسل با چند sheet
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            # آمار کلی
-            summary_data = {
-                'شاخص': ['تعداد سفارشات', 'درآمد کل', 'خریداران منحصر به فرد', 'کاربران جدید'],
-                'مقدار': [
-                    report_data['total_orders'],
-                    float(report_data['total_income']),
-                    report_data['unique_buyers'],
-                    report_data['new_users']
-                ]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='آمار کلی', index=False)
-            
-            # محصولات پرفروش
-            top_products_df = pd.DataFrame(report_data['top_products'])
-            top_products_df.to_excel(writer, sheet_name='محصولات پرفروش', index=False)
-            
-            # آمار دسته‌بندی‌ها
-            categories_df = pd.DataFrame(report_data['category_stats'])
-            categories_df.to_excel(writer, sheet_name='دسته‌بندی‌ها', index=False)
-
-        return output.getvalue()
-
+    async def generate_excel_report(self, start_date: date, end_date: date) -> Path:
+        """تولید فایل اکسل گزارش (خلاصه و سفارش‌ها و تراکنش‌های خام) با حافظه ثابت؛ فایل موقت است"""
+        report_data = await self.get_report(start_date, end_date)
+        return await ExportService(self.db).export_report(report_data, start_date, end_date)
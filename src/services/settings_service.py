@@ -1,70 +1,224 @@
 # src/services/settings_service.py
-from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping, Optional
 from decimal import Decimal
+from ..config import Config
+
+# کانال NOTIFY تغییر تنظیمات؛ محتوای پیام کلید تغییر کرده است
+SETTINGS_CHANNEL = "settings_changed"
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """تصویر تغییرناپذیر جدول settings با مقادیر تبدیل شده به نوع خود"""
+    values: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    loaded_at: float = 0.0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+    def pick(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """زیرمجموعه‌ای از تنظیمات (کلیدهای ثبت نشده None)"""
+        return {key: self.values.get(key) for key in keys}
+
+
+class SettingsCache:
+    """نگهداری تصویر تنظیمات در حافظه و بارگذاری مجدد با LISTEN/NOTIFY
+
+    update_setting پس از تغییر روی کانال settings_changed اطلاع می‌دهد و همه نمونه‌های ربات
+    تصویر جدید را با یک پرس‌وجو می‌سازند و یکجا جایگزین می‌کنند؛ خواندن تنظیمات بدون I/O است.
+    اعلان‌های پشت سر هم در یک بارگذاری ادغام می‌شوند. اگر اتصال LISTEN قطع شود، حلقه دوره‌ای
+    (SETTINGS_RELOAD_INTERVAL) تصویر را بارگذاری و اتصال را دوباره برقرار می‌کند.
+    """
+
+    def __init__(self, db, interval: float = None):
+        self.db = db
+        self.interval = interval or Config.SETTINGS_RELOAD_INTERVAL
+        self.logger = logging.getLogger(__name__)
+        self._snapshot = SettingsSnapshot()
+        self._listen_conn = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> SettingsSnapshot:
+        return self._snapshot
+
+    async def start(self):
+        """بارگذاری اولیه، گوش دادن به کانال تغییرات و شروع بارگذاری دوره‌ای"""
+        await self.load()
+        await self._listen()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف بارگذاری دوره‌ای و آزاد کردن اتصال LISTEN"""
+        for task in (self._task, self._reload_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._reload_task = None
+        await self._unlisten()
+
+    async def load(self) -> SettingsSnapshot:
+        """خواندن کل جدول و جایگزینی تصویر"""
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT key, value, type FROM settings")
+        values = {}
+        for row in rows:
+            try:
+                values[row['key']] = SettingsService._convert_value(row['value'], row['type'])
+            except (ValueError, ArithmeticError) as e:
+                self.logger.error(f"مقدار نامعتبر تنظیم {row['key']}: {e}")
+        self._snapshot = SettingsSnapshot(MappingProxyType(values), time.time())
+        return self._snapshot
+
+    def request_reload(self):
+        """زمان‌بندی بارگذاری مجدد؛ درخواست‌های حین بارگذاری یک بار دیگر اجرا می‌شوند"""
+        self._dirty = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.load()
+            except Exception as e:
+                self.logger.error(f"خطا در بارگذاری مجدد تنظیمات: {e}")
+                return
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.logger.debug(f"تغییر تنظیم {payload} اعلام شد")
+        self.request_reload()
+
+    async def _listen(self):
+        try:
+            self._listen_conn = await self.db.pool.acquire()
+            await self._listen_conn.add_listener(SETTINGS_CHANNEL, self._on_notify)
+        except Exception as e:
+            self.logger.error(f"خطا در گوش دادن به تغییرات تنظیمات: {e}")
+            await self._unlisten()
+
+    async def _unlisten(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.is_closed():
+                await conn.remove_listener(SETTINGS_CHANNEL, self._on_notify)
+        except Exception:
+            pass
+        await self.db.pool.release(conn)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self._listen_conn is None or self._listen_conn.is_closed():
+                    await self._unlisten()
+                    await self._listen()
+                await self.load()
+            except Exception as e:
+                self.logger.error(f"خطا در بارگذاری دوره‌ای تنظیمات: {e}")
+
+
+_settings_cache: Optional[SettingsCache] = None
+
+
+def get_settings_cache(db=None) -> SettingsCache:
+    """تصویر تنظیمات مشترک برنامه"""
+    global _settings_cache
+    if _settings_cache is None:
+        if db is None:
+            raise RuntimeError("تصویر تنظیمات هنوز راه‌اندازی نشده است")
+        _settings_cache = SettingsCache(db)
+    return _settings_cache
+
+
+async def close_settings_cache():
+    """بستن تصویر تنظیمات مشترک هنگام خاموش شدن برنامه"""
+    global _settings_cache
+    if _settings_cache is not None:
+        await _settings_cache.close()
+        _settings_cache = None
+
+
+def crypto_wallet_address() -> str:
+    """آدرس کیف پول ترون فروشگاه
+
+    آدرس نمایش داده شده به کاربر، پایشگر واریزها و بررسی TXID همه از همین تابع می‌خوانند:
+    تنظیم crypto_wallet_address، سپس wallet_address (پنل ادمین) و در نبود هر دو CRYPTO_WALLET.
+    """
+    snapshot = _settings_cache.snapshot if _settings_cache is not None else SettingsSnapshot()
+    return (
+        snapshot.get('crypto_wallet_address')
+        or snapshot.get('wallet_address')
+        or Config.CRYPTO_WALLET
+    )
+
 
 class SettingsService:
-    """سرویس مدیریت تنظیمات"""
+    """سرویس مدیریت تنظیمات
+
+    خواندن‌ها از تصویر حافظه‌ای SettingsCache انجام می‌شوند؛ فقط اولین خواندن پیش از
+    راه‌اندازی تصویر (مثلاً در اسکریپت‌ها) جدول را بارگذاری می‌کند.
+    """
     
     def __init__(self, db):
         self.db = db
+        self.cache = get_settings_cache(db)
+
+    async def snapshot(self) -> SettingsSnapshot:
+        """تصویر فعلی تنظیمات"""
+        if not self.cache.snapshot.loaded_at:
+            return await self.cache.load()
+        return self.cache.snapshot
 
     async def get_all_settings(self) -> Dict[str, Any]:
         """دریافت تمام تنظیمات"""
-        async with self.db.pool.acquire() as conn:
-            settings = await conn.fetch("""
-                SELECT key, value, type
-                FROM settings
-            """)
-            
-            return {s['key']: self._convert_value(s['value'], s['type']) for s in settings}
+        return dict((await self.snapshot()).values)
 
     async def get_setting(self, key: str) -> Optional[Any]:
         """دریافت یک تنظیم خاص"""
-        async with self.db.pool.acquire() as conn:
-            setting = await conn.fetchrow("""
-                SELECT value, type
-                FROM settings
-                WHERE key = $1
-            """, key)
-            
-            if setting:
-                return self._convert_value(setting['value'], setting['type'])
-            return None
+        return (await self.snapshot()).get(key)
 
     async def update_setting(self, key: str, value: Any) -> bool:
-        """بروزرسانی تنظیمات"""
+        """بروزرسانی تنظیمات و اطلاع به همه نمونه‌ها (NOTIFY پس از commit ارسال می‌شود)"""
         value_type = self._get_value_type(value)
         value_str = str(value)
         
         async with self.db.pool.acquire() as conn:
-            result = await conn.execute("""
-                INSERT INTO settings (key, value, type)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (key) 
-                DO UPDATE SET value = $2, type = $3
-            """, key, value_str, value_type)
-            
-            return result != "INSERT 0" and result != "UPDATE 0"
+            async with conn.transaction():
+                result = await conn.execute("""
+                    INSERT INTO settings (key, value, type)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (key) 
+                    DO UPDATE SET value = $2, type = $3
+                """, key, value_str, value_type)
+                await conn.execute("SELECT pg_notify($1, $2)", SETTINGS_CHANNEL, key)
+
+        # همین نمونه بدون انتظار برای اعلان مقدار جدید را می‌بیند
+        await self.cache.load()
+        return result != "INSERT 0" and result != "UPDATE 0"
 
     async def get_basic_settings(self) -> Dict[str, Any]:
         """دریافت تنظیمات پایه"""
-        keys = ['shop_name', 'shop_description', 'welcome_message']
-        settings = {}
-        
-        for key in keys:
-            settings[key] = await self.get_setting(key)
-            
-        return settings
+        return (await self.snapshot()).pick(['shop_name', 'shop_description', 'welcome_message'])
 
     async def get_payment_settings(self) -> Dict[str, Any]:
         """دریافت تنظیمات پرداخت"""
-        keys = ['card_number', 'wallet_address', 'min_stock_alert', 'min_transaction_amount']
-        settings = {}
-        
-        for key in keys:
-            settings[key] = await self.get_setting(key)
-            
-        return settings
+        return (await self.snapshot()).pick(
+            ['card_number', 'wallet_address', 'min_stock_alert', 'min_transaction_amount']
+        )
 
     @staticmethod
     def _get_value_type(value: Any) -> str:
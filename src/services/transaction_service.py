@@ -1,27 +1,49 @@
 # src/services/transaction_service.py
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
-from datetime import datetime
-import aiohttp
+from datetime import datetime, timezone
 import json
+import asyncpg
 from ..config import Config
 from ..models.transaction import TransactionStatus, PaymentMethod
+from .tron_client import TronClient, get_tron_client, parse_trx_transfer
+from .txid_registry import TxidRegistry
+from .wallet_service import WalletService, wallet_transaction
+from ..utils.tron_address import WalletAddress, get_wallet_address
+from .settings_service import crypto_wallet_address
+
+
+class _AlreadySettled(Exception):
+    """درخواست شارژ پیش از ثبت، وضعیت دیگری گرفته است"""
+
 
 class TransactionService:
     """سرویس مدیریت تراکنش‌های مالی"""
-    def __init__(self, db):
+    def __init__(self, db, tron_client: Optional[TronClient] = None):
         self.db = db
-        self.tron_verifier = TronTransactionVerifier(Config.CRYPTO_WALLET)
+        self.tron_verifier = TronTransactionVerifier(tron_client=tron_client)
+        self.txid_registry = TxidRegistry(db)
 
     async def create_transaction(self, data: Dict[str, Any]) -> Optional[int]:
-        """ایجاد تراکنش جدید"""
+        """ایجاد تراکنش جدید
+
+        TXID روی درخواست در انتظار فقط ثبت می‌شود و در همان تراکنش دیتابیسی که موجودی را
+        افزایش می‌دهد (بررسی دسته‌ای یا settle_crypto_deposit) مصرف می‌شود؛ TXID مصرف شده یا
+        ثبت شده روی درخواست دیگر پذیرفته نمی‌شود.
+        """
         async with self.db.pool.acquire() as conn:
             async with conn.transaction():
+                if data.get('tx_hash') and await conn.fetchval("""
+                    SELECT EXISTS(SELECT 1 FROM consumed_tx_hashes WHERE tx_hash = $1)
+                """, data['tx_hash']):
+                    return None
+
                 tx_id = await conn.fetchval("""
                     INSERT INTO transactions (
                         user_id, type, amount, method, status,
-                        reference_id, description
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+                        reference_id, description, tx_hash
+                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                    ON CONFLICT (tx_hash) WHERE tx_hash IS NOT NULL DO NOTHING
                     RETURNING transaction_id
                 """,
                     data['user_id'],
@@ -30,15 +52,96 @@ class TransactionService:
                     data['method'],
                     TransactionStatus.PENDING.value,
                     data.get('reference_id'),
-                    data.get('description')
+                    data.get('description'),
+                    data.get('tx_hash')
                 )
                 return tx_id
 
-    async def verify_crypto_transaction(self, tx_hash: str, expected_amount: Decimal) -> Dict[str, Any]:
-        """بررسی تراکنش کریپتو"""
+    async def settle_crypto_deposit(self, transaction_id: int, user_id: int, tx_hash: str,
+                                    amount_sun: int) -> Optional[Decimal]:
+        """تسویه شارژ کریپتوی در انتظار با TXID تایید شده؛ موجودی جدید یا None
+
+        مصرف TXID، تکمیل همان ردیف درخواست (بدون ایجاد ردیف دوم) و ثبت ردیف دفتر در یک تراکنش
+        دیتابیسی انجام می‌شوند؛ اگر TXID قبلاً مصرف شده یا درخواست توسط پایشگر کیف پول یا
+        بررسی دسته‌ای تسویه شده باشد، هیچ تغییری ثبت نمی‌شود.
+        """
+        try:
+            async with wallet_transaction(self.db, user_id) as conn:
+                if not await self.txid_registry.claim(conn, tx_hash, user_id):
+                    return None
+
+                request = await conn.fetchrow("""
+                    UPDATE transactions
+                    SET status = $1, reference_id = $2, tx_hash = $2, amount_sun = $3
+                    WHERE transaction_id = $4 AND user_id = $5
+                    AND type = 'deposit' AND method = 'crypto' AND status = $6
+                    RETURNING amount
+                """, TransactionStatus.COMPLETED.value, tx_hash, amount_sun,
+                    transaction_id, user_id, TransactionStatus.PENDING.value)
+                if not request:
+                    # ثبت TXID هم همراه با تراکنش برگشت داده می‌شود
+                    raise _AlreadySettled()
+
+                return await WalletService.credit(
+                    conn, user_id, request['amount'], f"شارژ کیف پول با ترون - {tx_hash[:8]}"
+                )
+        except _AlreadySettled:
+            return None
+
+    async def get_pending_crypto_deposit(self, transaction_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """درخواست شارژ کریپتوی در انتظار کاربر (مبلغ و زمان ثبت)"""
+        async with self.db.pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                SELECT transaction_id, amount, created_at
+                FROM transactions
+                WHERE transaction_id = $1 AND user_id = $2
+                AND type = 'deposit' AND method = 'crypto' AND status = $3
+            """, transaction_id, user_id, TransactionStatus.PENDING.value)
+        return dict(row) if row else None
+
+    async def queue_crypto_deposit(self, transaction_id: int, user_id: int, tx_hash: str) -> bool:
+        """ثبت TXID روی درخواست شارژ در انتظار برای بررسی دسته‌ای (وقتی بررسی فوری نتیجه قطعی ندارد)
+
+        TXID مصرف شده یا ثبت شده روی درخواست دیگر پذیرفته نمی‌شود.
+        """
+        try:
+            async with self.db.pool.acquire() as conn:
+                result = await conn.execute("""
+                    UPDATE transactions t
+                    SET tx_hash = $1, updated_at = NOW()
+                    WHERE t.transaction_id = $2 AND t.user_id = $3
+                    AND t.type = 'deposit' AND t.method = 'crypto' AND t.status = $4
+                    AND NOT EXISTS (SELECT 1 FROM consumed_tx_hashes c WHERE c.tx_hash = $1)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM transactions o
+                        WHERE o.tx_hash = $1 AND o.transaction_id <> $2
+                    )
+                """, tx_hash, transaction_id, user_id, TransactionStatus.PENDING.value)
+        except asyncpg.UniqueViolationError:
+            # همزمان روی درخواست دیگری ثبت شده است
+            return False
+        return result == "UPDATE 1"
+
+    async def verify_crypto_transaction(self, tx_hash: str, expected_amount: Decimal,
+                                        expected_sun: Optional[int] = None,
+                                        requested_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """بررسی تراکنش کریپتو (با expected_sun فقط مبلغ دقیق فاکتور پذیرفته می‌شود)
+
+        requested_at زمان ثبت درخواست است؛ انتقال باید پس از آن و در مهلت فاکتور انجام شده باشد.
+        pending=True یعنی نتیجه قطعی نیست (خطای شبکه یا تراکنش هنوز یافت نشده) و باید بعداً بررسی شود.
+        """
+        # رد TXID تکراری پیش از هر درخواست شبکه
+        if await self.txid_registry.is_consumed(tx_hash):
+            return {
+                "success": False,
+                "error": "این تراکنش قبلاً استفاده شده است"
+            }
+
         result = await self.tron_verifier.verify_transaction(
             tx_hash=tx_hash,
-            expected_amount=float(expected_amount)
+            expected_amount=float(expected_amount),
+            expected_sun=expected_sun,
+            requested_at=requested_at
         )
         
         if result["success"]:
@@ -49,7 +152,8 @@ class TransactionService:
         else:
             return {
                 "success": False,
-                "error": result["error"]
+                "error": result["error"],
+                "pending": result.get("pending", False)
             }
 
     async def process_failed_transaction(self, transaction_id: int, error: str) -> bool:
@@ -99,70 +203,101 @@ class TransactionService:
 
 class TronTransactionVerifier:
     """کلاس بررسی تراکنش‌های TRON"""
-    def __init__(self, wallet_address: str, node_url: str = "https://api.trongrid.io"):
+    # تحمل اختلاف ساعت بین زمان ثبت شده در تراکنش و ساعت دیتابیس (ثانیه)
+    CLOCK_SKEW = 300
+
+    def __init__(self, wallet_address: Optional[str] = None, tron_client: Optional[TronClient] = None):
+        # بدون آدرس صریح، آدرس فعلی فروشگاه در هر بررسی از تنظیمات خوانده می‌شود
         self.wallet_address = wallet_address
-        self.node_url = node_url
+        self.tron_client = tron_client or get_tron_client()
+
+    @property
+    def wallet(self) -> WalletAddress:
+        return get_wallet_address(self.wallet_address or crypto_wallet_address())
         
-    async def verify_transaction(self, tx_hash: str, expected_amount: Optional[float] = None) -> Dict[str, Any]:
+    async def verify_transaction(self, tx_hash: str, expected_amount: Optional[float] = None,
+                                 expected_sun: Optional[int] = None,
+                                 requested_at: Optional[datetime] = None) -> Dict[str, Any]:
         """بررسی تراکنش به صورت async"""
         try:
             # درخواست اطلاعات تراکنش
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.node_url}/wallet/gettransactionbyid",
-                    json={"value": tx_hash}
-                ) as response:
-                    if response.status != 200:
-                        return {
-                            "success": False,
-                            "error": f"خطا در دریافت اطلاعات تراکنش: {response.status}"
-                        }
-                        
-                    tx_data = await response.json()
+            tx_data = await self.tron_client.get_transaction(tx_hash)
+            return self.evaluate(tx_hash, tx_data, expected_amount, expected_sun, requested_at)
+
+        except Exception as e:
+            # خطای ارتباط با شبکه (مدار باز، پایان مهلت) نتیجه قطعی نیست
+            return {
+                "success": False,
+                "pending": True,
+                "error": f"خطا در بررسی تراکنش: {str(e)}"
+            }
+
+    def evaluate(self, tx_hash: str, tx_data: Optional[Dict[str, Any]],
+                 expected_amount: Optional[float] = None,
+                 expected_sun: Optional[int] = None,
+                 requested_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """بررسی اطلاعات تراکنش دریافت شده (بدون درخواست شبکه)
 
+        مبلغ‌های یکتای فاکتورها در تلورانس 0.01 TRX کنار هم قرار دارند، پس وقتی تخصیص وجود دارد
+        (expected_sun) فقط مبلغ دقیق پذیرفته می‌شود تا TXID فاکتور دیگری قابل استفاده نباشد؛
+        تلورانس فقط برای درخواست‌های قدیمی بدون تخصیص است.
+
+        تازه بودن انتقال نسبت به زمان ثبت درخواست (requested_at) سنجیده می‌شود، نه زمان بررسی؛
+        بنابراین اجرای دیرهنگام بررسی دسته‌ای شارژ معتبر را رد نمی‌کند.
+        """
+        try:
             # بررسی وجود تراکنش
             if not tx_data:
+                # ممکن است تراکنش هنوز در شبکه منتشر نشده باشد
                 return {
                     "success": False,
+                    "pending": True,
                     "error": "تراکنش یافت نشد"
                 }
 
-            # بررسی وضعیت تراکنش
-            ret = tx_data.get("ret", [{}])[0]
-            if ret.get("contractRet") != "SUCCESS":
-                return {
-                    "success": False,
-                    "error": f"تراکنش ناموفق: {ret.get('contractRet')}"
-                }
-
-            # استخراج اطلاعات تراکنش
-            contract = tx_data.get("raw_data", {}).get("contract", [{}])[0]
-            value = contract.get("parameter", {}).get("value", {})
-            
-            to_address = value.get("to_address")
-            from_address = value.get("owner_address")
-            amount_sun = value.get("amount", 0)
-            amount_trx = amount_sun / 1_000_000
-            timestamp = tx_data.get("raw_data", {}).get("timestamp", 0)
+            transfer = parse_trx_transfer(tx_data)
+            if not transfer["success"]:
+                return transfer
 
             # بررسی آدرس گیرنده
-            if to_address != self.wallet_address:
+            if not self.wallet.matches(transfer["to_address_hex"]):
                 return {
                     "success": False,
                     "error": "تراکنش به آدرس کیف پول فروشگاه نیست"
                 }
 
             # بررسی مقدار
-            if expected_amount and abs(amount_trx - expected_amount) > 0.01:
+            amount_trx = transfer["amount_trx"]
+            if expected_sun is not None:
+                if transfer["amount_sun"] != expected_sun:
+                    return {
+                        "success": False,
+                        "error": f"مقدار تراکنش ({amount_trx} TRX) با مبلغ فاکتور ({expected_sun / 1_000_000} TRX) مطابقت ندارد"
+                    }
+            elif expected_amount and abs(amount_trx - expected_amount) > 0.01:
                 return {
                     "success": False,
                     "error": f"مقدار تراکنش ({amount_trx} TRX) با مقدار مورد انتظار ({expected_amount} TRX) مطابقت ندارد"
                 }
 
-            tx_date = datetime.fromtimestamp(timestamp/1000)
-            
-            # بررسی تازه بودن تراکنش (کمتر از 1 ساعت)
-            if (datetime.now() - tx_date).total_seconds() > 3600:
+            tx_date = datetime.fromtimestamp(transfer["timestamp"]/1000)
+
+            if requested_at is not None:
+                # انتقال باید پس از ثبت درخواست و در مهلت فاکتور باشد (با تحمل اختلاف ساعت کیف پول فرستنده)
+                delay = (datetime.fromtimestamp(transfer["timestamp"]/1000, timezone.utc)
+                         - requested_at).total_seconds()
+                if delay < -self.CLOCK_SKEW:
+                    return {
+                        "success": False,
+                        "error": "تراکنش پیش از ثبت درخواست شارژ انجام شده است"
+                    }
+                if delay > Config.CRYPTO_INVOICE_TTL + self.CLOCK_SKEW:
+                    return {
+                        "success": False,
+                        "error": "تراکنش پس از پایان مهلت پرداخت انجام شده است"
+                    }
+            # بررسی تازه بودن تراکنش (کمتر از 1 ساعت) برای بررسی بدون درخواست ثبت شده
+            elif (datetime.now() - tx_date).total_seconds() > 3600:
                 return {
                     "success": False,
                     "error": "تراکنش قدیمی است"
@@ -172,10 +307,10 @@ class TronTransactionVerifier:
                 "success": True,
                 "transaction": {
                     "hash": tx_hash,
-                    "from_address": from_address,
-                    "to_address": to_address,
+                    "from_address": transfer["from_address"],
+                    "to_address": transfer["to_address"],
                     "amount_trx": amount_trx,
-                    "amount_sun": amount_sun,
+                    "amount_sun": transfer["amount_sun"],
                     "timestamp": tx_date.isoformat(),
                     "status": "SUCCESS"
                 }
@@ -185,4 +320,4 @@ class TronTransactionVerifier:
             return {
                 "success": False,
                 "error": f"خطا در بررسی تراکنش: {str(e)}"
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,295 @@
+# src/services/tron_client.py
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, List
+import aiohttp
+from ..config import Config
+from ..utils.rate_limit import TokenBucket
+from ..utils.tron_address import to_base58
+
+
+class TronClientError(Exception):
+    """خطای ارتباط با TronGrid"""
+
+
+class CircuitOpenError(TronClientError):
+    """مدار قطع است و درخواست ارسال نمی‌شود"""
+
+
+class CircuitBreaker:
+    """قطع‌کننده مدار برای جلوگیری از ارسال درخواست به سرویس از کار افتاده
+
+    در حالت نیمه‌باز فقط یک درخواست آزمایشی عبور می‌کند و بقیه تا موفقیت آن رد می‌شوند تا
+    سرویس در حال بازگشت یک‌باره با همه درخواست‌های انباشته روبه‌رو نشود.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """آیا ارسال درخواست مجاز است؟ (در حالت نیمه‌باز فقط برای اولین درخواست)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """پایان درخواست آزمایشی؛ اگر بدون نتیجه تمام شده باشد (مثلاً لغو)، درخواست بعدی آزمایش می‌کند"""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class TronClient:
+    """کلاینت مشترک TronGrid با اتصال‌های ماندگار، تلاش مجدد و قطع‌کننده مدار"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    TX_CACHE_SIZE = 10000
+    TX_CACHE_TTL = 24 * 3600
+
+    def __init__(self, node_url: str = None, api_key: str = None,
+                 timeout: float = None, max_retries: int = None, pool_size: int = None):
+        self.node_url = (node_url or Config.TRONGRID_URL).rstrip('/')
+        self.api_key = api_key if api_key is not None else Config.TRONGRID_API_KEY
+        self.timeout = aiohttp.ClientTimeout(total=timeout or Config.TRON_REQUEST_TIMEOUT)
+        self.max_retries = max_retries if max_retries is not None else Config.TRON_MAX_RETRIES
+        self.pool_size = pool_size or Config.TRON_POOL_SIZE
+        self.breaker = CircuitBreaker()
+        # سهمیه درخواست TronGrid بین همه فراخوانی‌ها مشترک است
+        self.rate_limiter = TokenBucket(Config.TRON_RATE_LIMIT)
+        self.logger = logging.getLogger(__name__)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # زمانی که تا آن نباید درخواستی ارسال شود (پس از دریافت 429)
+        self._throttled_until = 0.0
+        # کش تراکنش‌های تایید شده (تغییرناپذیر) و درخواست‌های در جریان
+        self._tx_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"Accept": "application/json"}
+            if self.api_key:
+                headers["TRON-PRO-API-KEY"] = self.api_key
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """بستن اتصال‌ها"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, path: str, **kwargs) -> Any:
+        """ارسال درخواست با تلاش مجدد (backoff تصادفی) و رعایت محدودیت نرخ"""
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise CircuitOpenError("سرویس TronGrid موقتاً در دسترس نیست")
+        try:
+            return await self._request(method, path, **kwargs)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        url = f"{self.node_url}{path}"
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries + 1):
+            wait = self._throttled_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.rate_limiter.acquire()
+
+            try:
+                async with self._get_session().request(method, url, **kwargs) as response:
+                    if response.status == 429:
+                        retry_after = self._retry_after(response, attempt)
+                        self._throttled_until = max(self._throttled_until, time.monotonic() + retry_after)
+                        last_error = TronClientError("محدودیت نرخ درخواست TronGrid")
+                        continue
+
+                    if response.status in self.RETRY_STATUSES:
+                        last_error = TronClientError(f"خطای سرور TronGrid: {response.status}")
+                    elif response.status != 200:
+                        # خطای سمت درخواست؛ تلاش مجدد بی‌فایده است
+                        self.breaker.record_success()
+                        raise TronClientError(f"خطا در دریافت اطلاعات تراکنش: {response.status}")
+                    else:
+                        data = await response.json(content_type=None)
+                        self.breaker.record_success()
+                        return data
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+
+        self.breaker.record_failure()
+        self.logger.warning(f"درخواست {path} پس از {self.max_retries + 1} تلاش ناموفق بود: {last_error}")
+        raise TronClientError(str(last_error))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """تاخیر نمایی با jitter کامل"""
+        return random.uniform(0, min(8.0, 0.25 * (2 ** attempt)))
+
+    def _retry_after(self, response: aiohttp.ClientResponse, attempt: int) -> float:
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return self._backoff(attempt) + 1.0
+
+    async def get_transaction(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        """دریافت اطلاعات خام تراکنش (با کش و ادغام درخواست‌های همزمان)"""
+        cached = self._tx_cache.get(tx_id)
+        if cached is not None:
+            stored_at, data = cached
+            if time.monotonic() - stored_at < self.TX_CACHE_TTL:
+                self._tx_cache.move_to_end(tx_id)
+                return data
+            del self._tx_cache[tx_id]
+
+        # درخواست‌های همزمان برای یک TXID فقط یک فراخوانی HTTP دارند
+        future = self._inflight.get(tx_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[tx_id] = future
+        try:
+            data = await self.request("POST", "/wallet/gettransactionbyid", json={"value": tx_id})
+            data = data or None
+            if data and data.get("ret", [{}])[0].get("contractRet") == "SUCCESS":
+                self._cache_transaction(tx_id, data)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # جلوگیری از هشدار «exception was never retrieved» وقتی منتظری وجود ندارد
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(tx_id, None)
+
+    async def iter_incoming_transfers(self, address: str, min_timestamp: int,
+                                      page_size: int = 200) -> AsyncIterator[List[Dict[str, Any]]]:
+        """صفحه‌به‌صفحه تراکنش‌های ورودی تایید شده یک آدرس (از قدیم به جدید)"""
+        params = {
+            "only_to": "true",
+            "only_confirmed": "true",
+            "limit": str(page_size),
+            "min_timestamp": str(min_timestamp),
+            "order_by": "block_timestamp,asc"
+        }
+        while True:
+            data = await self.request("GET", f"/v1/accounts/{address}/transactions", params=params)
+            page = (data or {}).get("data") or []
+            if page:
+                yield page
+            fingerprint = (data or {}).get("meta", {}).get("fingerprint")
+            if not fingerprint or len(page) < page_size:
+                return
+            params["fingerprint"] = fingerprint
+
+    def _cache_transaction(self, tx_id: str, data: Dict[str, Any]):
+        self._tx_cache[tx_id] = (time.monotonic(), data)
+        self._tx_cache.move_to_end(tx_id)
+        while len(self._tx_cache) > self.TX_CACHE_SIZE:
+            self._tx_cache.popitem(last=False)
+
+
+def _safe_base58(address: Optional[str]) -> Optional[str]:
+    """قالب base58 آدرس؛ آدرس ناقص یا غیر ترونی فقط با None نمایش داده می‌شود و تراکنش را رد نمی‌کند"""
+    if not address:
+        return None
+    try:
+        return to_base58(address)
+    except ValueError:
+        return None
+
+
+def parse_trx_transfer(tx_data: Dict[str, Any]) -> Dict[str, Any]:
+    """استخراج اطلاعات انتقال TRX از پاسخ gettransactionbyid"""
+    ret = tx_data.get("ret", [{}])[0]
+    if ret.get("contractRet") != "SUCCESS":
+        return {
+            "success": False,
+            "error": f"تراکنش ناموفق: {ret.get('contractRet')}"
+        }
+
+    contract = tx_data.get("raw_data", {}).get("contract", [{}])[0]
+    value = contract.get("parameter", {}).get("value", {})
+
+    to_address = (value.get("to_address") or "").lower() or None
+    from_address = (value.get("owner_address") or "").lower() or None
+    amount_sun = value.get("amount", 0)
+
+    # تبدیل‌ها کش می‌شوند؛ مقایسه با کیف پول فروشگاه روی قالب hex انجام می‌شود
+    return {
+        "success": True,
+        "txID": tx_data.get("txID"),
+        "to_address": _safe_base58(to_address),
+        "from_address": _safe_base58(from_address),
+        "to_address_hex": to_address,
+        "from_address_hex": from_address,
+        "amount_sun": amount_sun,
+        "amount_trx": amount_sun / 1_000_000,
+        "timestamp": tx_data.get("raw_data", {}).get("timestamp", 0)
+    }
+
+
+_client: Optional[TronClient] = None
+
+
+def get_tron_client() -> TronClient:
+    """کلاینت مشترک برنامه"""
+    global _client
+    if _client is None:
+        _client = TronClient()
+    return _client
+
+
+async def close_tron_client():
+    """بستن کلاینت مشترک هنگام خاموش شدن برنامه"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,225 @@
+# src/services/tron_watcher.py
+import asyncio
+import logging
+from typing import Dict, List, Optional, Any
+from ..config import Config
+from ..models.order import OrderStatus, PaymentMethod
+from ..constants import TransactionStatus
+from .tron_client import TronClient, get_tron_client, parse_trx_transfer
+from .txid_registry import TxidRegistry
+from ..utils.tron_address import WalletAddress, get_wallet_address
+from .settings_service import crypto_wallet_address
+from .amount_allocator import Allocation, AmountAllocator, get_amount_allocator
+from .order_service import OrderService
+from .wallet_service import WalletService, wallet_transaction
+
+
+class _StaleCandidate(Exception):
+    """پرداخت در انتظار پیش از ثبت، وضعیت دیگری گرفته است"""
+
+
+class TronWalletWatcher:
+    """پایش دسته‌ای تراکنش‌های ورودی کیف پول فروشگاه و تطبیق خودکار با پرداخت‌های در انتظار
+
+    آدرس پایش شده در هر دور از crypto_wallet_address (همان آدرسی که به کاربر نمایش داده
+    می‌شود) خوانده می‌شود؛ با تغییر تنظیمات، دور بعد آدرس جدید با نقطه بازیابی خودش پایش می‌شود.
+
+    نقطه بازیابی در جدول مشترک chain_checkpoints است، پس هر دور پیش از پایش فاکتورهای فعال را
+    از دیتابیس دوباره می‌خواند تا از نقطه بازیابی عبور نکند در حالی که فاکتور صادر شده در نمونه
+    دیگر ربات را نمی‌شناسد. با این حال فقط یک نمونه پایشگر پشتیبانی می‌شود؛ نمونه‌های همزمان
+    نقطه بازیابی یکدیگر را جابه‌جا می‌کنند و هر انتقال را دوباره بررسی می‌کنند.
+    """
+
+    CHECKPOINT_NAME = "tron_wallet_incoming"
+
+    def __init__(self, db, tron_client: Optional[TronClient] = None, bot=None,
+                 wallet_address: Optional[str] = None,
+                 allocator: Optional[AmountAllocator] = None):
+        self.db = db
+        self.tron_client = tron_client or get_tron_client()
+        self.allocator = allocator or get_amount_allocator(db)
+        self.bot = bot
+        # آدرس صریح فقط برای اسکریپت‌ها؛ در ربات آدرس از تنظیمات خوانده می‌شود
+        self.wallet_address = wallet_address
+        self.poll_interval = Config.TRON_WATCH_INTERVAL
+        self.txid_registry = TxidRegistry(db)
+        self.logger = logging.getLogger(__name__)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def wallet(self) -> WalletAddress:
+        return get_wallet_address(self.wallet_address or crypto_wallet_address())
+
+    async def start(self):
+        """شروع پایش پس‌زمینه (بدون آدرس تنظیم شده هر دور فقط فاکتورهای منقضی آزاد می‌شوند)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """توقف پایش"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                matched = await self.poll_once()
+                if matched:
+                    self.logger.info(f"{matched} پرداخت ترون به صورت خودکار تایید شد")
+            except Exception as e:
+                self.logger.error(f"خطا در پایش کیف پول ترون: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll_once(self) -> int:
+        """یک دور پایش: دریافت دسته‌ای تراکنش‌ها از نقطه بازیابی و تطبیق با فاکتورهای در انتظار"""
+        await self.allocator.release_expired()
+        await self.allocator.load()
+        oldest_ms = self.allocator.oldest_created_ms()
+        # آدرس یک بار برای کل دور خوانده می‌شود
+        wallet = self.wallet
+        if oldest_ms is None or not wallet:
+            return 0
+
+        # نقطه بازیابی جداگانه هر آدرس تا تغییر آدرس تراکنش‌های آدرس جدید را جا نیندازد
+        checkpoint_name = f"{self.CHECKPOINT_NAME}:{wallet.base58}"
+        checkpoint = await self._load_checkpoint(checkpoint_name)
+        min_timestamp = max(checkpoint or 0, oldest_ms)
+
+        matched = 0
+        last_seen = checkpoint or 0
+        async for page in self.tron_client.iter_incoming_transfers(wallet.base58, min_timestamp):
+            transfers = [t for t in (self._parse(item, wallet) for item in page) if t]
+            consumed = await self._consumed_hashes([t['txID'] for t in transfers])
+
+            for transfer in transfers:
+                last_seen = max(last_seen, transfer['block_timestamp'])
+                if transfer['txID'] in consumed:
+                    continue
+
+                # مبلغ یکتای هر فاکتور، انتقال را بدون ابهام به فاکتور خود می‌رساند
+                payment = self.allocator.lookup(transfer['amount_sun'])
+                # انتقال‌های قدیمی‌تر از ثبت فاکتور نمی‌توانند پرداخت آن باشند
+                if not payment or transfer['block_timestamp'] < payment.created_ms:
+                    continue
+
+                if await self._settle(payment, transfer):
+                    await self.allocator.release(payment.kind, payment.ref_id)
+                    matched += 1
+
+        if last_seen > (checkpoint or 0):
+            await self._save_checkpoint(checkpoint_name, last_seen)
+        return matched
+
+    def _parse(self, item: Dict[str, Any], wallet: WalletAddress) -> Optional[Dict[str, Any]]:
+        contract = item.get("raw_data", {}).get("contract", [{}])[0]
+        if contract.get("type") != "TransferContract":
+            return None
+        try:
+            transfer = parse_trx_transfer(item)
+        except (ValueError, TypeError, AttributeError, IndexError) as e:
+            # یک تراکنش نامعتبر کل صفحه را متوقف نمی‌کند
+            self.logger.warning(f"تراکنش {item.get('txID')} قابل خواندن نیست: {e}")
+            return None
+        if not transfer["success"] or not wallet.matches(transfer["to_address_hex"]):
+            return None
+        transfer["txID"] = TxidRegistry.normalize(transfer["txID"] or "")
+        if not transfer["txID"]:
+            return None
+        transfer["block_timestamp"] = item.get("block_timestamp") or transfer["timestamp"]
+        return transfer
+
+    async def _consumed_hashes(self, tx_hashes: List[str]) -> set:
+        if not tx_hashes:
+            return set()
+        async with self.db.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT tx_hash FROM consumed_tx_hashes WHERE tx_hash = ANY($1::varchar[])
+            """, tx_hashes)
+        return {row['tx_hash'] for row in rows}
+
+    async def _settle(self, payment: Allocation, transfer: Dict[str, Any]) -> bool:
+        """ثبت پرداخت تطبیق داده شده"""
+        tx_hash = transfer['txID']
+        try:
+            async with wallet_transaction(self.db, payment.user_id) as conn:
+                order_id = payment.ref_id if payment.kind == 'order' else None
+                if not await self.txid_registry.claim(conn, tx_hash, payment.user_id, order_id):
+                    return False
+
+                if payment.kind == 'order':
+                    result = await conn.execute("""
+                        UPDATE orders
+                        SET status = $1, payment_method = $2, payment_receipt = $3, updated_at = NOW()
+                        WHERE order_id = $4 AND status IN ('pending', 'awaiting_payment')
+                    """, OrderStatus.PAID.value, PaymentMethod.CRYPTO.value, tx_hash, payment.ref_id)
+                else:
+                    result = await conn.execute("""
+                        UPDATE transactions
+                        SET status = $1, reference_id = $2, tx_hash = $2, amount_sun = $5
+                        WHERE transaction_id = $3 AND status = $4
+                    """, TransactionStatus.COMPLETED.value, tx_hash,
+                        payment.ref_id, TransactionStatus.PENDING.value, transfer['amount_sun'])
+
+                if result != "UPDATE 1":
+                    # وضعیت در این فاصله تغییر کرده؛ ثبت TXID هم برگشت داده می‌شود
+                    raise _StaleCandidate()
+
+                if payment.kind == 'deposit':
+                    await WalletService.credit(
+                        conn, payment.user_id, payment.amount,
+                        f"شارژ خودکار با ترون - {tx_hash[:8]}"
+                    )
+        except _StaleCandidate:
+            # فاکتور لغو یا دستی تسویه شده؛ مبلغ آن دیگر رزرو نمی‌ماند
+            await self.allocator.release(payment.kind, payment.ref_id)
+            return False
+
+        if payment.kind == 'order':
+            # کسر موجودی و تحویل خودکار
+            await OrderService(self.db).update_order_status(
+                order_id=payment.ref_id,
+                status=OrderStatus.PAID,
+                payment_data={'method': PaymentMethod.CRYPTO.value, 'receipt': tx_hash}
+            )
+
+        await self._notify(payment, transfer)
+        return True
+
+    async def _notify(self, payment: Allocation, transfer: Dict[str, Any]):
+        if not self.bot:
+            return
+        if payment.kind == 'order':
+            text = (
+                "✅ پرداخت ترون شما به صورت خودکار تایید شد!\n\n"
+                f"شماره سفارش: {payment.ref_id}\n"
+                f"مبلغ: {transfer['amount_trx']} TRX"
+            )
+        else:
+            text = (
+                "✅ کیف پول شما با پرداخت ترون شارژ شد!\n\n"
+                f"💰 مبلغ: {payment.amount:,} تومان"
+            )
+        try:
+            await self.bot.send_message(chat_id=payment.user_id, text=text)
+        except Exception:
+            pass  # اگر کاربر ربات را بلاک کرده باشد
+
+    async def _load_checkpoint(self, name: str) -> Optional[int]:
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT last_timestamp FROM chain_checkpoints WHERE name = $1
+            """, name)
+
+    async def _save_checkpoint(self, name: str, last_timestamp: int):
+        async with self.db.pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO chain_checkpoints (name, last_timestamp)
+                VALUES ($1, $2)
+                ON CONFLICT (name)
+                DO UPDATE SET last_timestamp = EXCLUDED.last_timestamp, updated_at = NOW()
+            """, name, last_timestamp)
@@ -0,0 +1,38 @@
+# src/services/txid_registry.py
+import re
+from typing import Optional
+
+_TXID_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class TxidRegistry:
+    """ثبت TXIDهای مصرف شده برای جلوگیری از پرداخت تکراری"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def normalize(tx_hash: str) -> Optional[str]:
+        """یکسان‌سازی TXID (حروف کوچک، بدون پیشوند 0x)؛ None برای مقدار نامعتبر"""
+        tx_hash = (tx_hash or '').strip().lower()
+        if tx_hash.startswith('0x'):
+            tx_hash = tx_hash[2:]
+        return tx_hash if _TXID_RE.match(tx_hash) else None
+
+    async def is_consumed(self, tx_hash: str) -> bool:
+        """بررسی مصرف شدن TXID (جستجوی کلید اصلی، بدون درخواست شبکه)"""
+        async with self.db.pool.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT EXISTS(SELECT 1 FROM consumed_tx_hashes WHERE tx_hash = $1)
+            """, tx_hash)
+
+    @staticmethod
+    async def claim(conn, tx_hash: str, user_id: int, order_id: Optional[int] = None) -> bool:
+        """ثبت TXID به عنوان مصرف شده؛ باید در همان تراکنش دیتابیسی پرداخت اجرا شود"""
+        claimed = await conn.fetchval("""
+            INSERT INTO consumed_tx_hashes (tx_hash, user_id, order_id)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (tx_hash) DO NOTHING
+            RETURNING tx_hash
+        """, tx_hash, user_id, order_id)
+        return claimed is not None
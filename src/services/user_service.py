@@ -1,6 +1,7 @@
 # src/services/user_service.py
 from typing import List, Dict, Optional, Any
 from decimal import Decimal
+from .wallet_service import WalletService, wallet_transaction
 
 class UserService:
     def __init__(self, db):
@@ -55,36 +56,18 @@ class UserService:
     async def update_wallet_balance(self, user_id: int, amount: Decimal, 
                                   transaction_type: str, description: Optional[str] = None,
                                   related_order_id: Optional[int] = None) -> bool:
-        """بروزرسانی موجودی کیف پول"""
-        async with self.db.pool.acquire() as conn:
-            async with conn.transaction():
-                # بروزرسانی موجودی
-                result = await conn.execute("""
-                    UPDATE wallets 
-                    SET balance = balance + $1
-                    WHERE user_id = $2
-                """, amount, user_id)
-
-                if result != "UPDATE 1":
-                    return False
-
-                # دریافت موجودی جدید
-                new_balance = await conn.fetchval("""
-                    SELECT balance FROM wallets WHERE user_id = $1
-                """, user_id)
-
-                # ثبت تراکنش
-                await conn.execute("""
-                    INSERT INTO transactions (
-                        user_id, type, amount, balance_after, 
-                        description, related_order_id
-                    ) VALUES ($1, $2, $3, $4, $5, $6)
-                """, 
-                    user_id, transaction_type, amount, new_balance,
-                    description, related_order_id
+        """بروزرسانی موجودی کیف پول (مقدار منفی: کسر شرطی، مثلاً برگشت بازپرداخت)"""
+        async with wallet_transaction(self.db, user_id) as conn:
+            if amount < 0:
+                new_balance = await WalletService.debit(
+                    conn, user_id, -amount, transaction_type, description, related_order_id
                 )
+                return new_balance is not None
 
-                return True
+            await WalletService.credit(
+                conn, user_id, amount, description, transaction_type, related_order_id
+            )
+            return True
 
     async def get_wallet_transactions(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """دریافت تراکنش‌های کیف پول"""
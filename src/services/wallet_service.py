@@ -1,7 +1,35 @@
 # src/services/wallet_service.py
+from contextlib import asynccontextmanager
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict, List, Optional, Any
+from ..config import Config
+from ..utils.keyed_executor import KeyedExecutor
+
+# نوبت‌دهی عملیات کیف پول هر کاربر درون فرایند
+_wallet_executor = KeyedExecutor()
+
+
+@asynccontextmanager
+async def wallet_transaction(db, *user_ids: int):
+    """اتصال و تراکنش دیتابیس با نوبت انحصاری کیف پول کاربران داده شده
+
+    عملیات همزمان یک کاربر پیش از گرفتن اتصال از pool پشت سر هم قرار می‌گیرند، پس
+    روی قفل ردیف wallets منتظر نمی‌مانند و اتصال pool را هم اشغال نمی‌کنند؛ کاربران مختلف
+    موازی اجرا می‌شوند. با WALLET_ADVISORY_LOCK (چند نمونه ربات) نوبت با
+    pg_advisory_xact_lock تا پایان تراکنش در دیتابیس هم گرفته می‌شود.
+    """
+    async with _wallet_executor.lock_many(user_ids):
+        async with db.pool.acquire() as conn:
+            async with conn.transaction():
+                if Config.WALLET_ADVISORY_LOCK and user_ids:
+                    # ترتیب ثابت قفل‌ها؛ OFFSET 0 مانع ادغام زیرپرسش و تغییر ترتیب می‌شود
+                    await conn.execute("""
+                        SELECT COUNT(pg_advisory_xact_lock(id))
+                        FROM (SELECT DISTINCT id FROM unnest($1::bigint[]) AS id ORDER BY id OFFSET 0) s
+                    """, list(user_ids))
+                yield conn
+
 
 class WalletService:
     """سرویس مدیریت کیف پول"""
@@ -21,73 +49,138 @@ class WalletService:
     async def add_funds(self, user_id: int, amount: Decimal, method: str, 
                        reference: Optional[str] = None) -> bool:
         """افزایش موجودی کیف پول"""
-        async with self.db.pool.acquire() as conn:
-            async with conn.transaction():
-                # بروزرسانی موجودی
-                await conn.execute("""
-                    INSERT INTO wallets (user_id, balance)
-                    VALUES ($1, $2)
-                    ON CONFLICT (user_id) 
-                    DO UPDATE SET balance = wallets.balance + $2
-                """, user_id, amount)
-
-                # ثبت تراکنش
-                await conn.execute("""
-                    INSERT INTO transactions (
-                        user_id, type, amount, balance_after, description
-                    ) VALUES (
-                        $1, 'deposit', $2,
-                        (SELECT balance FROM wallets WHERE user_id = $1),
-                        $3
-                    )
-                """, user_id, amount, f"شارژ از طریق {method} - {reference or ''}")
-
-                return True
+        async with wallet_transaction(self.db, user_id) as conn:
+            await self.credit(conn, user_id, amount, f"شارژ از طریق {method} - {reference or ''}")
+            return True
+
+    @staticmethod
+    async def credit(conn, user_id: int, amount: Decimal, description: str,
+                     tx_type: str = 'deposit', related_order_id: Optional[int] = None) -> Decimal:
+        """افزایش موجودی و ثبت ردیف دفتر در یک دستور؛ موجودی جدید را برمی‌گرداند"""
+        return await conn.fetchval("""
+            WITH credited AS (
+                INSERT INTO wallets (user_id, balance, ledger_seq)
+                VALUES ($1, $2, 1)
+                ON CONFLICT (user_id)
+                DO UPDATE SET balance = wallets.balance + EXCLUDED.balance,
+                              ledger_seq = wallets.ledger_seq + 1
+                RETURNING balance, ledger_seq
+            )
+            INSERT INTO transactions (
+                user_id, type, amount, delta, balance_after, seq, description, related_order_id
+            )
+            SELECT $1, $3, $2, $2, balance, ledger_seq, $4, $5 FROM credited
+            RETURNING balance_after
+        """, user_id, amount, tx_type, description, related_order_id)
+
+    @staticmethod
+    async def credit_many(conn, entries: List[Any], description: str, tx_type: str = 'deposit'):
+        """افزایش گروهی موجودی و درج ردیف‌های دفتر با شماره ترتیبی هر کاربر در یک دستور
+
+        entries ردیف‌هایی با کلیدهای transaction_id (شناسه درخواست، در reference_id ثبت می‌شود)،
+        user_id و amount هستند.
+        """
+        await conn.execute("""
+            WITH d AS (
+                SELECT * FROM unnest($1::int[], $2::bigint[], $3::numeric[]) AS d(ref_id, user_id, amount)
+            ), credited AS (
+                INSERT INTO wallets (user_id, balance, ledger_seq)
+                SELECT user_id, SUM(amount), COUNT(*) FROM d GROUP BY user_id
+                ON CONFLICT (user_id)
+                DO UPDATE SET balance = wallets.balance + EXCLUDED.balance,
+                              ledger_seq = wallets.ledger_seq + EXCLUDED.ledger_seq
+                RETURNING user_id, balance, ledger_seq
+            ), ordered AS (
+                -- موجودی و شماره هر ردیف = مقدار نهایی منهای شارژهای بعدی همان کاربر در این دسته
+                SELECT d.*,
+                       ROW_NUMBER() OVER w - 1 AS later_count,
+                       COALESCE(SUM(amount) OVER (w ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS later_amount
+                FROM d
+                WINDOW w AS (PARTITION BY user_id ORDER BY ref_id DESC)
+            )
+            INSERT INTO transactions (
+                user_id, type, amount, delta, balance_after, seq, reference_id, description
+            )
+            SELECT o.user_id, $4, o.amount, o.amount,
+                   c.balance - o.later_amount, c.ledger_seq - o.later_count,
+                   o.ref_id::text, $5
+            FROM ordered o
+            JOIN credited c ON c.user_id = o.user_id
+        """,
+            [row['transaction_id'] for row in entries],
+            [row['user_id'] for row in entries],
+            [row['amount'] for row in entries],
+            tx_type,
+            description
+        )
+
+    @staticmethod
+    async def debit(conn, user_id: int, amount: Decimal, tx_type: str,
+                    description: Optional[str] = None,
+                    related_order_id: Optional[int] = None) -> Optional[Decimal]:
+        """کسر شرطی موجودی و ثبت ردیف دفتر در یک دستور
+
+        بررسی موجودی و کسر آن در همان UPDATE انجام می‌شود، پس درخواست‌های همزمان
+        نمی‌توانند موجودی را منفی کنند. در صورت کافی نبودن موجودی None برمی‌گرداند.
+        """
+        return await conn.fetchval("""
+            WITH debited AS (
+                UPDATE wallets
+                SET balance = balance - $2,
+                    ledger_seq = ledger_seq + 1
+                WHERE user_id = $1 AND balance >= $2
+                RETURNING balance, ledger_seq
+            ), ledger AS (
+                INSERT INTO transactions (
+                    user_id, type, amount, delta, balance_after, seq, description, related_order_id
+                )
+                SELECT $1, $3, $2, -$2::numeric, balance, ledger_seq, $4, $5 FROM debited
+            )
+            SELECT balance FROM debited
+        """, user_id, amount, tx_type, description, related_order_id)
 
     async def withdraw_funds(self, user_id: int, amount: Decimal, 
                            description: str) -> Dict[str, Any]:
         """برداشت از کیف پول"""
-        async with self.db.pool.acquire() as conn:
-            # بررسی موجودی
-            balance = await self.get_balance(user_id)
-            if balance < amount:
+        async with wallet_transaction(self.db, user_id) as conn:
+            new_balance = await self.debit(conn, user_id, amount, 'withdrawal', description)
+            if new_balance is None:
                 return {
                     "success": False,
                     "error": "موجودی کافی نیست"
                 }
 
-            async with conn.transaction():
-                # کسر از موجودی
-                await conn.execute("""
-                    UPDATE wallets 
-                    SET balance = balance - $2
-                    WHERE user_id = $1
-                """, user_id, amount)
-
-                # ثبت تراکنش
-                await conn.execute("""
-                    INSERT INTO transactions (
-                        user_id, type, amount, balance_after, description
-                    ) VALUES (
-                        $1, 'withdrawal', $2,
-                        (SELECT balance FROM wallets WHERE user_id = $1),
-                        $3
-                    )
-                """, user_id, amount, description)
+            return {
+                "success": True,
+                "new_balance": new_balance
+            }
 
-                return {
-                    "success": True,
-                    "new_balance": balance - amount
-                }
+    async def get_transactions(self, user_id: int, offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """دریافت تاریخچه کیف پول (ردیف‌های دفتر)
 
-    async def get_transactions(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """دریافت تاریخچه تراکنش‌ها"""
+        شناسه‌های صفحه از ایندکس idx_transactions_user_created و بقیه ستون‌ها فقط برای همان
+        ردیف‌ها با کلید اصلی خوانده می‌شوند.
+        """
         async with self.db.pool.acquire() as conn:
             transactions = await conn.fetch("""
-                SELECT *
-                FROM transactions
-                WHERE user_id = $1
-                ORDER BY created_at DESC
-                LIMIT $2
-            """, user_id, limit)
-            return [dict(tx) for tx in transactions]
\ No newline at end of file
+                SELECT t.transaction_id, t.created_at, t.type, t.amount, t.status, t.description
+                FROM (
+                    SELECT transaction_id
+                    FROM transactions
+                    WHERE user_id = $1 AND seq IS NOT NULL
+                    ORDER BY created_at DESC, transaction_id DESC
+                    OFFSET $2
+                    LIMIT $3
+                ) page
+                JOIN transactions t USING (transaction_id)
+                ORDER BY t.created_at DESC, t.transaction_id DESC
+            """, user_id, offset, limit)
+            return [dict(tx) for tx in transactions]
+
+    async def get_transactions_count(self, user_id: int) -> int:
+        """تعداد ردیف‌های دفتر کاربر (شماره ترتیبی آخرین ردیف)"""
+        async with self.db.pool.acquire() as conn:
+            count = await conn.fetchval("""
+                SELECT ledger_seq FROM wallets WHERE user_id = $1
+            """, user_id)
+            return count or 0
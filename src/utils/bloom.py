@@ -0,0 +1,50 @@
+# src/utils/bloom.py
+import hashlib
+import math
+from typing import Iterable
+
+
+class BloomFilter:
+    """فیلتر بلوم فشرده برای رشته‌ها
+
+    پاسخ منفی قطعی است (عضو مجموعه نیست) و پاسخ مثبت با احتمال خطای حدود
+    false_positive_rate همراه است. k موقعیت بیت با هش دوگانه از یک خلاصه blake2b به دست می‌آید.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], false_positive_rate: float = 0.01) -> "BloomFilter":
+        items = list(items)
+        bloom = cls(len(items), false_positive_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
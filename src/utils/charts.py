@@ -0,0 +1,99 @@
+# src/utils/charts.py
+import io
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# رنگ‌ها: سری اصلی، میانگین متحرک، پیش‌بینی
+SERIES_COLOR = (66, 133, 244)
+AVERAGE_COLOR = (251, 140, 0)
+FORECAST_COLOR = (52, 168, 83)
+GRID_COLOR = (225, 225, 225)
+TEXT_COLOR = (60, 60, 60)
+
+
+def _downsample(values: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """میانگین نقاط هر ستون پیکسل برای سری‌های بلندتر از عرض نمودار (شماره نقطه وسط، مقدار)"""
+    if len(values) <= buckets:
+        return np.arange(len(values), dtype=float), values
+    edges = np.linspace(0, len(values), buckets + 1).astype(int)
+    sums = np.add.reduceat(values, edges[:-1])
+    counts = np.diff(edges)
+    return (edges[:-1] + counts / 2 - 0.5), sums / counts
+
+
+def _format_value(value: float) -> str:
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= limit:
+            return f"{value / limit:.1f}{suffix}"
+    return f"{value:.0f}"
+
+
+def render_line_chart(values: np.ndarray, start: datetime, step: timedelta,
+                      average: Optional[np.ndarray] = None,
+                      forecast: Optional[np.ndarray] = None,
+                      legend: Sequence[str] = ("sales", "moving avg", "forecast"),
+                      title: str = "", size: Tuple[int, int] = (960, 480)) -> bytes:
+    """نمودار خطی PNG سری زمانی با میانگین متحرک و پیش‌بینی بعد از آخرین نقطه
+
+    برچسب‌ها لاتین هستند چون فونت پیش‌فرض Pillow نویسه فارسی ندارد؛ توضیح فارسی در
+    کپشن پیام ارسال می‌شود.
+    """
+    values = np.asarray(values, dtype=float)
+    forecast = np.asarray(forecast if forecast is not None else (), dtype=float)
+    width, height = size
+    left, right, top, bottom = 70, 20, 40, 50
+    plot_w, plot_h = width - left - right, height - top - bottom
+    total = max(len(values) + len(forecast) - 1, 1)
+
+    peak = max(
+        float(values.max()) if len(values) else 0.0,
+        float(forecast.max()) if len(forecast) else 0.0,
+        float(np.nanmax(average)) if average is not None and len(average) else 0.0
+    ) or 1.0
+
+    def points(index: np.ndarray, series: np.ndarray):
+        xs = left + index * (plot_w / total)
+        ys = top + plot_h - np.clip(series, 0, None) * (plot_h / (peak * 1.05))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    # شبکه و محور عمودی
+    for i in range(5):
+        y = top + plot_h * i / 4
+        draw.line([(left, y), (left + plot_w, y)], fill=GRID_COLOR)
+        draw.text((5, y - 6), _format_value(peak * 1.05 * (4 - i) / 4), fill=TEXT_COLOR, font=font)
+
+    # برچسب‌های زمانی
+    date_format = "%m-%d %H:%M" if step < timedelta(days=1) else "%Y-%m-%d"
+    for i in range(5):
+        index = round(total * i / 4)
+        x = left + index * (plot_w / total)
+        draw.line([(x, top + plot_h), (x, top + plot_h + 4)], fill=TEXT_COLOR)
+        label = (start + step * index).strftime(date_format)
+        draw.text((min(x - 30, width - 90), top + plot_h + 8), label, fill=TEXT_COLOR, font=font)
+
+    if len(values) > 1:
+        draw.line(points(*_downsample(values, plot_w)), fill=SERIES_COLOR, width=1)
+    if average is not None and len(average) > 1:
+        draw.line(points(*_downsample(np.asarray(average, dtype=float), plot_w)), fill=AVERAGE_COLOR, width=2)
+    if len(forecast) and len(values):
+        # پیش‌بینی از آخرین نقطه واقعی ادامه می‌یابد
+        index = np.arange(len(values) - 1, len(values) + len(forecast), dtype=float)
+        series = np.concatenate(([values[-1] if average is None else average[-1]], forecast))
+        draw.line(points(index, series), fill=FORECAST_COLOR, width=2)
+
+    draw.text((left, 10), title, fill=TEXT_COLOR, font=font)
+    x = width - right
+    for label, color in reversed(list(zip(legend, (SERIES_COLOR, AVERAGE_COLOR, FORECAST_COLOR)))):
+        x -= 8 * len(label) + 30
+        draw.rectangle([(x, 14), (x + 12, 22)], fill=color)
+        draw.text((x + 16, 10), label, fill=TEXT_COLOR, font=font)
+
+    output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
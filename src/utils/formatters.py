@@ -2,7 +2,9 @@
 from datetime import datetime
 import pytz
 from decimal import Decimal
+from typing import Optional
 from ..config import Config
+from ..services.rate_service import get_rate_service
 
 def format_price(amount: Decimal) -> str:
     """قالب‌بندی قیمت"""
@@ -16,9 +18,7 @@ def format_datetime(dt: datetime) -> str:
     tehran_time = dt.astimezone(tehran_tz)
     return tehran_time.strftime("%Y-%m-%d %H:%M:%S")
 
-def calculate_trx_amount(toman_amount: Decimal) -> float:
-    """محاسبه معادل TRX مبلغ تومان"""
-    # این تابع باید به API قیمت ارز متصل شود
-    # فعلاً یک مقدار ثابت برای تست
-    TRX_TOMAN_RATE = 20000  # هر ترون 20000 تومان
-    return float(toman_amount) / TRX_TOMAN_RATE
\ No newline at end of file
+def calculate_trx_amount(toman_amount: Decimal, rate: Optional[Decimal] = None) -> float:
+    """محاسبه معادل TRX مبلغ تومان (نرخ از حافظه سرویس نرخ، بدون درخواست شبکه)"""
+    rate = rate or get_rate_service().current()
+    return float(Decimal(toman_amount) / rate)
\ No newline at end of file
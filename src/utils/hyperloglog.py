@@ -0,0 +1,35 @@
+# src/utils/hyperloglog.py
+import math
+from typing import Iterable, Optional
+
+# ثبات‌ها در دیتابیس با تابع hll_add ساخته می‌شوند (migration 012): ۲^۱۰ ثبات یک‌بایتی،
+# شماره ثبات از ۱۰ بیت اول و رتبه از صفرهای ابتدای ۵۴ بیت بعدی هش md5 مقدار
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+def hll_estimate(registers: Optional[bytes]) -> int:
+    """تخمین تعداد مقادیر یکتا از ثبات‌های HyperLogLog (خطای استاندارد حدود ۳٪)"""
+    if not registers:
+        return 0
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # تصحیح بازه کوچک (linear counting)
+        estimate = m * math.log(m / zeros)
+    return round(estimate)
+
+
+def hll_merge(sketches: Iterable[Optional[bytes]]) -> Optional[bytes]:
+    """اجتماع چند HyperLogLog (بیشینه هر ثبات)"""
+    merged = None
+    for registers in sketches:
+        if not registers:
+            continue
+        if merged is None:
+            merged = bytearray(registers)
+        else:
+            merged = bytearray(map(max, merged, registers))
+    return bytes(merged) if merged is not None else None
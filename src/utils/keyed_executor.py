@@ -0,0 +1,48 @@
+# src/utils/keyed_executor.py
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+
+class KeyedExecutor:
+    """اجرای ترتیبی عملیات هم‌کلید و موازی عملیات با کلیدهای متفاوت (درون فرایند)
+
+    برای هر کلید فعال یک قفل نگه داشته می‌شود و پس از آزاد شدن آخرین منتظر حذف می‌شود،
+    پس حافظه فقط به تعداد کلیدهای در حال اجرا وابسته است.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: Hashable):
+        """نگه داشتن نوبت اجرای یک کلید"""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    @asynccontextmanager
+    async def lock_many(self, keys: Iterable[Hashable]):
+        """نگه داشتن نوبت چند کلید با ترتیب ثابت (بدون بن‌بست بین دسته‌ها)"""
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys)):
+                await stack.enter_async_context(self.lock(key))
+            yield
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """اجرای func در نوبت کلید"""
+        async with self.lock(key):
+            return await func(*args, **kwargs)
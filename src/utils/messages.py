@@ -1,6 +1,7 @@
 # src/utils/messages.py
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
+from decimal import Decimal
 from ..models.product import Product
 from ..models.order import Order, OrderStatus
 from ..config import Config
@@ -46,7 +47,8 @@ class Messages:
         )
 
     @staticmethod
-    def payment_info(order: Order, payment_method: str) -> str:
+    def payment_info(order: Order, payment_method: str, trx_amount: Optional[Decimal] = None,
+                     wallet_address: Optional[str] = None) -> str:
         """اطلاعات پرداخت"""
         if payment_method == "card":
             return (
@@ -57,12 +59,14 @@ class Messages:
                 f"🔹 پس از پرداخت، لطفاً تصویر رسید را ارسال کنید."
             )
         elif payment_method == "crypto":
-            trx_amount = calculate_trx_amount(order.total_amount)
+            if trx_amount is None:
+                trx_amount = f"{calculate_trx_amount(order.total_amount):.2f}"
             return (
                 f"🌐 اطلاعات پرداخت ترون (TRX):\n\n"
-                f"آدرس کیف پول: {Config.CRYPTO_WALLET}\n"
-                f"مبلغ به ترون: {trx_amount:.2f} TRX\n\n"
-                f"🔹 پس از پرداخت، لطفاً TXID تراکنش را ارسال کنید."
+                f"آدرس کیف پول: {wallet_address or Config.CRYPTO_WALLET}\n"
+                f"مبلغ به ترون: {trx_amount} TRX\n\n"
+                f"🔹 لطفاً دقیقاً همین مبلغ را واریز کنید تا پرداخت شما به صورت خودکار شناسایی شود.\n"
+                f"🔹 در صورت تاخیر، TXID تراکنش را ارسال کنید."
             )
         else:
             return "❌ روش پرداخت نامعتبر است."
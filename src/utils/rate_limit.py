@@ -0,0 +1,85 @@
+# src/utils/rate_limit.py
+import asyncio
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """محدودکننده نرخ سطل توکن (async)
+
+    rate توکن در ثانیه اضافه می‌شود و حداکثر capacity توکن ذخیره می‌ماند؛
+    هر درخواست یک توکن مصرف می‌کند و در نبود توکن تا آزاد شدن آن منتظر می‌ماند.
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """دریافت توکن (در صورت نیاز با انتظار)"""
+        if self.rate <= 0:
+            return
+        # قفل ترتیب نوبت منتظرها را حفظ می‌کند
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class AttemptLimiter:
+    """محدودکننده تلاش‌های ناموفق به ازای هر کلید (پنجره لغزان)
+
+    پس از max_attempts تلاش ناموفق در window ثانیه، کلید تا خروج قدیمی‌ترین تلاش
+    از پنجره مسدود می‌ماند. فقط کلیدهای دارای تلاش اخیر در حافظه نگه داشته می‌شوند.
+    """
+
+    def __init__(self, max_attempts: int, window: float):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._failures = {}
+        self._last_prune = time.monotonic()
+
+    def _recent(self, key, now: float):
+        attempts = self._failures.get(key)
+        if not attempts:
+            return []
+        while attempts and now - attempts[0] >= self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+        return attempts
+
+    def retry_after(self, key) -> float:
+        """ثانیه باقی‌مانده تا رفع مسدودی (صفر یعنی مجاز)"""
+        now = time.monotonic()
+        attempts = self._recent(key, now)
+        if len(attempts) < self.max_attempts:
+            return 0.0
+        return self.window - (now - attempts[0])
+
+    def is_blocked(self, key) -> bool:
+        return self.retry_after(key) > 0
+
+    def record_failure(self, key):
+        now = time.monotonic()
+        self._failures.setdefault(key, deque()).append(now)
+        if now - self._last_prune >= self.window:
+            self._prune(now)
+
+    def reset(self, key):
+        self._failures.pop(key, None)
+
+    def _prune(self, now: float):
+        for key in list(self._failures):
+            self._recent(key, now)
+        self._last_prune = now
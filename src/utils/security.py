@@ -1,8 +1,10 @@
 # src/utils/security.py
 import hashlib
 import hmac
+import math
+import secrets
 import time
-from typing import Optional
+from typing import Iterable, List, Optional, Set
 from ..config import Config
 
 def generate_download_token(product_id: int, order_id: int) -> str:
@@ -41,4 +43,53 @@ def verify_download_token(token: str) -> Optional[tuple]:
         return int(product_id), int(order_id)
         
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+
+# حروف و ارقام بدون نویسه‌های مشابه (0/O و 1/I)
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+def generate_codes(count: int, length: int = 10, alphabet: str = CODE_ALPHABET,
+                   prefix: str = "", exclude: Iterable[str] = ()) -> List[str]:
+    """تولید count کد تصادفی یکتا (با مولد امن) که در exclude نیستند
+
+    فضای کدها باید دست‌کم ۱۰۰ برابر تعداد درخواستی باشد تا کدها قابل حدس زدن نباشند
+    و تولید بدون تکرارهای زیاد تمام شود.
+    """
+    alphabet = "".join(dict.fromkeys(alphabet))
+    if len(alphabet) < 2 or length < 1:
+        raise ValueError("الفبا یا طول کد نامعتبر است")
+    if math.log(len(alphabet)) * length < math.log(max(1, count) * 100):
+        raise ValueError("فضای کدها برای این تعداد کافی نیست؛ طول یا الفبا را افزایش دهید")
+
+    excluded: Set[str] = set(exclude)
+    codes: Set[str] = set()
+    for code in _random_strings(alphabet, length):
+        code = prefix + code
+        if code not in excluded:
+            codes.add(code)
+            if len(codes) >= count:
+                break
+    return list(codes)
+
+
+def _random_strings(alphabet: str, length: int, chunk: int = 4096):
+    """رشته‌های تصادفی بی‌پایان؛ بایت‌های تصادفی با translate به الفبا نگاشت می‌شوند
+
+    بایت‌های بزرگتر از بزرگترین مضرب طول الفبا کنار گذاشته می‌شوند تا توزیع یکنواخت بماند.
+    """
+    if not alphabet.isascii() or len(alphabet) > 256:
+        rng = secrets.SystemRandom()
+        while True:
+            yield "".join(rng.choices(alphabet, k=length))
+
+    size = len(alphabet)
+    limit = 256 - 256 % size
+    table = bytes(ord(alphabet[b % size]) if b < limit else 0 for b in range(256))
+    rejected = bytes(range(limit, 256))
+    while True:
+        raw = secrets.token_bytes(length * chunk).translate(None, rejected).translate(table)
+        text = raw.decode("ascii")
+        for start in range(0, len(text) - length + 1, length):
+            yield text[start:start + length]
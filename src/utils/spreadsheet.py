@@ -0,0 +1,162 @@
+# src/utils/spreadsheet.py
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+# نویسه‌های کنترلی غیرمجاز در XML
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_ILLEGAL_SHEET_NAME = re.compile(r"[\[\]:*?/\\]")
+
+
+def _cell_text(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+class CsvSheet:
+    """نوشتن سطر به سطر CSV (UTF-8 با BOM تا اکسل متن فارسی را درست نمایش دهد)"""
+
+    def __init__(self, path: Path, header: Iterable[str]):
+        self.path = Path(path)
+        self._file = open(self.path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+        self.rows = 0
+
+    def write_row(self, values: Iterable[Any]):
+        self._writer.writerow(["" if v is None else _cell_text(v) for v in values])
+        self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class XlsxSheet:
+    """یک برگه در حال نوشتن؛ هر سطر مستقیماً در فایل zip فشرده می‌شود"""
+
+    def __init__(self, stream, header: Iterable[str]):
+        self._stream = stream
+        self.rows = 0
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetViews><sheetView workbookViewId="0" rightToLeft="1"/></sheetViews>'
+            '<sheetData>'
+        )
+        self.write_row(header)
+
+    def _write(self, text: str):
+        self._stream.write(text.encode("utf-8"))
+
+    def write_row(self, values: Iterable[Any]):
+        cells = []
+        for value in values:
+            if value is None:
+                cells.append("<c/>")
+            elif isinstance(value, bool):
+                cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float, Decimal)):
+                cells.append(f"<c><v>{value}</v></c>")
+            else:
+                text = escape(_ILLEGAL_XML.sub("", _cell_text(value)))
+                cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        self._write(f"<row>{''.join(cells)}</row>")
+        self.rows += 1
+
+    def close(self):
+        self._write("</sheetData></worksheet>")
+        self._stream.close()
+
+
+class XlsxWriter:
+    """نوشتن فایل XLSX با حافظه ثابت بدون وابستگی خارجی
+
+    برگه‌ها به ترتیب و سطر به سطر نوشته می‌شوند (در هر لحظه فقط یک برگه باز است)؛
+    رشته‌ها به صورت inline ذخیره می‌شوند تا نیازی به نگهداری جدول رشته‌های مشترک نباشد.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._zip = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._sheets: List[str] = []
+        self._current: Optional[XlsxSheet] = None
+
+    def add_sheet(self, name: str, header: Iterable[str]) -> XlsxSheet:
+        """شروع برگه جدید (برگه قبلی بسته می‌شود)"""
+        self._close_current()
+        name = _ILLEGAL_SHEET_NAME.sub(" ", name)[:31] or f"Sheet{len(self._sheets) + 1}"
+        self._sheets.append(name)
+        stream = self._zip.open(f"xl/worksheets/sheet{len(self._sheets)}.xml", "w", force_zip64=True)
+        self._current = XlsxSheet(stream, header)
+        return self._current
+
+    def _close_current(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        self._close_current()
+        sheets = "".join(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(self._sheets, 1)
+        )
+        sheet_rels = "".join(
+            f'<Relationship Id="rId{i}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(self._sheets) + 1)
+        )
+        sheet_types = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(self._sheets) + 1)
+        )
+        self._zip.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{sheet_types}</Types>'
+        ))
+        self._zip.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ))
+        self._zip.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        ))
+        self._zip.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}</Relationships>'
+        ))
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,71 @@
+# src/utils/timeseries.py
+import math
+from typing import Tuple
+import numpy as np
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """میانگین متحرک پسرو؛ ابتدای سری میانگین نقاط موجود است"""
+    values = np.asarray(values, dtype=float)
+    if window <= 1 or not len(values):
+        return values.copy()
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def window_change(values: np.ndarray, window: int) -> Tuple[float, float, float]:
+    """جمع آخرین پنجره، جمع پنجره قبل از آن و درصد تغییر (nan اگر پنجره قبل صفر یا ناقص باشد)"""
+    values = np.asarray(values, dtype=float)
+    current = float(values[-window:].sum())
+    previous_values = values[-2 * window:-window]
+    previous = float(previous_values.sum())
+    if len(previous_values) < window or previous == 0:
+        return current, previous, math.nan
+    return current, previous, (current - previous) / previous * 100
+
+
+def period_delta(values: np.ndarray, lag: int) -> Tuple[np.ndarray, np.ndarray]:
+    """اختلاف هر نقطه با نقطه lag قبل (مثلاً ۷ روز یا ۱۶۸ ساعت) و نسبت آن؛ بدون مقدار قبلی nan"""
+    values = np.asarray(values, dtype=float)
+    delta = np.full(len(values), math.nan)
+    ratio = np.full(len(values), math.nan)
+    if lag < len(values):
+        previous = values[:-lag]
+        delta[lag:] = values[lag:] - previous
+        np.divide(delta[lag:], previous, out=ratio[lag:], where=previous != 0)
+    return delta, ratio
+
+
+def exponential_smoothing(values: np.ndarray, alpha: float) -> np.ndarray:
+    """سطح هموارسازی نمایی ساده s_t = αx_t + (1-α)s_(t-1) با s_0 = x_0
+
+    رابطه بازگشتی به صورت بسته s_t = β^t(β·p + α·Σβ^(-k)x_k) در بلوک‌هایی محاسبه می‌شود که
+    β^(-k) در آن‌ها سرریز نکند؛ هزینه به ازای هر بلوک فقط چند عملیات برداری است.
+    """
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return values.copy()
+    if not 0 < alpha <= 1:
+        raise ValueError("alpha باید در بازه (0, 1] باشد")
+    beta = 1.0 - alpha
+    if beta == 0:
+        return values.copy()
+
+    block = max(1, int(600 / -math.log(beta)))
+    powers = beta ** np.arange(min(block, len(values)))
+    levels = np.empty(len(values))
+    previous = values[0]
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        scale = powers[:len(chunk)]
+        levels[start:start + len(chunk)] = scale * (beta * previous + alpha * np.cumsum(chunk / scale))
+        previous = levels[start + len(chunk) - 1]
+    return levels
+
+
+def ses_forecast(values: np.ndarray, alpha: float, horizon: int) -> np.ndarray:
+    """پیش‌بینی هموارسازی نمایی ساده: آخرین سطح برای horizon گام بعد"""
+    levels = exponential_smoothing(values, alpha)
+    return np.full(horizon, levels[-1] if len(levels) else 0.0)
@@ -0,0 +1,87 @@
+# src/utils/tron_address.py
+import hashlib
+from functools import lru_cache
+from typing import Optional
+import base58
+
+# پیشوند آدرس‌های شبکه اصلی ترون
+ADDRESS_PREFIX = b"\x41"
+ADDRESS_LENGTH = 21
+CONVERSION_CACHE_SIZE = 4096
+
+
+def _checksum(raw: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(raw).digest()).digest()[:4]
+
+
+@lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def to_bytes(address: str) -> bytes:
+    """تبدیل آدرس hex (41...) یا base58 (T...) به 21 بایت خام"""
+    address = address.strip()
+    if address.startswith("T"):
+        decoded = base58.b58decode(address)
+        raw, checksum = decoded[:-4], decoded[-4:]
+        if _checksum(raw) != checksum:
+            raise ValueError(f"چک‌سام آدرس نامعتبر است: {address}")
+    else:
+        raw = bytes.fromhex(address[2:] if address.lower().startswith("0x") else address)
+        if len(raw) == ADDRESS_LENGTH - 1:
+            raw = ADDRESS_PREFIX + raw
+
+    if len(raw) != ADDRESS_LENGTH or raw[:1] != ADDRESS_PREFIX:
+        raise ValueError(f"آدرس ترون نامعتبر است: {address}")
+    return raw
+
+
+@lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def to_base58(address: str) -> str:
+    """تبدیل آدرس به قالب base58 (با کش تبدیل‌های اخیر)"""
+    raw = to_bytes(address)
+    return base58.b58encode(raw + _checksum(raw)).decode()
+
+
+def to_hex(address: str) -> str:
+    """تبدیل آدرس به قالب hex با پیشوند 41 (حروف کوچک)"""
+    return to_bytes(address).hex()
+
+
+class WalletAddress:
+    """آدرس کیف پول با قالب‌های از پیش محاسبه شده برای مقایسه سریع
+
+    مقایسه با آدرس hex یا base58 دریافتی ابتدا به صورت رشته‌ای انجام می‌شود و فقط برای
+    قالب‌های غیرمعمول (مثلاً hex با حروف بزرگ) به تبدیل کش شده بایت خام نیاز دارد.
+    """
+
+    __slots__ = ("raw", "hex", "base58")
+
+    def __init__(self, address: str):
+        try:
+            self.raw: Optional[bytes] = to_bytes(address)
+        except (ValueError, TypeError, AttributeError):
+            # آدرس تنظیم نشده یا نامعتبر با هیچ آدرسی برابر نیست
+            self.raw = None
+        self.hex = self.raw.hex() if self.raw else ""
+        self.base58 = to_base58(self.hex) if self.raw else ""
+
+    def __bool__(self) -> bool:
+        return self.raw is not None
+
+    def __str__(self) -> str:
+        return self.base58
+
+    def matches(self, address: Optional[str]) -> bool:
+        """آیا آدرس داده شده (hex یا base58) همین کیف پول است؟"""
+        if not self.raw or not address:
+            return False
+        if address == self.hex or address == self.base58:
+            return True
+        try:
+            return to_bytes(address) == self.raw
+        except (ValueError, TypeError):
+            return False
+
+
+@lru_cache(maxsize=16)
+def get_wallet_address(address: str) -> WalletAddress:
+    """نمونه کش شده WalletAddress برای آدرسی که در هر بررسی از تنظیمات خوانده می‌شود"""
+    return WalletAddress(address)